@@ -1,29 +1,32 @@
 import sys
-import json
+
+if __name__ == "__main__" and "--headless" in sys.argv:
+    # Track without a window; decided before any GUI module is imported
+    import tracker_core
+    sys.exit(tracker_core.run_headless())
+
 import os
-import telnetlib
-import psutil
+import json
 import threading
-from PyQt6.QtCore import QTimer, QObject, pyqtSignal, QThread, QMetaObject, Qt, pyqtSlot, QSettings
+import time
+from PyQt6.QtCore import (pyqtSignal, Qt, QSettings, QAbstractListModel, QModelIndex,
+                          QSize, QRect, QEvent, QTimer)
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QLabel, 
-                           QListWidget, QTabWidget, QHBoxLayout, QPushButton,
-                           QListWidgetItem, QMessageBox, QSystemTrayIcon, QMenu)
-from PyQt6.QtGui import QIcon
-import winreg
+                           QListView, QTabWidget, QPushButton, QStyledItemDelegate, QStyle,
+                           QMessageBox, QSystemTrayIcon, QMenu, QPlainTextEdit, QHBoxLayout, QCheckBox,
+                           QComboBox, QListWidget, QFileDialog, QLineEdit, QSpinBox)
+from PyQt6.QtGui import QIcon, QColor, QPainter, QPen, QFontDatabase
 import os.path
 import logging
-import datetime
-from logging.handlers import RotatingFileHandler
-import appdirs
-
-# Change LOG_FILE definition
-USER_DATA_DIR = appdirs.user_data_dir("VLCTracker", "VLCTracker")
-if not os.path.exists(USER_DATA_DIR):
-    os.makedirs(USER_DATA_DIR)
+from tracker_core import (USER_DATA_DIR, HISTORY_PAGE_SIZE, HISTORY_ARCHIVE_INTERVAL, METRICS_JSON_FILE,
+                          METRICS_PROMETHEUS_FILE, METRICS_EXPORT_INTERVAL, STATS_JSON_FILE, STATS_CSV_FILE, POLL_INTERVAL, LOG_LEVELS, HISTORY_FILTERS,
+                          setup_logging, stop_logging, log_crash, set_log_level, write_setting, library_folders,
+                          history_archive_days, configured_status_backend, metrics, format_metrics, format_stats, format_time,
+                          history_entry_status, HistorySearchIndex, TrackerCore)
 
-LOG_FILE = os.path.join(USER_DATA_DIR, "vlctracker.log")
-HISTORY_FILE = os.path.join(USER_DATA_DIR, "vlc_history.json")
+IMPORTED_AT = time.time()
 
+SEARCH_INDEX_SLICE = 0.008  # Seconds of history indexed per idle slice while the search index is built
 ICON_FILE = os.path.join(os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__), 
                         "icons", "tracker.ico")
 TRAY_ICON_FILE = os.path.join(os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__),
@@ -32,61 +35,9 @@ TRASH_ICON_FILE = os.path.join(os.path.dirname(sys.executable) if getattr(sys, '
                               "icons", "trash.png")
 
 
-VLC_TELNET_HOST = "localhost" #VLC_TELNET_HOST
-VLC_TELNET_PORT = 4212 #VLC_TELNET_PORT
-VLC_TELNET_PASSWORD = ""  #VLC_TELNET_PASSWORD
-
-
-def setup_logging():
-    """Configure logging with rotation and different log levels"""
-    try:
-        # Remove any existing handlers
-        root_logger = logging.getLogger()
-        for handler in root_logger.handlers[:]:
-            root_logger.removeHandler(handler)
-            
-        # Create rotating file handler with more permissive file access
-        handler = RotatingFileHandler(
-            LOG_FILE,
-            maxBytes=1024 * 1024,  # 1MB per file
-            backupCount=3,  # Keep 3 backup files
-            delay=True  # Don't open the file until first log message
-        )
-        
-        # Set formatter
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        
-        # Configure root logger
-        root_logger.setLevel(logging.WARNING)
-        root_logger.addHandler(handler)
-        
-        # Don't create separate debug logger, use root logger with filter
-        logging.info("Logging system initialized")
-        
-    except Exception as e:
-        print(f"Failed to setup logging: {e}")
-
-# Remove the separate basicConfig call
-# Remove this section:
-# logging.basicConfig(
-#     filename=LOG_FILE,
-#     level=logging.DEBUG,
-#     format='%(asctime)s - %(levelname)s - %(message)s'
-# )
-
-def log_crash(exc_type, exc_value, exc_traceback):
-    """Log uncaught exceptions with full debug info"""
-    try:
-        logging.critical(
-            "Uncaught exception:",
-            exc_info=(exc_type, exc_value, exc_traceback)
-        )
-    except Exception as e:
-        print(f"Failed to log crash: {e}")
-
 def add_to_startup():
     """Add the application to Windows startup"""
+    import winreg
     app_path = os.path.abspath(sys.argv[0])
     app_dir = os.path.dirname(app_path)
     
@@ -107,6 +58,7 @@ def add_to_startup():
 
 def remove_from_startup():
     """Remove the application from Windows startup"""
+    import winreg
     key = winreg.HKEY_CURRENT_USER
     startup_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
     
@@ -125,185 +77,256 @@ def remove_from_startup():
         print(f"Failed to access startup registry: {e}")
         return False
 
-def rename_media_file(original_path, is_watched, timestamp=None):
-    """Helper function to rename the media file"""
-    try:
-        # Remove file:/// prefix if present
-        if original_path.startswith("file:///"):
-            original_path = original_path[8:]  # Remove "file:///"
-        
-        # Convert path separators to system format
-        original_path = os.path.normpath(original_path)
-        
-        directory = os.path.dirname(original_path)
-        filename = os.path.basename(original_path)
-        name, ext = os.path.splitext(filename)
-        
-        # Remove any existing [WATCHED] or [MM:SS] prefix
-        if name.startswith('['):
-            name = name[name.find(']') + 1:].strip()
-        
-        # Create new filename
-        prefix = '[WATCHED]' if is_watched else f'[{timestamp}]'
-        new_filename = f"{prefix} {name}{ext}"
-        new_path = os.path.join(directory, new_filename)
-        
-        
-        # Rename the file
-        if os.path.exists(original_path):
-            os.rename(original_path, new_path)
-            return new_path
-        else:
-            return original_path
-            
-    except Exception as e:
-        return original_path
-
-def format_time(seconds):
-    """Convert seconds into a MM:SS string."""
-    minutes = seconds // 60
-    sec = seconds % 60
-    return f"{minutes}:{sec:02d}"
-
-def format_time_filename(seconds):
-    """Convert seconds into a MM-SS string safe for filenames."""
-    minutes = seconds // 60
-    sec = seconds % 60
-    return f"{minutes:02d}-{sec:02d}"
-
-def is_vlc_running():
-    """Check if VLC process is running."""
-    for proc in psutil.process_iter(['name']):
-        if proc.info['name'] and "vlc" in proc.info['name'].lower():
-            return True
-    return False
-
-def get_vlc_status_telnet(host=VLC_TELNET_HOST, port=VLC_TELNET_PORT, password=VLC_TELNET_PASSWORD):
+class HistoryModel(QAbstractListModel):
     """
-    Connect to VLC's telnet interface and get current playback status.
-    Returns a dictionary with 'file', 'time', 'length', and 'state' if media is loaded.
-    Returns None if no media is playing or connection fails.
+    List model over history entries, newest first; the view only asks for
+    the rows it shows. Recent entries come from the HistoryStore's memory;
+    archived ones follow, a page at a time as the view scrolls to the end.
+    With a search or status filter set only matching entries are shown. The
+    search index over recent entries is built in slices while the GUI is
+    idle, or all at once if a filter is set before it is done; archived
+    pages are filtered as they are read.
     """
-    tn = None
-    try:
-        if not is_vlc_running():
-            return None
+    FilePathRole = Qt.ItemDataRole.UserRole
+    StatusRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None, archive=None):
+        super().__init__(parent)
+        self.history = []  # Every recent entry, oldest first
+        self.history_rows = {}  # id -> position in history
+        self.entries = self.history  # Recent entries shown, oldest first, after the last rows
+        self.rows = self.history_rows  # id -> position in entries, None while filtered
+        self.archive = archive  # HistoryStore to page archived entries from
+        self.older = []  # Archived entries shown after the recent ones, newest first
+        self.archive_cursor = None
+        self.archive_done = archive is None
+        self.search_index = HistorySearchIndex()
+        self.unindexed = None  # Iterator over entries still to be indexed
+        self.query = ""
+        self.status_filter = None
+        self.shown_filter = None  # (words, status) of the rows shown
+
+    def filtered(self):
+        return bool(self.query.strip()) or self.status_filter is not None
+
+    def set_entries(self, entries):
+        self.history = entries
+        self.history_rows = {entry['id']: row for row, entry in enumerate(entries)}
+        self.search_index = HistorySearchIndex()
+        self.unindexed = iter(list(entries))
+        QTimer.singleShot(0, self.index_slice)
+        self.refilter(narrowing=False)
+
+    def index_slice(self, budget=SEARCH_INDEX_SLICE):
+        """Index history entries for about budget seconds (None: all of them)."""
+        if self.unindexed is None:
+            return
+        deadline = None if budget is None else time.perf_counter() + budget
+        for entry in self.unindexed:
+            # Skip entries deleted since, or changed and indexed by apply_change
+            if entry['id'] in self.history_rows:
+                self.search_index.add_entries((entry,))
+            if deadline is not None and time.perf_counter() > deadline:
+                QTimer.singleShot(0, self.index_slice)
+                return
+        self.unindexed = None
+        self.search_index.finish()
+
+    def set_filter(self, query=None, status=None):
+        """Show only entries matching every word of query and, if given, status."""
+        if query is not None:
+            self.query = query
+        self.status_filter = status
+        self.refilter()
+
+    def refilter(self, narrowing=True):
+        if self.filtered() and self.unindexed is not None:
+            self.index_slice(None)
+        ids = self.search_index.search(self.query, self.status_filter) if self.filtered() else None
+        words = HistorySearchIndex.normalize(self.query)
+        # Typing more of a query can only narrow the results, so only the rows shown need checking
+        source = self.history
+        if narrowing and self.rows is None and self.shown_filter:
+            shown_words, shown_status = self.shown_filter
+            if shown_status in (None, self.status_filter) and all(
+                    any(word.startswith(shown) for word in words) for shown in shown_words):
+                source = self.entries
+        self.beginResetModel()
+        if ids is None:
+            self.entries, self.rows = self.history, self.history_rows
+        elif len(ids) == len(self.history):
+            self.entries = list(self.history)
+            self.rows = None
+        elif len(ids) * 8 < len(source):
+            self.entries = [self.history[row] for row in sorted(self.history_rows[i] for i in ids)]
+            self.rows = None
+        else:
+            self.entries = [entry for entry in source if entry['id'] in ids]
+            self.rows = None
+        self.shown_filter = (words, self.status_filter)
+        self.older = []
+        self.archive_cursor = None
+        self.archive_done = self.archive is None
+        self.endResetModel()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.archive_done
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Append the next page of archived entries that pass the filter."""
+        if parent.isValid() or self.archive_done:
+            return
+        matches = None
+        if self.filtered():
+            matches = lambda entry: HistorySearchIndex.matches(entry, self.query, self.status_filter)
+        with metrics.timer("history_page_seconds"):
+            page, self.archive_cursor = self.archive.archived_entries(self.archive_cursor, HISTORY_PAGE_SIZE, matches)
+        self.archive_done = self.archive_cursor is None
+        if page:
+            first = self.rowCount()
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            self.older.extend(page)
+            self.endInsertRows()
+
+    def _drop_older(self, entry_id, notify):
+        """Take an archived entry shown on a page out, once it is restored or deleted."""
+        for position, older in enumerate(self.older):
+            if older['id'] == entry_id:
+                row = len(self.entries) + position
+                if notify:
+                    self.beginRemoveRows(QModelIndex(), row, row)
+                del self.older[position]
+                if notify:
+                    self.endRemoveRows()
+                return
 
-        tn = telnetlib.Telnet(host, port, timeout=1)
-        
-        # Handle initial connection and password
-        prompt = tn.read_until(b"Password: ", timeout=1)
-        if b"Password:" in prompt:
-            logging.debug("Password prompt received")
-            tn.write(f"{password}\n".encode('utf-8'))
-            response = tn.read_until(b">", timeout=1)
-            if b"Wrong password" in response:
-                logging.error("Wrong telnet password")
-                return None
-        
-        # Get current status
-        logging.debug("Sending status command")
-        tn.write(b"status\n")
-        status_result = tn.read_until(b">", timeout=1)
-        logging.debug(f"Received status result: {status_result}")
-        
-        # Parse status output
-        lines = status_result.decode('utf-8', errors='ignore').splitlines()
-        
-        file_name = None
-        state = None
-        for line in lines:
-            if line.startswith("( state "):
-                state = line[len("( state "):].rstrip(" )").strip()
-                logging.debug(f"Found state: {state}")
-            elif line.startswith("( new input: "):
-                file_name = line[len("( new input: "):].rstrip(" )").strip()
-                logging.debug(f"Found new input: {file_name}")
-            elif line.startswith("input: "):
-                file_name = line[len("input: "):].strip()
-                logging.debug(f"Found input: {file_name}")
-        
-        # Only proceed if we have valid state and file
-        if not (state in ("playing", "paused") and file_name):
-            logging.debug("No valid playback state or file")
-            return None
-            
-        # Get current time and length
-        logging.debug("Getting playback time")
-        tn.write(b"get_time\n")
-        time_result = tn.read_until(b">", timeout=1)
-        logging.debug(f"Received get_time result: {time_result}")
-        
-        logging.debug("Getting total length")
-        tn.write(b"get_length\n")
-        length_result = tn.read_until(b">", timeout=1)
-        logging.debug(f"Received get_length result: {length_result}")
-        
-        try:
-            time_line = time_result.decode('utf-8', errors='ignore').strip().splitlines()[0]
-            current_time = int(time_line)
-            logging.debug(f"Parsed playback time: {current_time}")
-            
-            length_line = length_result.decode('utf-8', errors='ignore').strip().splitlines()[0]
-            total_length = int(length_line)
-            logging.debug(f"Parsed total length: {total_length}")
-            
-            return {
-                "file": file_name,
-                "time": current_time,
-                "length": total_length,
-                "state": state
-            }
-            
-        except (ValueError, IndexError) as e:
-            logging.debug(f"Could not parse time/length: {str(e)}")
+    def apply_change(self, change, entry):
+        """HistoryStore listener: update, insert or remove the one affected row."""
+        self.search_index.apply_change(change, entry)
+        filtered = self.rows is None
+        position = self.history_rows.get(entry['id'])
+        if position is None:
+            self._drop_older(entry['id'], notify=not filtered)
+        if change == "upsert":
+            if position is None:
+                if not filtered:
+                    self.beginInsertRows(QModelIndex(), 0, 0)
+                self.history_rows[entry['id']] = len(self.history)
+                self.history.append(entry)
+                if not filtered:
+                    self.endInsertRows()
+            else:
+                self.history[position] = entry
+                if not filtered:
+                    index = self.index(len(self.history) - 1 - position)
+                    self.dataChanged.emit(index, index)
+        elif change == "delete" and position is not None:
+            if not filtered:
+                row = len(self.history) - 1 - position
+                self.beginRemoveRows(QModelIndex(), row, row)
+            del self.history[position]
+            del self.history_rows[entry['id']]
+            for later in self.history[position:]:
+                self.history_rows[later['id']] -= 1
+            if not filtered:
+                self.endRemoveRows()
+        if filtered:
+            self.refilter(narrowing=False)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries) + len(self.older)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
             return None
-            
-    except ConnectionRefusedError:
-        return None
-    except Exception as e:
-        logging.error(f"Error fetching VLC status via telnet: {str(e)}")
+        row = index.row()
+        entry = self.entries[-1 - row] if row < len(self.entries) else self.older[row - len(self.entries)]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{os.path.basename(entry['file'])} - {entry['timestamp']}"
+        if role == self.FilePathRole:
+            return entry['file']
+        if role == self.StatusRole:
+            return history_entry_status(entry)
         return None
-    finally:
-        if tn:
-            try:
-                tn.close()
-            except:
-                pass
-
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-class VLCStatusWorker(QObject):
-    status_ready = pyqtSignal(dict)
-    vlc_not_running = pyqtSignal()
-
-    @pyqtSlot()
-    def check_status(self):
-        try:
-            if not is_vlc_running():
-                logging.debug("VLC not running")
-                self.vlc_not_running.emit()
-                return
-            
-            status = get_vlc_status_telnet()
-            if status:
-                logging.debug(f"Got VLC status: {status}")
-                self.status_ready.emit(status)
-            else:
-                # Don't spam empty status updates
-                logging.debug("No valid status received, emitting vlc_not_running")
-                self.vlc_not_running.emit()
-                
-        except Exception as e:
-            logging.error(f"Error in check_status: {str(e)}", exc_info=True)
-            # Emit vlc_not_running to maintain UI state
-            self.vlc_not_running.emit()
+
+
+class HistoryDelegate(QStyledItemDelegate):
+    """
+    Paints a history row as a rounded, status-coloured box with a trash icon
+    after the file name. The icon and colours are shared by every row.
+    """
+    delete_requested = pyqtSignal(str)
+
+    STATUS_COLORS = {
+        "watched": QColor("#90EE90"),
+        "halfway": QColor("#FFD700"),
+        "started": QColor("#FFB6C1"),
+    }
+    ROW_HEIGHT = 36
+    MARGIN = 2
+    PADDING = 8
+    ICON_SIZE = 20
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.trash_icon = QIcon(TRASH_ICON_FILE) if os.path.exists(TRASH_ICON_FILE) else QIcon("trash.png")
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def layout(self, option, text):
+        """Return the background rect, elided text, text rect and trash icon rect for a row."""
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        metrics = option.fontMetrics
+        available = rect.width() - 3 * self.PADDING - self.ICON_SIZE
+        text = metrics.elidedText(text, Qt.TextElideMode.ElideRight, max(available, 0))
+        text_rect = QRect(rect.left() + self.PADDING, rect.top(), metrics.horizontalAdvance(text), rect.height())
+        icon_rect = QRect(text_rect.right() + self.PADDING, rect.center().y() - self.ICON_SIZE // 2,
+                          self.ICON_SIZE, self.ICON_SIZE)
+        return rect, text, text_rect, icon_rect
+
+    def paint(self, painter, option, index):
+        rect, text, text_rect, icon_rect = self.layout(option, index.data())
+        hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+        selected = bool(option.state & QStyle.StateFlag.State_Selected)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        color = self.STATUS_COLORS[index.data(HistoryModel.StatusRole)]
+        painter.setBrush(color.lighter(110) if hovered else color)
+        if hovered or selected:
+            painter.setPen(QPen(option.palette.highlight().color() if selected else QColor("#666"), 1))
+        else:
+            painter.setPen(Qt.PenStyle.NoPen)
+        painter.drawRoundedRect(rect, 5, 5)
+
+        painter.setPen(QColor("black"))
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, text)
+        self.trash_icon.paint(painter, icon_rect)
+        painter.restore()
+
+    def helpEvent(self, event, view, option, index):
+        _, _, _, icon_rect = self.layout(option, index.data())
+        if icon_rect.contains(event.pos()):
+            view.setToolTip("Delete from history")
+        else:
+            view.setToolTip(index.data(HistoryModel.FilePathRole))
+        return super().helpEvent(event, view, option, index)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            _, _, _, icon_rect = self.layout(option, index.data())
+            if icon_rect.contains(event.position().toPoint()):
+                self.delete_requested.emit(index.data(HistoryModel.FilePathRole))
+                return True
+        return super().editorEvent(event, model, option, index)
+
 
 class VLCTracker(QWidget):
+    """The tray window over a TrackerCore, which does the tracking."""
+    # The core's callbacks from its threads, delivered on the GUI thread
+    core_event = pyqtSignal(object, tuple)
+
     def __init__(self):
         try:
             super().__init__()
@@ -315,26 +338,17 @@ class VLCTracker(QWidget):
                 self.setWindowIcon(QIcon(ICON_FILE))
 
 
-            # Initialize status tracking variables
-            self.current_file = None
-            self.current_time = 0
-            self.current_state = None
-            self.vlc_running = False
-            self.skip_next_rename = False  # Add this line
-            self.skip_history_update = False  # Add this line too
+            # Started by finish_startup once the event loop is running
+            self.core = TrackerCore(lambda callback, *args: self.core_event.emit(callback, args))
+            self.core_event.connect(self.run_core_event, Qt.ConnectionType.QueuedConnection)
+            self.core.add_listener(self.on_core_event)
+            self.history_model = None
+            self.startup_times = {}
+            self.startup_benchmark_file = None
 
-            
-            # Create worker and move to thread properly
-            self.worker = VLCStatusWorker()
-            self.worker_thread = QThread()  # Create the thread first
-            self.worker.moveToThread(self.worker_thread)  # Move worker to thread
-            
-            # Connect signals
-            self.worker.status_ready.connect(self.on_status_ready, Qt.ConnectionType.QueuedConnection)
-            self.worker.vlc_not_running.connect(self.on_vlc_not_running, Qt.ConnectionType.QueuedConnection)
-            
-            # Start the thread
-            self.worker_thread.start()
+            # Show the tray icon before building anything else
+            self.create_tray_icon()
+            self.startup_times["tray_shown"] = time.time()
             
             # Setup UI
             layout = QVBoxLayout()
@@ -347,23 +361,41 @@ class VLCTracker(QWidget):
             np_layout.addWidget(self.now_playing_label)
             self.now_playing_tab.setLayout(np_layout)
             
-            # History Tab
+            # History Tab, filled in by build_history_view when first opened
             self.history_tab = QWidget()
-            history_layout = QVBoxLayout()
-            self.history_list = QListWidget()
-            history_layout.addWidget(self.history_list)
-            self.history_tab.setLayout(history_layout)
+            self.history_tab.setLayout(QVBoxLayout())
             
+            # Stats Tab
+            self.stats_tab = QWidget()
+            stats_layout = QVBoxLayout()
+            self.stats_view = QPlainTextEdit()
+            self.stats_view.setReadOnly(True)
+            self.stats_view.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+            stats_layout.addWidget(self.stats_view)
+            stats_export_layout = QHBoxLayout()
+            export_stats_json_button = QPushButton("Export JSON")
+            export_stats_json_button.clicked.connect(lambda: self.export_stats("json"))
+            export_stats_csv_button = QPushButton("Export CSV")
+            export_stats_csv_button.clicked.connect(lambda: self.export_stats("csv"))
+            stats_export_layout.addWidget(export_stats_json_button)
+            stats_export_layout.addWidget(export_stats_csv_button)
+            stats_export_layout.addStretch()
+            stats_layout.addLayout(stats_export_layout)
+            self.stats_status = QLabel(f"Exports are written to {USER_DATA_DIR}")
+            stats_layout.addWidget(self.stats_status)
+            self.stats_tab.setLayout(stats_layout)
+            self.stats_version = None
+
             self.tabs.addTab(self.now_playing_tab, "Now Playing")
             self.tabs.addTab(self.history_tab, "History")
+            self.tabs.addTab(self.stats_tab, "Stats")
+            self.tabs.currentChanged.connect(self.on_tab_changed)
             layout.addWidget(self.tabs)
             self.setLayout(layout)
 
             self.settings_tab = QWidget()
             settings_layout = QVBoxLayout()
 
-            self.history_list.itemDoubleClicked.connect(self.play_history_item)
-
             # Startup checkbox
             settings = QSettings("VLCTracker", "Settings")
             is_startup = settings.value("run_at_startup", False, bool)
@@ -373,24 +405,252 @@ class VLCTracker(QWidget):
             self.startup_checkbox.clicked.connect(self.toggle_startup)
             
             settings_layout.addWidget(self.startup_checkbox)
+
+            # Log level, applied straight away
+            log_level_layout = QHBoxLayout()
+            log_level_layout.addWidget(QLabel("Log level:"))
+            self.log_level_combo = QComboBox()
+            self.log_level_combo.addItems(LOG_LEVELS)
+            self.log_level_combo.setCurrentText(logging.getLevelName(logging.getLogger().getEffectiveLevel()))
+            self.log_level_combo.currentTextChanged.connect(set_log_level)
+            log_level_layout.addWidget(self.log_level_combo)
+            log_level_layout.addStretch()
+            settings_layout.addLayout(log_level_layout)
+
+            # Where playback status comes from, switched without a restart
+            status_backend_layout = QHBoxLayout()
+            status_backend_layout.addWidget(QLabel("Status source:"))
+            self.status_backend_combo = QComboBox()
+            self.status_backend_combo.addItem("Telnet (rc interface)", "telnet")
+            self.status_backend_combo.addItem("Telnet, following VLC's status events", "telnet-push")
+            self.status_backend_combo.addItem("HTTP (web interface)", "http")
+            self.status_backend_combo.setCurrentIndex(self.status_backend_combo.findData(configured_status_backend()))
+            self.status_backend_combo.currentIndexChanged.connect(self.set_status_backend)
+            status_backend_layout.addWidget(self.status_backend_combo)
+            status_backend_layout.addStretch()
+            settings_layout.addLayout(status_backend_layout)
+
+            # Old history entries move to the archive, loaded only when scrolled to
+            archive_layout = QHBoxLayout()
+            archive_layout.addWidget(QLabel("Archive history entries untouched for:"))
+            self.archive_days_spin = QSpinBox()
+            self.archive_days_spin.setRange(0, 3650)
+            self.archive_days_spin.setSuffix(" days")
+            self.archive_days_spin.setSpecialValueText("Never")
+            self.archive_days_spin.setValue(history_archive_days())
+            self.archive_days_spin.editingFinished.connect(self.set_archive_days)
+            archive_layout.addWidget(self.archive_days_spin)
+            archive_layout.addStretch()
+            settings_layout.addLayout(archive_layout)
+
+            # Library folders, scanned for files renamed with progress
+            settings_layout.addWidget(QLabel("Library folders:"))
+            self.library_list = QListWidget()
+            self.library_list.addItems(library_folders())
+            settings_layout.addWidget(self.library_list)
+            library_buttons = QHBoxLayout()
+            add_folder_button = QPushButton("Add Folder...")
+            add_folder_button.clicked.connect(self.add_library_folder)
+            remove_folder_button = QPushButton("Remove Folder")
+            remove_folder_button.clicked.connect(self.remove_library_folder)
+            self.scan_button = QPushButton("Scan Now")
+            self.scan_button.clicked.connect(self.scan_library)
+            library_buttons.addWidget(add_folder_button)
+            library_buttons.addWidget(remove_folder_button)
+            library_buttons.addWidget(self.scan_button)
+            library_buttons.addStretch()
+            settings_layout.addLayout(library_buttons)
+            self.library_status = QLabel("")
+            settings_layout.addWidget(self.library_status)
             settings_layout.addStretch()
             self.settings_tab.setLayout(settings_layout)
             
             self.tabs.addTab(self.settings_tab, "Settings")
 
-            # Create system tray
-            self.create_tray_icon()
-            
-            # Setup timer for status checks
-            self.timer = QTimer(self)
-            self.timer.timeout.connect(self.start_status_check)
-            self.timer.start(2000)
-            
-            self.load_history()
+            # Diagnostics Tab
+            self.diagnostics_tab = QWidget()
+            diagnostics_layout = QVBoxLayout()
+            self.metrics_view = QPlainTextEdit()
+            self.metrics_view.setReadOnly(True)
+            self.metrics_view.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+            diagnostics_layout.addWidget(self.metrics_view)
+
+            export_layout = QHBoxLayout()
+            export_json_button = QPushButton("Export JSON")
+            export_json_button.clicked.connect(lambda: self.export_metrics("json"))
+            export_prometheus_button = QPushButton("Export Prometheus")
+            export_prometheus_button.clicked.connect(lambda: self.export_metrics("prometheus"))
+            self.auto_export_checkbox = QCheckBox(f"Export both every {METRICS_EXPORT_INTERVAL}s")
+            self.auto_export_checkbox.setChecked(settings.value("metrics_auto_export", False, bool))
+            self.auto_export_checkbox.toggled.connect(self.toggle_metrics_auto_export)
+            export_layout.addWidget(export_json_button)
+            export_layout.addWidget(export_prometheus_button)
+            export_layout.addWidget(self.auto_export_checkbox)
+            export_layout.addStretch()
+            diagnostics_layout.addLayout(export_layout)
+            self.metrics_status = QLabel(f"Exports are written to {USER_DATA_DIR}")
+            diagnostics_layout.addWidget(self.metrics_status)
+            self.diagnostics_tab.setLayout(diagnostics_layout)
+            self.tabs.addTab(self.diagnostics_tab, "Diagnostics")
+
+            # Refreshed only while the tab is showing
+            self.metrics_refresh_timer = QTimer(self)
+            self.metrics_refresh_timer.setInterval(POLL_INTERVAL * 1000)
+            self.metrics_refresh_timer.timeout.connect(self.refresh_diagnostics)
+            self.stats_refresh_timer = QTimer(self)
+            self.stats_refresh_timer.setInterval(POLL_INTERVAL * 1000)
+            self.stats_refresh_timer.timeout.connect(self.refresh_stats)
+            self.metrics_export_timer = QTimer(self)
+            self.metrics_export_timer.setInterval(METRICS_EXPORT_INTERVAL * 1000)
+            self.metrics_export_timer.timeout.connect(self.export_metrics_files)
+            if self.auto_export_checkbox.isChecked():
+                self.metrics_export_timer.start()
+
+            # History and polling are set up once the event loop has started
+            QTimer.singleShot(0, self.finish_startup)
+        except Exception as e:
+            logging.error("Error in initialization: %s", e, exc_info=True)
+            raise
+
+    def finish_startup(self):
+        """Open the history and start polling; runs after the first paint."""
+        if self.core.history_store:
+            return
+        try:
+            self.startup_times["event_loop_started"] = time.time()
+            self.core.start()
+            self.archive_timer = QTimer(self)
+            self.archive_timer.timeout.connect(self.core.archive_history)
+            self.archive_timer.start(HISTORY_ARCHIVE_INTERVAL * 1000)
+
+            if self.tabs.currentWidget() is self.history_tab:
+                self.build_history_view()
+            self.scan_library()
+            self.startup_times["ready"] = time.time()
         except Exception as e:
-            logging.error(f"Error in initialization: {str(e)}", exc_info=True)
+            logging.error("Error finishing startup: %s", e, exc_info=True)
             raise
 
+        if self.startup_benchmark_file:
+            self.write_startup_benchmark()
+
+    def run_core_event(self, callback, args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.error("Error handling %s: %s", getattr(callback, "__name__", callback), e, exc_info=True)
+
+    def on_core_event(self, event, data):
+        if event == "playback":
+            self.update_now_playing()
+        elif event == "library_scanned":
+            self.library_status.setText(
+                f"Found {len(data['files'])} media files in {data['directories']} folders "
+                f"({data['seconds']:.1f}s); added {data['seeded']} to history, found {data['repaired']} moved files.")
+        elif event == "history_archived" and self.history_model:
+            self.load_history()
+
+    def set_archive_days(self):
+        write_setting("history_archive_days", self.archive_days_spin.value())
+        self.core.archive_history()
+
+    def set_status_backend(self, index):
+        self.core.set_status_backend(self.status_backend_combo.itemData(index))
+
+    def write_startup_benchmark(self):
+        """Record startup milestones for benchmarks/startup.py and exit."""
+        with open(self.startup_benchmark_file, "w") as f:
+            json.dump(self.startup_times, f)
+        QTimer.singleShot(0, self.quit_application)
+
+    def on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.history_tab and self.core.history_store:
+            self.build_history_view()
+        if self.tabs.widget(index) is self.diagnostics_tab:
+            self.refresh_diagnostics()
+            self.metrics_refresh_timer.start()
+        else:
+            self.metrics_refresh_timer.stop()
+        if self.tabs.widget(index) is self.stats_tab and self.core.stats:
+            self.stats_version = None  # Redraw anyway; entries become abandoned just by time passing
+            self.refresh_stats()
+            self.stats_refresh_timer.start()
+        else:
+            self.stats_refresh_timer.stop()
+
+    def refresh_diagnostics(self):
+        self.metrics_view.setPlainText(format_metrics(metrics.snapshot()))
+
+    def refresh_stats(self):
+        """Redraw the Stats tab if the history changed since it was last drawn."""
+        if self.core.stats.version == self.stats_version:
+            return
+        try:
+            self.stats_version = self.core.stats.version
+            self.stats_view.setPlainText(format_stats(self.core.stats.summary()))
+        except Exception as e:
+            logging.error("Error showing stats: %s", e, exc_info=True)
+
+    def export_stats(self, fmt):
+        path = STATS_CSV_FILE if fmt == "csv" else STATS_JSON_FILE
+        try:
+            self.core.stats.export(path, fmt)
+            self.stats_status.setText(f"Exported to {path}")
+        except Exception as e:
+            logging.error("Error exporting stats: %s", e, exc_info=True)
+            self.stats_status.setText(f"Export failed: {str(e)}")
+
+    def export_metrics(self, fmt):
+        path = METRICS_PROMETHEUS_FILE if fmt == "prometheus" else METRICS_JSON_FILE
+        try:
+            metrics.export(path, fmt)
+            self.metrics_status.setText(f"Exported to {path}")
+        except Exception as e:
+            logging.error("Error exporting metrics: %s", e, exc_info=True)
+            self.metrics_status.setText(f"Export failed: {str(e)}")
+
+    def export_metrics_files(self):
+        """Write both export formats, for monitoring that picks them up from disk."""
+        self.export_metrics("json")
+        self.export_metrics("prometheus")
+
+    def toggle_metrics_auto_export(self, enabled):
+        QSettings("VLCTracker", "Settings").setValue("metrics_auto_export", enabled)
+        if enabled:
+            self.export_metrics_files()
+            self.metrics_export_timer.start()
+        else:
+            self.metrics_export_timer.stop()
+
+    def build_history_view(self):
+        if self.history_model:
+            return
+        self.history_list = QListView()
+        self.history_model = HistoryModel(self, archive=self.core.history_store)
+        self.history_delegate = HistoryDelegate(self.history_list)
+        self.history_list.setModel(self.history_model)
+        self.history_list.setItemDelegate(self.history_delegate)
+        self.history_list.setUniformItemSizes(True)
+        self.history_list.setMouseTracking(True)
+        self.history_list.doubleClicked.connect(self.play_history_item)
+        self.history_delegate.delete_requested.connect(self.delete_history_entry)
+        self.core.history_store.add_listener(self.history_model.apply_change)
+
+        filter_row = QHBoxLayout()
+        self.history_search = QLineEdit()
+        self.history_search.setPlaceholderText("Search history")
+        self.history_search.setClearButtonEnabled(True)
+        self.history_search.textChanged.connect(self.filter_history)
+        filter_row.addWidget(self.history_search)
+        self.history_filter_combo = QComboBox()
+        for label, status in HISTORY_FILTERS:
+            self.history_filter_combo.addItem(label, status)
+        self.history_filter_combo.currentIndexChanged.connect(self.filter_history)
+        filter_row.addWidget(self.history_filter_combo)
+        self.history_tab.layout().addLayout(filter_row)
+        self.history_tab.layout().addWidget(self.history_list)
+        self.load_history()
+
     def show_startup_dialog(self):
         msg = QMessageBox()
         msg.setIcon(QMessageBox.Icon.Question)
@@ -420,46 +680,39 @@ class VLCTracker(QWidget):
             settings.setValue("startup_configured", True)
             settings.setValue("run_at_startup", False)
 
-    def start_status_check(self):
-        # Use QMetaObject.invokeMethod for thread-safe invocation
-        QMetaObject.invokeMethod(self.worker, "check_status", Qt.ConnectionType.QueuedConnection)
-
-    def on_status_ready(self, status):
-        try:
-            logging.debug(f"Status received: {status}")
-            
-            # Check if file changed
-            if self.current_file and status["file"] != self.current_file:
-                # Save progress for previous file before updating
-                is_watched = False
-                if hasattr(self, 'last_total_length') and self.last_total_length > 0:
-                    time_remaining = self.last_total_length - self.current_time
-                    is_watched = (time_remaining <= 90 or 
-                                (self.current_time / self.last_total_length) > 0.95)
-                
-                new_path = rename_media_file(
-                    self.current_file, 
-                    is_watched, 
-                    format_time_filename(self.current_time)
-                )
-                self.add_to_history(new_path, format_time(self.current_time), is_watched)
-            
-            # Update current status
-            self.vlc_running = True
-            self.current_file = status["file"]
-            self.current_time = status["time"]
-            self.current_state = status["state"]
-            self.last_total_length = status["length"]
-            
-            # Update display
-            display_file = os.path.basename(self.current_file) if self.current_file else "Unknown"
-            state_str = "Paused" if self.current_state == "paused" else "Playing"
-            self.now_playing_label.setText(
-                f"{state_str}: {display_file} - {format_time(self.current_time)}"
-            )
-            
-        except Exception as e:
-            logging.error(f"Error processing status: {str(e)}", exc_info=True)
+    def add_library_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Add Library Folder")
+        if not folder or folder in library_folders():
+            return
+        self.library_list.addItem(folder)
+        self.save_library_folders()
+        self.scan_library()
+
+    def remove_library_folder(self):
+        for item in self.library_list.selectedItems():
+            self.library_list.takeItem(self.library_list.row(item))
+        self.save_library_folders()
+
+    def save_library_folders(self):
+        folders = [self.library_list.item(row).text() for row in range(self.library_list.count())]
+        write_setting("library_folders", folders)
+
+    def scan_library(self):
+        if self.core.scan_library():
+            self.library_status.setText("Scanning library...")
+
+    def update_now_playing(self):
+        lines = []
+        for endpoint, state in self.core.playback.items():
+            if not state.current_file:
+                continue
+            display_file = os.path.basename(state.current_file)
+            state_str = "Paused" if state.current_state == "paused" else "Playing"
+            line = f"{state_str}: {display_file} - {format_time(state.current_time)}"
+            # Only name the instance when more than one is being tracked
+            tracked = len(self.core.engine.pollers) if self.core.engine else 1
+            lines.append(f"[{endpoint}] {line}" if tracked > 1 else line)
+        self.now_playing_label.setText("\n".join(lines) if lines else "No video playing.")
 
     def toggle_startup(self):
         if self.startup_checkbox.isChecked():
@@ -478,37 +731,6 @@ class VLCTracker(QWidget):
                 settings.setValue("run_at_startup", False)
                 self.startup_checkbox.setText("Run on Windows Startup")
 
-    def on_vlc_not_running(self):
-        if self.skip_next_rename:
-            self.skip_next_rename = False
-            self.vlc_running = False
-            self.current_file = None
-            self.current_time = 0
-            self.current_state = None
-            self.now_playing_label.setText("No video playing.")
-            return
-        
-        if self.vlc_running and self.current_file and self.current_time > 0:
-            is_watched = False
-            if hasattr(self, 'last_total_length') and self.last_total_length > 0:
-                time_remaining = self.last_total_length - self.current_time
-                is_watched = (time_remaining <= 90 or 
-                            (self.current_time / self.last_total_length) > 0.95)
-            
-            new_path = rename_media_file(
-                self.current_file, 
-                is_watched, 
-                format_time_filename(self.current_time)
-            )
-            
-            self.add_to_history(new_path, format_time(self.current_time), is_watched)
-            self.current_file = None
-            self.current_time = 0
-            self.current_state = None
-        
-        self.vlc_running = False
-        self.now_playing_label.setText("No video playing.")
-
     def create_tray_icon(self):
         try:
             self.tray_icon = QSystemTrayIcon(self)
@@ -522,9 +744,9 @@ class VLCTracker(QWidget):
             
             if os.path.exists(icon_path):
                 self.tray_icon.setIcon(QIcon(icon_path))
-                logging.debug(f"Set tray icon from: {icon_path}")
+                logging.debug("Set tray icon from: %s", icon_path)
             else:
-                logging.error(f"Tray icon not found at: {icon_path}")
+                logging.error("Tray icon not found at: %s", icon_path)
 
             # Create tray menu
             tray_menu = QMenu()
@@ -538,7 +760,7 @@ class VLCTracker(QWidget):
             self.tray_icon.show()
             logging.debug("Tray icon created and shown")
         except Exception as e:
-            logging.error(f"Error creating tray icon: {str(e)}", exc_info=True)
+            logging.error("Error creating tray icon: %s", e, exc_info=True)
 
 
     def on_tray_icon_activated(self, reason):
@@ -562,151 +784,75 @@ class VLCTracker(QWidget):
             else:
                 logging.error("Tray icon not available for minimize")
         except Exception as e:
-            logging.error(f"Error in closeEvent: {str(e)}", exc_info=True)
+            logging.error("Error in closeEvent: %s", e, exc_info=True)
         
     def quit_application(self):
+        self.core.stop()
+        # Deliver what the core's threads posted while stopping before the history is written out
+        QApplication.processEvents()
+        self.core.close()
+        if self.metrics_export_timer.isActive():
+            self.export_metrics_files()
         self.tray_icon.hide()
+        stop_logging()
         QApplication.quit()
 
-    def update_status(self):
-    # Check if VLC is running before attempting connection
-        if not is_vlc_running():
-            if self.vlc_running and self.current_file and self.current_time > 0:
-                # Calculate if video was watched based on last known values
-                is_watched = False
-                if hasattr(self, 'last_total_length') and self.last_total_length > 0:
-                    time_remaining = self.last_total_length - self.current_time
-                    # Consider it watched if within 90 seconds of the end OR 95% complete
-                    is_watched = (time_remaining <= 90 or 
-                                (self.current_time / self.last_total_length) > 0.95)
-                
-                # Rename the actual file
-                new_path = rename_media_file(
-                    self.current_file, 
-                    is_watched, 
-                    format_time_filename(self.current_time)
-                )
-                
-                self.add_to_history(new_path, format_time(self.current_time), is_watched)
-                self.current_file = None
-                self.current_time = 0
-                self.current_state = None
-            self.vlc_running = False
-            self.now_playing_label.setText("No video playing.")
-            return
-        
-        # Fetch status via telnet
-        status = get_vlc_status_telnet()
-        if status:
-            self.vlc_running = True
-            self.current_file = status["file"]
-            self.current_time = status["time"]
-            self.current_state = status["state"]
-            self.last_total_length = status["length"]  # Store length for later use
-            display_file = os.path.basename(self.current_file) if self.current_file else "Unknown"
-            state_str = "Paused" if self.current_state == "paused" else "Playing"
-            self.now_playing_label.setText(
-                f"{state_str}: {display_file} - {format_time(self.current_time)}"
-            )
-        
+    def filter_history(self, *_):
+        try:
+            with metrics.timer("history_search_seconds"):
+                self.history_model.set_filter(self.history_search.text(),
+                                              self.history_filter_combo.currentData())
+        except Exception as e:
+            logging.error("Error filtering history: %s", e, exc_info=True)
+
     def load_history(self):
-        self.history_list.clear()
         try:
-            with open(HISTORY_FILE, "r") as f:
-                history = json.load(f)
-                for entry in history:
-                    # Create widget for the entry
-                    item_widget = QWidget()
-                    layout = QHBoxLayout()
-                    layout.setContentsMargins(5, 5, 5, 5)  # Add padding
-                    
-                    # Create label for file info
-                    label = QLabel(f"{os.path.basename(entry['file'])} - {entry['timestamp']}")
-                    label.setStyleSheet("color: black;")
-                    layout.addWidget(label)
-                    
-                    # Create delete button
-                    delete_btn = QPushButton()
-                    delete_btn.setFixedSize(24, 24)
-                    delete_btn.setIcon(QIcon(TRASH_ICON_FILE) if os.path.exists(TRASH_ICON_FILE) else QIcon("trash.png"))
-                    delete_btn.setToolTip("Delete from history")
-                    delete_btn.setProperty("file_path", entry['file'])
-                    delete_btn.clicked.connect(self.delete_history_entry)
-                    layout.addWidget(delete_btn)
-                    layout.addStretch()
-                    
-                    item_widget.setLayout(layout)
-                    
-                    # Store the file path for double click handling
-                    item_widget.setProperty("file_path", entry['file'])
-                    
-                    # Set background color and hover effect based on status
-                    base_style = """
-                    QWidget {
-                        border-radius: 5px;
-                        padding: 5px;
-                        margin: 2px;
-                    }
-                    QWidget:hover {
-                        border: 1px solid #666;
-                        background-color: rgba(255, 255, 255, 0.2);
-                    }
-                    """
-                    
-                    if entry.get('watched', False):
-                        item_widget.setStyleSheet(f"{base_style} QWidget {{ background-color: #90EE90; }} QLabel {{ color: black; }}")
-                    else:
-                        timestamp = entry['timestamp']
-                        if timestamp != "[WATCHED]":
-                            try:
-                                minutes, seconds = map(int, timestamp.split(':'))
-                                current_time = minutes * 60 + seconds
-                                total_length = entry.get('length', 0)
-                                
-                                if total_length > 0:
-                                    progress = current_time / total_length
-                                    if progress > 0.5:
-                                        item_widget.setStyleSheet(f"{base_style} QWidget {{ background-color: #FFD700; }} QLabel {{ color: black; }}")
-                                    else:
-                                        item_widget.setStyleSheet(f"{base_style} QWidget {{ background-color: #FFB6C1; }} QLabel {{ color: black; }}")
-                                else:
-                                    item_widget.setStyleSheet(f"{base_style} QWidget {{ background-color: #FFB6C1; }} QLabel {{ color: black; }}")
-                            except:
-                                item_widget.setStyleSheet(f"{base_style} QWidget {{ background-color: #FFB6C1; }} QLabel {{ color: black; }}")
-                        else:
-                            item_widget.setStyleSheet(f"{base_style} QWidget {{ background-color: #90EE90; }} QLabel {{ color: black; }}")
-                    
-                    # Create and add list widget item
-                    item = QListWidgetItem()
-                    item.setSizeHint(item_widget.sizeHint())
-                    self.history_list.addItem(item)
-                    self.history_list.setItemWidget(item, item_widget)
-                    
-        except (FileNotFoundError, json.JSONDecodeError):
-            with open(HISTORY_FILE, "w") as f:
-                json.dump([], f)
+            with metrics.timer("load_history_seconds"):
+                self.history_model.set_entries(self.core.history_store.entries())
+        except Exception as e:
+            logging.error("Error loading history: %s", e, exc_info=True)
     
-    def play_history_item(self, item):
+    def play_history_item(self, index):
         try:
-            widget = self.history_list.itemWidget(item)
-            if widget:
-                file_path = widget.property("file_path")
+            if index.isValid():
+                file_path = index.data(HistoryModel.FilePathRole)
                 if file_path and os.path.exists(file_path):
-                    # Set flag to skip next rename
-                    self.skip_next_rename = True
-                    # Start VLC with the file
-                    os.startfile(file_path)
-                else:
-                    QMessageBox.warning(self, "File Not Found", 
-                        "The video file could not be found.\nIt may have been moved or deleted.")
+                    self.play_file(file_path)
+                elif file_path:
+                    # It may have been moved; finding it reads fingerprints, so not on the GUI thread
+                    threading.Thread(target=self.find_moved_file, args=(file_path,), name="FindMovedFile",
+                                     daemon=True).start()
         except Exception as e:
-            logging.error(f"Error playing history item: {str(e)}", exc_info=True)
+            logging.error("Error playing history item: %s", e, exc_info=True)
 
-    def delete_history_entry(self):
-        # Get the sender button
-        button = self.sender()
-        file_path = button.property("file_path")
-        
+    def find_moved_file(self, file_path):
+        """Worker thread: look for every missing history file, then hand the moves to the GUI thread."""
+        try:
+            moves = self.core.history_store.moved_files(self.core.fingerprints)
+        except Exception as e:
+            logging.error("Error looking for moved files: %s", e, exc_info=True)
+            moves = []
+        self.core.post(self.play_moved_file, file_path, moves)
+
+    def play_moved_file(self, file_path, moves):
+        for old_path, new_path in moves:
+            if self.core.history_store.rename(old_path, new_path):
+                logging.info("Repaired history path %s -> %s", old_path, new_path)
+        new_path = dict(moves).get(file_path)
+        if new_path:
+            # The file was moved; play it from where it is now
+            self.play_file(new_path)
+        else:
+            QMessageBox.warning(self, "File Not Found", 
+                "The video file could not be found.\nIt may have been moved or deleted.")
+
+    def play_file(self, file_path):
+        # Set flag to skip next rename
+        self.core.skip_next_rename = True
+        # Start VLC with the file
+        os.startfile(file_path)
+
+    def delete_history_entry(self, file_path):
         try:
             # Show confirmation dialog
             msg = QMessageBox()
@@ -725,57 +871,11 @@ class VLCTracker(QWidget):
                         QMessageBox.critical(self, "Error", f"Could not delete file:\n{str(e)}")
                         return
                 
-                # Remove from history
-                with open(HISTORY_FILE, "r") as f:
-                    history = json.load(f)
-                
-                # Remove the entry with matching file path
-                history = [entry for entry in history if entry['file'] != file_path]
+                # Remove from history; the model drops the row when notified
+                self.core.history_store.delete(file_path)
                 
-                with open(HISTORY_FILE, "w") as f:
-                    json.dump(history, f, indent=4)
-                    
-                # Refresh the history display
-                self.load_history()
-                
-        except (FileNotFoundError, json.JSONDecodeError):
-            pass
-
-    def add_to_history(self, file, timestamp, is_watched=False):
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                history = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            history = []
-        
-        # Look for existing entry with the same base filename (ignoring timestamps)
-        file_found = False
-        base_name = os.path.basename(file)
-        if base_name.startswith('['):
-            base_name = base_name[base_name.find(']') + 1:].strip()
-        
-        for entry in history:
-            entry_base = os.path.basename(entry['file'])
-            if entry_base.startswith('['):
-                entry_base = entry_base[entry_base.find(']') + 1:].strip()
-                
-            if entry_base == base_name:
-                entry['file'] = file  # Update with new path
-                entry['timestamp'] = "[WATCHED]" if is_watched else timestamp
-                entry['watched'] = is_watched
-                file_found = True
-                break
-        
-        if not file_found:
-            history.append({
-                "file": file,
-                "timestamp": "[WATCHED]" if is_watched else timestamp,
-                "watched": is_watched,
-                "length": self.last_total_length if hasattr(self, 'last_total_length') else 0
-            })
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(history, f, indent=4)
-        self.load_history()
+        except Exception as e:
+            logging.error("Error deleting history entry: %s", e, exc_info=True)
 
 if __name__ == "__main__":
     setup_logging()
@@ -785,5 +885,8 @@ if __name__ == "__main__":
     
     app = QApplication(sys.argv)
     tracker = VLCTracker()
+    if "--startup-benchmark" in sys.argv:
+        tracker.startup_times["imported"] = IMPORTED_AT
+        tracker.startup_benchmark_file = sys.argv[sys.argv.index("--startup-benchmark") + 1]
     tracker.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,309 @@
+"""
+In-process fakes of VLC's rc/telnet interface (FakeVLCServer) and its web
+interface (FakeVLCHTTPServer).
+
+Speaks enough of the protocol for the tracker: the password prompt (with
+the telnet echo negotiation VLC sends), `status`, `get_time` and
+`get_length`. Playback state is scriptable, playback time advances in real
+time while "playing", and latency and faults can be injected. With
+push_events set, playback changes are announced to every logged-in
+client the way VLC prints them, e.g. "( new input: ... )":
+
+    with FakeVLCServer(password="secret", latency=0.02) as vlc:
+        vlc.play("file:///C:/Videos/Episode%201.mkv", time=120, length=1500)
+        vlc.drop_every = 10  # Close the connection after every 10th command
+        ...connect to ("127.0.0.1", vlc.port)...
+"""
+import base64
+import json
+import re
+import socket
+import threading
+import time
+
+IAC_SEQUENCE = re.compile(rb"\xff[\xfb-\xfe].|\xff[\xf0-\xfa]")
+WILL_ECHO = b"\xff\xfb\x01"
+WONT_ECHO = b"\xff\xfc\x01"
+
+
+class FakeVLCServer:
+    def __init__(self, password="", latency=0.0, host="127.0.0.1", port=0):
+        self.password = password
+        self.latency = latency  # Round-trip delay added before answering each batch of commands
+        self.host = host
+        self.port = port
+
+        # Faults
+        self.drop_every = 0  # Close the connection after every Nth command
+        self.stall_every = 0  # Never answer every Nth command
+        self.garbage = False  # Prefix replies with bytes VLC would never send
+        self.push_events = False  # Announce playback changes without being asked
+
+        self.file = None
+        self.plid = -1  # Playlist id of the current item, new for every play()
+        self.length = 0
+        self.state = "stopped"
+        self._time = 0
+        self._time_base = time.monotonic()
+
+        self.connections = 0
+        self.logins = 0
+        self.commands = 0
+        self.lock = threading.Lock()
+        self.sockets = []
+        self.clients = []  # Logged-in rc connections, for push_events
+        self.listener = None
+
+    # Playback scripting
+
+    @property
+    def time(self):
+        if self.state == "playing":
+            return min(self.length, int(self._time + time.monotonic() - self._time_base))
+        return self._time
+
+    def seek(self, seconds):
+        self._time = seconds
+        self._time_base = time.monotonic()
+
+    def play(self, file, time=0, length=0, state="playing"):
+        self.file = file
+        self.plid = max(self.plid, 2) + 1
+        self.length = length
+        self.state = state
+        self.seek(time)
+        self._push(f"( new input: {file} )", f"( state {state} )")
+
+    def pause(self):
+        self.seek(self.time)
+        self.state = "paused"
+        self._push("( state paused )")
+
+    def resume(self):
+        self.seek(self.time)
+        self.state = "playing"
+        self._push("( state playing )")
+
+    def stop(self):
+        self.file = None
+        self.plid = -1
+        self.state = "stopped"
+        self.seek(0)
+        self._push("( state stopped )")
+
+    def _push(self, *lines):
+        if not self.push_events:
+            return
+        data = "".join(f"{line}\r\n" for line in lines).encode("utf-8")
+        with self.lock:
+            clients = list(self.clients)
+        for sock in clients:
+            try:
+                sock.sendall(data)
+            except OSError:
+                pass
+
+    # Server lifecycle
+
+    def start(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept, name="FakeVLCServer", daemon=True).start()
+        return self
+
+    def close(self):
+        if self.listener:
+            self.listener.close()
+            self.listener = None
+        self.drop_connections()
+
+    def drop_connections(self):
+        """Close every open client connection, as VLC does when it quits."""
+        with self.lock:
+            sockets, self.sockets = self.sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                sock.close()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _accept(self):
+        while self.listener:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.sockets.append(sock)
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    # Protocol
+
+    def _serve(self, sock):
+        reader = sock.makefile("rb")
+        try:
+            sock.sendall(b"VLC media player 3.0.20 Vetinari\r\nPassword: " + WILL_ECHO)
+            password = IAC_SEQUENCE.sub(b"", reader.readline()).strip().decode("utf-8", "ignore")
+            if password != self.password:
+                sock.sendall(WONT_ECHO + b"\r\nWrong password\r\nPassword: ")
+                return
+            # Registered before the prompt goes out, so a client that has seen it never misses a push
+            with self.lock:
+                self.logins += 1
+                self.clients.append(sock)
+            sock.sendall(WONT_ECHO + b"\r\nWelcome, Master\r\n> ")
+
+            # Like VLC, commands that arrive together are answered together,
+            # so a pipelined batch gets one write rather than one per reply
+            buffer = b""
+            while True:
+                data = reader.read1(4096)
+                if not data:
+                    return
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                if lines and self.latency:
+                    time.sleep(self.latency)
+                output = b""
+                for line in lines:
+                    command = IAC_SEQUENCE.sub(b"", line).strip().decode("utf-8", "ignore")
+                    with self.lock:
+                        self.commands += 1
+                        count = self.commands
+                    if self.stall_every and count % self.stall_every == 0:
+                        continue
+                    reply = self.reply(command)
+                    if self.garbage:
+                        reply = b"\x00\x7f garbage \x00\r\n" + reply
+                    output += reply + b"> "
+                    if self.drop_every and count % self.drop_every == 0:
+                        sock.sendall(output)
+                        return
+                if output:
+                    sock.sendall(output)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                if sock in self.clients:
+                    self.clients.remove(sock)
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def reply(self, command):
+        if command == "status":
+            lines = []
+            if self.file:
+                lines.append(f"( new input: {self.file} )")
+            lines.append("( audio volume: 256 )")
+            lines.append(f"( state {self.state} )")
+            return "".join(f"{line}\r\n" for line in lines).encode("utf-8")
+        if command == "get_time":
+            return f"{self.time}\r\n".encode() if self.file else b"\r\n"
+        if command == "get_length":
+            return f"{self.length}\r\n".encode() if self.file else b"\r\n"
+        if command in ("logout", "quit"):
+            return b"Bye-bye!\r\n"
+        return f"Unknown command `{command}'. Type `help' for help.\r\n".encode()
+
+
+class FakeVLCHTTPServer(FakeVLCServer):
+    """
+    Fake of VLC's web interface serving /requests/status.json and
+    /requests/playlist.json. Requests need basic auth with an empty user
+    name, as VLC does, and connections are kept alive between requests.
+    Playback scripting and faults work as in FakeVLCServer; every request
+    counts as one command.
+    """
+
+    def _serve(self, sock):
+        reader = sock.makefile("rb")
+        try:
+            while True:
+                request_line = reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while True:
+                    line = reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                path = request_line.decode("latin-1").split(" ")[1]
+
+                with self.lock:
+                    self.commands += 1
+                    count = self.commands
+                if self.latency:
+                    time.sleep(self.latency)
+                if self.stall_every and count % self.stall_every == 0:
+                    continue
+
+                status, body = self.respond(path, headers)
+                if self.garbage:
+                    body = b"\x00\x7f garbage \x00" + body
+                head = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                if status.startswith("401"):
+                    head += 'WWW-Authenticate: Basic realm="VLC stream"\r\n'
+                sock.sendall(head.encode("latin-1") + b"\r\n" + body)
+                if self.drop_every and count % self.drop_every == 0:
+                    return
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except OSError:
+            pass
+        finally:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def respond(self, path, headers):
+        expected = "Basic " + base64.b64encode(f":{self.password}".encode()).decode()
+        if self.password and headers.get("authorization") != expected:
+            return "401 Unauthorized", b""
+        if path.startswith("/requests/status.json"):
+            return "200 OK", json.dumps(self.status_json()).encode()
+        if path.startswith("/requests/playlist.json"):
+            return "200 OK", json.dumps(self.playlist_json()).encode()
+        return "404 Not Found", b""
+
+    def status_json(self):
+        status = {
+            "fullscreen": False,
+            "volume": 256,
+            "state": self.state,
+            "currentplid": self.plid,
+            "time": self.time if self.file else 0,
+            "length": self.length if self.file else 0,
+            "position": self.time / self.length if self.file and self.length else 0,
+            "version": "3.0.20 Vetinari",
+            "information": {"category": {"meta": {}}},
+        }
+        if self.file:
+            status["information"]["category"]["meta"]["filename"] = self.file.rsplit("/", 1)[-1]
+        return status
+
+    def playlist_json(self):
+        items = []
+        if self.file:
+            items.append({"type": "leaf", "name": self.file.rsplit("/", 1)[-1], "id": str(self.plid),
+                          "duration": self.length, "uri": self.file, "current": "current"})
+        return {"type": "node", "name": "", "id": "0", "children": [
+            {"type": "node", "name": "Playlist", "id": "1", "children": items},
+            {"type": "node", "name": "Media Library", "id": "2", "children": []},
+        ]}
@@ -0,0 +1,381 @@
+"""
+Benchmark suite for VLC Tracker's polling and persistence hot paths.
+
+Polling is measured against FakeVLCServer, an in-process fake of VLC's rc
+interface, so no VLC installation is needed:
+
+- poll_latency: end-to-end latency of get_vlc_status_telnet with a one-off
+  connection per poll (the old behaviour), a reused session, a reused
+  session sending the commands one at a time, the asyncio session and the
+  HTTP status.json backend, against a fast, a slow and a flaky fake VLC
+- worker_cpu: CPU time per tick on the polling thread, split into the
+  status fetch and the VLC process check
+- history: the cost of add_to_history, load_history and searching the
+  history as you type, at 100, 10k and 100k entries, of opening the
+  history once all but a recent window is archived, and of loading and
+  updating the watch statistics
+- library: a cold library scan and an unchanged rescan of a generated tree
+  of 20k (or 200k) media files
+- samples: recording poll samples in the playback sample log, their size on
+  disk, and the first and a later query of one file's samples
+
+Results can be written as JSON and compared with an earlier run:
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import tracker_core  # noqa: E402
+from fake_vlc import FakeVLCServer, FakeVLCHTTPServer  # noqa: E402
+
+PASSWORD = "benchmark"
+MEDIA = "file:///C:/Videos/Benchmark%20Show%20S01E01.mkv"
+MEDIA_SERIES = "file:///C:/Videos/Benchmark%20Show%20S01E{:02d}.mkv"
+SCENARIOS = {
+    "fast": {},
+    "slow": {"latency": 0.005},
+    "flaky": {"drop_every": 9},
+}
+
+
+def latency_stats(samples, failures=0):
+    samples = sorted(samples)
+    return {
+        "p50_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000,
+        "max_ms": samples[-1] * 1000,
+        "polls": len(samples),
+        "failures": failures,
+    }
+
+
+def make_server(scenario, server_class=FakeVLCServer):
+    options = dict(SCENARIOS[scenario])
+    server = server_class(password=PASSWORD, latency=options.pop("latency", 0.0))
+    for name, value in options.items():
+        setattr(server, name, value)
+    server.play(MEDIA, time=60, length=1500)
+    return server
+
+
+def time_polls(poll, count):
+    samples = []
+    failures = 0
+    for _ in range(count):
+        started = time.perf_counter()
+        status = poll()
+        samples.append(time.perf_counter() - started)
+        if not status:
+            failures += 1
+    return latency_stats(samples, failures)
+
+
+def bench_poll_latency(polls):
+    results = {}
+    for scenario in SCENARIOS:
+        with make_server(scenario) as server:
+            def one_off():
+                return tracker_core.get_vlc_status_telnet("127.0.0.1", server.port, PASSWORD, check_process=False)
+            results[f"poll_latency.{scenario}.one_off"] = time_polls(one_off, polls)
+
+            session = tracker_core.VLCTelnetSession("127.0.0.1", server.port, PASSWORD, min_backoff=0)
+
+            def reused():
+                return tracker_core.get_vlc_status_telnet(session=session, check_process=False)
+            results[f"poll_latency.{scenario}.session"] = time_polls(reused, polls)
+
+            def serial():
+                # One round-trip per command, as before pipelining
+                try:
+                    if not session.is_alive() and not session.connect():
+                        return None
+                    replies = [session.command(command) for command in tracker_core.STATUS_COMMANDS]
+                    return tracker_core.parse_status_replies(*replies)
+                except (OSError, EOFError):
+                    return None
+            results[f"poll_latency.{scenario}.session_serial"] = time_polls(serial, polls)
+            session.close()
+
+            async def run_async():
+                async_session = tracker_core.AsyncVLCSession("127.0.0.1", server.port, PASSWORD, min_backoff=0)
+                samples = []
+                failures = 0
+                for _ in range(polls):
+                    started = time.perf_counter()
+                    status = await tracker_core.get_vlc_status_async(async_session)
+                    samples.append(time.perf_counter() - started)
+                    if not status:
+                        failures += 1
+                async_session.close()
+                return latency_stats(samples, failures)
+            results[f"poll_latency.{scenario}.async"] = asyncio.run(run_async())
+
+        with make_server(scenario, FakeVLCHTTPServer) as server:
+            async def run_http():
+                backend = tracker_core.HTTPBackend("127.0.0.1", server.port, PASSWORD)
+                samples = []
+                failures = 0
+                for _ in range(polls):
+                    started = time.perf_counter()
+                    status = await backend.fetch_status()
+                    samples.append(time.perf_counter() - started)
+                    if not status:
+                        failures += 1
+                backend.close()
+                return latency_stats(samples, failures)
+            results[f"poll_latency.{scenario}.http"] = asyncio.run(run_http())
+    return results
+
+
+def bench_worker_cpu(ticks):
+    results = {}
+    with make_server("fast") as server:
+        async def fetch():
+            session = tracker_core.AsyncVLCSession("127.0.0.1", server.port, PASSWORD)
+            await tracker_core.get_vlc_status_async(session)  # Connect and log in outside the measurement
+            started = time.thread_time()
+            for _ in range(ticks):
+                await tracker_core.get_vlc_status_async(session)
+            session.close()
+            return time.thread_time() - started
+        cpu = asyncio.run(fetch())
+        results["worker_cpu.status_fetch"] = {"cpu_us_per_tick": cpu / ticks * 1e6, "ticks": ticks}
+
+    tracker = tracker_core.VLCProcessTracker()
+    tracker.pids = {os.getpid(): tracker_core.psutil.Process().create_time()}
+    started = time.thread_time()
+    for _ in range(ticks):
+        tracker.is_running()
+    results["worker_cpu.process_check_cached"] = {
+        "cpu_us_per_tick": (time.thread_time() - started) / ticks * 1e6, "ticks": ticks}
+
+    scans = max(1, ticks // 10)
+    started = time.thread_time()
+    for _ in range(scans):
+        tracker.scan()
+    results["worker_cpu.process_scan"] = {
+        "cpu_us_per_tick": (time.thread_time() - started) / scans * 1e6, "ticks": scans}
+    return results
+
+
+def bench_history(sizes, operations):
+    import Tracker  # Only for HistoryModel, which needs no QApplication
+
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.db")
+            store = tracker_core.HistoryStore(path, None, flush_delay=3600)
+            for i in range(size):
+                store.upsert(f"C:\\Videos\\Show {i}.mkv", "10:00", False, 1500)
+            store.close()
+
+            started = time.perf_counter()
+            store = tracker_core.HistoryStore(path, None, flush_delay=3600)
+            opened = time.perf_counter() - started
+
+            model = Tracker.HistoryModel()
+            started = time.perf_counter()
+            model.set_entries(store.entries())
+            loaded = time.perf_counter() - started
+            store.add_listener(model.apply_change)
+            results[f"history.{size}.load_history"] = {"open_ms": opened * 1000, "load_ms": loaded * 1000}
+
+            started = time.perf_counter()
+            model.index_slice(None)
+            indexed = time.perf_counter() - started
+            keystrokes = []
+            for query, status in [("s", None), ("sh", None), ("sho", None), ("show", None), ("show 1", None),
+                                  ("show 12", None), ("show 12", "halfway"), ("", "halfway"), ("", None)]:
+                started = time.perf_counter()
+                model.set_filter(query, status)
+                keystrokes.append(time.perf_counter() - started)
+            results[f"history.{size}.search"] = {
+                "index_ms": indexed * 1000,
+                "keystroke_p50_ms": statistics.median(keystrokes) * 1000,
+                "keystroke_max_ms": max(keystrokes) * 1000,
+            }
+
+            updates = []
+            for i in range(operations):
+                started = time.perf_counter()
+                store.upsert(f"C:\\Videos\\[20-00] Show {i * 7919 % size}.mkv", "20:00", False, 1500)
+                updates.append(time.perf_counter() - started)
+            inserts = []
+            for i in range(operations):
+                started = time.perf_counter()
+                store.upsert(f"C:\\Videos\\New {i}.mkv", "1:00", False, 1500)
+                inserts.append(time.perf_counter() - started)
+            results[f"history.{size}.add_to_history"] = {
+                "update_p50_us": statistics.median(updates) * 1e6,
+                "insert_p50_us": statistics.median(inserts) * 1e6,
+            }
+
+            store.upsert("C:\\Videos\\[WATCHED] Show 0.mkv", "[WATCHED]", True, 1500)
+            started = time.perf_counter()
+            store.flush()
+            results[f"history.{size}.write_behind_flush"] = {
+                "flush_ms": (time.perf_counter() - started) * 1000, "changes": 2 * operations + 1}
+
+            stats = tracker_core.WatchStats(store)
+            started = time.perf_counter()
+            stats.summary()
+            stats_loaded = time.perf_counter() - started
+            stats_updates = []
+            for i in range(operations):
+                started = time.perf_counter()
+                store.upsert(f"C:\\Videos\\[25-00] Show {i * 7919 % size}.mkv", "25:00", True, 1500)
+                stats_updates.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            stats.summary()
+            results[f"history.{size}.stats"] = {
+                "load_ms": stats_loaded * 1000,
+                "update_p50_us": statistics.median(stats_updates) * 1e6,
+                "summary_ms": (time.perf_counter() - started) * 1000,
+            }
+
+            # Archive everything but a recent window, then open the history again
+            store.archive(0)
+            for i in range(operations):
+                store.upsert(f"C:\\Videos\\Recent {i}.mkv", "1:00", False, 1500)
+            store.close()
+            started = time.perf_counter()
+            store = tracker_core.HistoryStore(path, None, flush_delay=3600)
+            model = Tracker.HistoryModel(archive=store)
+            model.set_entries(store.entries())
+            loaded = time.perf_counter() - started
+            started = time.perf_counter()
+            model.fetchMore()
+            paged = time.perf_counter() - started
+            results[f"history.{size}.archived"] = {
+                "open_and_load_ms": loaded * 1000, "page_ms": paged * 1000, "recent": len(store.entries())}
+            store.close()
+    return results
+
+
+def bench_library(file_count):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "library")
+        per_folder = 20
+        for i in range(file_count // per_folder):
+            folder = os.path.join(root, f"Show {i // 20}", f"Season {i % 20}")
+            os.makedirs(folder)
+            for episode in range(per_folder):
+                prefix = "[WATCHED] " if episode % 3 == 0 else ""
+                open(os.path.join(folder, f"{prefix}Episode {episode}.mkv"), "w").close()
+
+        db_path = os.path.join(directory, "history.db")
+        cold = tracker_core.LibraryScanner(db_path=db_path).scan([root])
+        # A fresh scanner, as after a restart, so the cached listings are read back from disk
+        warm = tracker_core.LibraryScanner(db_path=db_path).scan([root])
+        results[f"library.{file_count}.scan"] = {
+            "cold_ms": cold["seconds"] * 1000,
+            "rescan_ms": warm["seconds"] * 1000,
+            "directories": cold["directories"],
+        }
+    return results
+
+
+def bench_samples(sample_count):
+    """Recording poll samples, against what each would cost as a JSON history entry, and querying them."""
+    tracker_core.load_deferred_modules()
+    results = {}
+    per_file = 3000  # About 100 minutes of playback at one sample every 2 seconds
+    with tempfile.TemporaryDirectory() as directory:
+        log = tracker_core.SampleLog(os.path.join(directory, "samples.bin"), os.path.join(directory, "samples.files"))
+        started = time.perf_counter()
+        for i in range(sample_count):
+            log.record({"file": MEDIA_SERIES.format(i // per_file), "time": i % per_file * 2,
+                        "length": per_file * 2, "state": "playing"}, at=1_700_000_000 + i * 2)
+        recorded = time.perf_counter() - started
+        started = time.perf_counter()
+        log.samples(tracker_core.media_path(MEDIA_SERIES.format(0)))
+        first_query = time.perf_counter() - started
+        started = time.perf_counter()
+        log.watched_segments(tracker_core.media_path(MEDIA_SERIES.format(1)))
+        segments = time.perf_counter() - started
+        log.close()
+        entry = {"id": 1, "file": "C:\\Videos\\Benchmark Show S01E00.mkv", "base_name": "Benchmark Show S01E00.mkv",
+                 "timestamp": "10:00", "watched": False, "length": 1500, "updated_at": time.time(),
+                 "fingerprint": "0" * 38}
+        results[f"samples.{sample_count}"] = {
+            "record_us": recorded / sample_count * 1e6,
+            "bytes_per_sample": os.path.getsize(os.path.join(directory, "samples.bin")) / sample_count,
+            "json_entry_bytes": len(json.dumps(entry)),
+            "first_query_ms": first_query * 1000,
+            "segments_ms": segments * 1000,
+        }
+    return results
+
+
+def compare(previous, current):
+    print(f"\n{'metric':<48} {'field':<16} {'before':>10} {'after':>10} {'change':>8}")
+    for name, fields in current.items():
+        old_fields = previous.get(name, {})
+        for field, value in fields.items():
+            old = old_fields.get(field)
+            if not isinstance(value, float) or not isinstance(old, (int, float)):
+                continue
+            change = f"{(value - old) / old * 100:+.0f}%" if old else ""
+            print(f"{name:<48} {field:<16} {old:>10.2f} {value:>10.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Fewer polls, no 100k history, a smaller library")
+    parser.add_argument("--only", choices=["poll_latency", "worker_cpu", "history", "library", "samples"], action="append")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file")
+    args = parser.parse_args()
+
+    polls = 30 if args.quick else 200
+    sizes = [100, 10_000] if args.quick else [100, 10_000, 100_000]
+    suites = args.only or ["poll_latency", "worker_cpu", "history", "library", "samples"]
+
+    results = {}
+    if "poll_latency" in suites:
+        results.update(bench_poll_latency(polls))
+    if "worker_cpu" in suites:
+        results.update(bench_worker_cpu(polls * 5))
+    if "history" in suites:
+        results.update(bench_history(sizes, 200))
+    if "library" in suites:
+        results.update(bench_library(20_000 if args.quick else 200_000))
+    if "samples" in suites:
+        results.update(bench_samples(100_000 if args.quick else 1_000_000))
+
+    for name, fields in results.items():
+        print(f"{name:<48} " + "  ".join(f"{field}={value:.2f}" if isinstance(value, float) else f"{field}={value}"
+                                         for field, value in fields.items()))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"], results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "suite",
+                "python": sys.version.split()[0],
+                "platform": sys.platform,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "quick": args.quick,
+                "results": results,
+            }, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
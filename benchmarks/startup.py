@@ -0,0 +1,93 @@
+"""
+Startup-time benchmark for VLC Tracker.
+
+Launches the tracker with --startup-benchmark, which makes it record when
+its imports finished, when the tray icon was shown, when the event loop
+started and when history and polling were ready, and then quit. Each
+milestone is reported in milliseconds since the process was launched.
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --exe build/VLCTracker/VLCWatcher.exe
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MILESTONES = ["imported", "tray_shown", "event_loop_started", "ready"]
+
+
+def run_once(command, timeout):
+    """Launch the tracker once and return its milestones in ms since launch."""
+    fd, output = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        launched = time.time()
+        subprocess.run(command + ["--startup-benchmark", output], timeout=timeout, check=True)
+        exited = time.time()
+        with open(output) as f:
+            times = json.load(f)
+    finally:
+        os.remove(output)
+
+    result = {name: (times[name] - launched) * 1000 for name in MILESTONES if name in times}
+    result["exited"] = (exited - launched) * 1000
+    return result
+
+
+def summarize(runs):
+    summary = {}
+    for name in MILESTONES + ["exited"]:
+        values = [run[name] for run in runs if name in run]
+        if values:
+            summary[name] = {
+                "median_ms": statistics.median(values),
+                "min_ms": min(values),
+                "max_ms": max(values),
+            }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--exe", help="Benchmark a cx_Freeze build instead of Tracker.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.exe:
+        command = [os.path.abspath(args.exe)]
+    else:
+        command = [sys.executable, os.path.join(ROOT, "Tracker.py")]
+
+    # The first launch warms the OS file cache and is not counted
+    run_once(command, args.timeout)
+    runs = [run_once(command, args.timeout) for _ in range(args.runs)]
+
+    results = {
+        "benchmark": "startup",
+        "target": "exe" if args.exe else "script",
+        "command": command,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": runs,
+        "summary": summarize(runs),
+    }
+
+    for name, stats in results["summary"].items():
+        print(f"{name:<20} {stats['median_ms']:8.1f} ms  (min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
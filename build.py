@@ -8,8 +8,10 @@ build_exe_options = {
     "packages": [
         "os", 
         "sys", 
+        "importlib",
         "json", 
-        "telnetlib", 
+        "asyncio", 
+        "socket", 
         "psutil", 
         "PyQt6",
         "logging",
@@ -17,9 +19,12 @@ build_exe_options = {
         "threading",
         "winreg",
         "datetime",
+        "sqlite3",
+        "signal",
         "appdirs"
     ],
     "includes": [
+        "tracker_core",
         "PyQt6.QtCore", 
         "PyQt6.QtGui", 
         "PyQt6.QtWidgets",
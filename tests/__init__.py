@@ -0,0 +1,22 @@
+"""
+Tests for VLC Tracker. Run from the repository root:
+
+    python -m pytest tests
+    python -m unittest discover tests
+
+Application data and settings go to a temporary directory, set up here
+before tracker_core computes its paths, so a test run never touches the
+real history. Qt runs offscreen.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+DATA_HOME = tempfile.mkdtemp(prefix="vlctracker-tests-")
+os.environ["XDG_DATA_HOME"] = os.path.join(DATA_HOME, "data")
+os.environ["XDG_CONFIG_HOME"] = os.path.join(DATA_HOME, "config")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
@@ -0,0 +1,90 @@
+import socket
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+import tracker_core
+from tracker_core import RCReplyParser, VLCTelnetSession
+from fake_vlc import FakeVLCServer
+
+MEDIA = "file:///videos/Show%20S01E01.mkv"
+
+
+class FakeVLCServerTest(unittest.TestCase):
+    """The fake's scripting and faults, as the benchmarks rely on them, seen through the tracker's own client."""
+
+    def setUp(self):
+        self.vlc = FakeVLCServer(password="secret").start()
+        self.addCleanup(self.vlc.close)
+        self.session = VLCTelnetSession("127.0.0.1", self.vlc.port, "secret", timeout=0.3, min_backoff=0)
+        self.addCleanup(self.session.close)
+
+    def poll(self):
+        return tracker_core.get_vlc_status_telnet(session=self.session, check_process=False)
+
+    def elapse(self, seconds):
+        self.vlc._time_base -= seconds
+
+    def test_playback_clock(self):
+        self.assertIsNone(self.poll())
+        self.vlc.play(MEDIA, time=100, length=1500)
+        self.elapse(30)
+        self.assertEqual(self.poll(), {"file": MEDIA, "time": 130, "length": 1500, "state": "playing"})
+        self.vlc.pause()
+        self.elapse(30)
+        self.assertEqual((self.poll()["time"], self.poll()["state"]), (130, "paused"))
+        self.vlc.resume()
+        self.elapse(5000)
+        self.assertEqual(self.poll()["time"], 1500)  # Never past the end
+        self.vlc.stop()
+        self.assertIsNone(self.poll())
+
+    def test_dropped_connections_are_reopened(self):
+        self.vlc.play(MEDIA, length=1500)
+        self.vlc.drop_every = 3  # Hangs up after every poll's last reply
+        for _ in range(3):
+            self.assertEqual(self.poll()["file"], MEDIA)
+        self.assertEqual(self.vlc.logins, 3)
+
+    def test_stalled_reply_on_a_kept_connection_is_retried(self):
+        self.vlc.play(MEDIA, length=1500)
+        self.assertIsNotNone(self.poll())
+        self.vlc.stall_every = 5  # get_time of the second poll is never answered
+        # Late replies on the old connection must not be taken for this poll's
+        status = self.poll()
+        self.assertEqual((status["file"], status["length"]), (MEDIA, 1500))
+        self.assertEqual(self.vlc.logins, 2)
+
+    def test_stalled_reply_on_a_new_connection_times_out(self):
+        self.vlc.play(MEDIA, length=1500)
+        self.vlc.stall_every = 2
+        self.assertIsNone(self.poll())
+
+    def test_garbage_is_not_taken_for_a_status(self):
+        self.vlc.play(MEDIA, time=60, length=1500, state="paused")
+        self.vlc.garbage = True  # A junk line before every reply, so get_time's first line is no number
+        self.assertIsNone(self.poll())
+        self.vlc.garbage = False
+        self.assertEqual(self.poll()["time"], 60)
+
+    def test_latency(self):
+        self.vlc.play(MEDIA, length=1500)
+        self.vlc.latency = 1  # Longer than the session's timeout
+        self.assertIsNone(self.poll())
+
+    def test_pushed_events(self):
+        self.vlc.push_events = True
+        lines = []
+        parser = RCReplyParser(on_line=lines.append)
+        with socket.create_connection(("127.0.0.1", self.vlc.port), timeout=2) as sock:
+            sock.sendall(b"secret\n")
+            while not parser.replies:
+                parser.feed(sock.recv(4096))
+            self.vlc.play(MEDIA, length=1500)
+            self.vlc.pause()
+            while b"( state paused )" not in lines:
+                parser.feed(sock.recv(4096))
+        self.assertIn(("input", MEDIA), [tracker_core.parse_status_line(line) for line in lines])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import FINGERPRINT_MIN_SIZE, FingerprintIndex, HistoryStore, file_fingerprint, metrics
+
+
+class FingerprintIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="fingerprints-")
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.index = FingerprintIndex(os.path.join(self.dir, "history.db"))
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def path(self, name):
+        return os.path.join(self.dir, *name.split("/"))
+
+    def write(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def lookups(self, result):
+        return sum(counter["value"] for counter in metrics.snapshot()["counters"]
+                   if counter["name"] == "fingerprint_cache_total" and counter["labels"].get("result") == result)
+
+    def test_follows_a_renamed_and_moved_file(self):
+        path = self.write("Show.mkv", os.urandom(FINGERPRINT_MIN_SIZE))
+        fingerprint = self.index.fingerprint(path)
+        self.assertEqual(fingerprint, file_fingerprint(path))
+        moved = self.path("Watched/[WATCHED] Show (1080p).mkv")
+        os.makedirs(os.path.dirname(moved))
+        os.rename(path, moved)
+        # Same inode, size and mtime, so it is not read again
+        self.assertEqual(self.index.fingerprint(moved), fingerprint)
+        self.assertEqual((self.lookups("miss"), self.lookups("hit")), (1, 1))
+        self.assertEqual(self.index.path_for(fingerprint), moved)
+
+    def test_changed_file_is_hashed_again(self):
+        path = self.write("Show.mkv", b"a" * FINGERPRINT_MIN_SIZE)
+        first = self.index.fingerprint(path)
+        stat = os.stat(path)
+        # Same size, new content and mtime
+        self.write("Show.mkv", b"b" * FINGERPRINT_MIN_SIZE)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        second = self.index.fingerprint(path)
+        self.assertNotEqual(second, first)
+        # Grown, with its mtime put back
+        with open(path, "ab") as f:
+            f.write(b"b")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertNotIn(self.index.fingerprint(path), (first, second))
+        self.assertEqual(self.lookups("miss"), 3)
+        self.assertEqual(self.lookups("hit"), 0)
+
+    def test_small_files_are_not_fingerprinted(self):
+        for name in ("Empty.mkv", "Sample.mkv"):
+            path = self.write(name, b"" if name == "Empty.mkv" else b"x" * 1024)
+            self.assertIsNone(self.index.fingerprint(path))
+        self.assertIsNone(self.index.fingerprint(self.path("Missing.mkv")))
+
+    def test_identical_files_are_not_fingerprinted_alike(self):
+        data = os.urandom(FINGERPRINT_MIN_SIZE)
+        original = self.write("A/Show.mkv", data)
+        copy = self.write("B/Other.mkv", data)
+        fingerprint = self.index.fingerprint(original)
+        self.assertIsNotNone(fingerprint)
+        with self.assertLogs(level="INFO"):
+            self.assertIsNone(self.index.fingerprint(copy))
+        self.assertEqual(self.index.path_for(fingerprint), original)
+        # Once the original is gone the copy is the only file with that content
+        os.remove(original)
+        self.assertEqual(self.index.fingerprint(copy), fingerprint)
+        self.assertEqual(self.index.path_for(fingerprint), copy)
+
+
+class HistoryFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="history-fingerprints-")
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.store = HistoryStore(os.path.join(self.dir, "history.db"), None)
+        self.addCleanup(self.store.close)
+
+    def path(self, name):
+        return os.path.join(self.dir, *name.split("/"))
+
+    def test_entry_follows_its_fingerprint(self):
+        self.store.upsert(self.path("Show.mkv"), "10:00", False, 1500, fingerprint="abc")
+        self.store.upsert(self.path("Watched/Renamed.mkv"), "12:00", False, 1500, fingerprint="abc")
+        entries = self.store.entries()
+        self.assertEqual([(entry["file"], entry["timestamp"]) for entry in entries],
+                         [(self.path("Watched/Renamed.mkv"), "12:00")])
+
+    def test_shared_fingerprint_does_not_merge_named_entries(self):
+        # Such fingerprints were stored for empty files before FINGERPRINT_MIN_SIZE
+        self.store.upsert(self.path("A.mkv"), "1:00", False, 1500, fingerprint="empty")
+        self.store.upsert(self.path("B.mkv"), "2:00", False, 1500)
+        self.store.upsert(self.path("B.mkv"), "3:00", False, 1500, fingerprint="empty")
+        self.assertEqual(self.store.get(self.path("A.mkv"))["timestamp"], "1:00")
+        self.assertEqual(self.store.get(self.path("B.mkv"))["timestamp"], "3:00")
+
+    def test_files_without_fingerprints_are_matched_by_name(self):
+        self.store.upsert(self.path("A/Show.mkv"), "1:00", False, 1500)
+        self.store.upsert(self.path("B/Show.mkv"), "2:00", False, 1500)
+        self.assertEqual(len(self.store.entries()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
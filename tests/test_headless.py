@@ -0,0 +1,147 @@
+import logging
+import os
+import pathlib
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+import tracker_core
+from tracker_core import HistoryStore, TelnetBackend, TrackerCore
+from fake_vlc import FakeVLCServer
+
+TIMEOUT = 15  # Seconds to wait for the tracker to notice a change; polls run every few seconds
+
+
+def wait_for(condition, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class FakeVLCTestCase(unittest.TestCase):
+    """Plays a real (empty) media file in a FakeVLCServer the tracker is pointed at."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="headless-")
+        self.media = os.path.join(self.dir, f"{self.id().rsplit('.', 1)[-1]}.mkv")
+        open(self.media, "wb").close()
+        self.vlc = FakeVLCServer().start()
+        self.addCleanup(self.vlc.close)
+        for patch in (mock.patch.object(TelnetBackend, "endpoints", [("127.0.0.1", self.vlc.port, "")]),
+                      mock.patch("tracker_core.is_vlc_running", return_value=True)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def play(self):
+        self.vlc.play(pathlib.Path(self.media).as_uri(), time=120, length=1500)
+
+    def renamed(self):
+        """The media file's path once the tracker has renamed it, else None."""
+        names = [name for name in os.listdir(self.dir) if name.startswith("[")]
+        return os.path.join(self.dir, names[0]) if names else None
+
+
+class TrackerCoreTest(FakeVLCTestCase):
+    def setUp(self):
+        super().setUp()
+        self.events = queue.SimpleQueue()
+        self.core = TrackerCore(lambda callback, *args: self.events.put((callback, args)))
+        self.core.start()
+        self.addCleanup(self.close)
+
+    def close(self):
+        self.core.stop()
+        self.pump(lambda: True)
+        self.core.close()
+
+    def pump(self, condition, timeout=TIMEOUT):
+        """Run the core's callbacks, as the host thread would, until condition() holds."""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            try:
+                callback, args = self.events.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            callback(*args)
+        while True:
+            try:
+                callback, args = self.events.get_nowait()
+            except queue.Empty:
+                return True
+            callback(*args)
+
+    def test_stopped_playback_is_saved_and_renamed(self):
+        self.play()
+        self.assertTrue(self.pump(lambda: any(state.current_file for state in self.core.playback.values())))
+        state = next(iter(self.core.playback.values()))
+        self.assertEqual((state.current_state, state.last_total_length), ("playing", 1500))
+
+        self.vlc.stop()
+        self.assertTrue(self.pump(lambda: self.renamed() and self.core.history_store.get(self.renamed())))
+        entry = self.core.history_store.get(self.renamed())
+        self.assertEqual(entry["file"], self.renamed())
+        self.assertGreaterEqual(tracker_core.timestamp_seconds(entry["timestamp"]), 120)
+        self.assertFalse(entry["watched"])
+        self.assertFalse(os.path.exists(self.media))
+        self.assertGreaterEqual(len(self.core.samples.samples(self.media)), 1)
+
+
+@unittest.skipIf(os.name == "nt", "SIGTERM cannot be caught on Windows")
+class RunHeadlessTest(FakeVLCTestCase):
+    def setUp(self):
+        super().setUp()
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+        excepthook, sigterm = sys.excepthook, signal.getsignal(signal.SIGTERM)
+
+        def restore():
+            root.handlers[:] = handlers
+            root.setLevel(level)
+            sys.excepthook = excepthook
+            signal.signal(signal.SIGTERM, sigterm)
+        self.addCleanup(restore)
+
+    def test_sigterm_writes_history_despite_failing_callbacks(self):
+        handled = []
+        stop = TrackerCore.stop
+
+        def stop_and_post(core):
+            stop(core)
+            # Posted while stopping, so they run in the drain loop; the first one fails
+            core.post(lambda: 1 / 0)
+            core.post(handled.append, "after")
+
+        def drive():
+            if wait_for(lambda: self.vlc.commands >= 3):
+                self.vlc.stop()
+                wait_for(self.renamed)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        self.play()
+        threading.Thread(target=drive, daemon=True).start()
+        with mock.patch.object(TrackerCore, "stop", stop_and_post):
+            self.assertEqual(tracker_core.run_headless(), 0)
+
+        self.assertEqual(handled, ["after"])
+        self.assertIsNotNone(self.renamed())
+        # Written out by close() even though a callback failed on the way
+        store = HistoryStore(tracker_core.HISTORY_DB_FILE, None)
+        self.addCleanup(store.close)
+        entry = store.get(self.renamed())
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry["file"], self.renamed())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import HistoryStore
+
+
+class HistoryArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="history-archive-")
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.db_path = os.path.join(self.dir, "history.db")
+        self.store = self.open()
+
+    def open(self):
+        store = HistoryStore(self.db_path, None)
+        self.addCleanup(store.close)
+        return store
+
+    def path(self, name):
+        return os.path.join(self.dir, *name.split("/"))
+
+    def test_upsert_restores_the_archived_entry(self):
+        self.store.upsert(self.path("Show.mkv"), "10:00", False, 1500)
+        self.store.upsert(self.path("Other.mkv"), "1:00", False, 600)
+        entry_id = self.store.get(self.path("Show.mkv"))["id"]
+        self.assertEqual(self.store.archive(-1), 2)  # Everything is older than a cutoff in the future
+        self.assertEqual(self.store.entries(), [])
+
+        # Seen again under another [..] prefix
+        self.store.upsert(self.path("[12-00] Show.mkv"), "12:00", False)
+        restored = self.store.get(self.path("Show.mkv"))
+        self.assertEqual((restored["id"], restored["timestamp"], restored["length"]), (entry_id, "12:00", 1500))
+        self.assertEqual([entry["id"] for entry in self.store.entries()], [entry_id])
+        archived, _ = self.store.archived_entries()
+        self.assertEqual([entry["file"] for entry in archived], [self.path("Other.mkv")])
+
+        # Still one row for it, and no longer archived, once written out
+        self.store.flush()
+        self.assertEqual(len(self.store.all_rows()), 2)
+        reopened = self.open()
+        self.assertEqual([entry["id"] for entry in reopened.entries()], [entry_id])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import HistorySearchIndex
+
+try:
+    from PyQt6.QtWidgets import QApplication
+except ImportError:
+    QApplication = None
+
+
+def entry(entry_id, name, timestamp="10:00", watched=False, length=1500):
+    return {"id": entry_id, "file": f"/videos/{name}", "base_name": name, "timestamp": timestamp,
+            "watched": watched, "length": length, "updated_at": 0, "fingerprint": None}
+
+
+class HistorySearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.entries = [
+            entry(1, "Breaking Bad S01E01.mkv"),
+            entry(2, "Breaking Bad S01E02.mkv", watched=True, timestamp="[WATCHED]"),
+            entry(3, "Better Call Saul S01E01.mkv", timestamp="20:00"),
+            entry(4, "Amélie.mkv", timestamp="0:00"),
+            entry(5, "the_office_s02e03.mkv"),
+        ]
+        self.index = HistorySearchIndex(self.entries)
+
+    def test_words_match_by_prefix(self):
+        self.assertEqual(self.index.search("b"), {1, 2, 3})
+        self.assertEqual(self.index.search("bre"), {1, 2})
+        self.assertEqual(self.index.search("bad s01e02"), {2})
+        self.assertEqual(self.index.search("s01e01 b"), {1, 3})
+        self.assertEqual(self.index.search("call bad"), set())
+
+    def test_case_accents_and_underscores_are_ignored(self):
+        self.assertEqual(self.index.search("AMELIE"), {4})
+        self.assertEqual(self.index.search("amé"), {4})
+        self.assertEqual(self.index.search("office s02"), {5})
+
+    def test_status_filters(self):
+        self.assertEqual(self.index.search("", "watched"), {2})
+        self.assertEqual(self.index.search("", "halfway"), {3})
+        self.assertEqual(self.index.search("", "unstarted"), {4})
+        self.assertEqual(self.index.search("breaking", "started"), {1})
+        self.assertIsNone(self.index.search(""))
+
+    def test_search_agrees_with_matches(self):
+        for query in ("b", "bad", "s01", "amelie", "o s0", "zzz"):
+            for status in (None, "watched", "started", "halfway", "unstarted"):
+                expected = {e["id"] for e in self.entries if HistorySearchIndex.matches(e, query, status)}
+                found = self.index.search(query, status)
+                self.assertEqual(set(e["id"] for e in self.entries) if found is None else found, expected,
+                                 (query, status))
+
+    def test_changes_are_reindexed(self):
+        self.index.apply_change("upsert", entry(1, "Dark S01E01.mkv"))
+        self.index.apply_change("delete", self.entries[1])
+        self.assertEqual(self.index.search("bre"), set())
+        self.assertEqual(self.index.search("dar"), {1})
+        self.assertNotIn("breaking", self.index.words)
+
+    def test_upsert_during_incremental_build(self):
+        index = HistorySearchIndex()
+        index.add_entries(self.entries[:3])
+        # An entry already indexed changes before finish(), as the store's listener does mid-build
+        index.apply_change("upsert", entry(1, "Dark S01E01.mkv"))
+        index.apply_change("delete", self.entries[2])
+        index.add_entries(self.entries[3:])
+        index.finish()
+        self.assertEqual(index.search("dark"), {1})
+        self.assertEqual(index.search("better"), set())
+        self.assertEqual(index.search("bre"), {2})
+        self.assertEqual(index.words, sorted(index.postings))
+
+
+@unittest.skipIf(QApplication is None, "PyQt6 is not installed")
+class HistoryModelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import Tracker
+        cls.app = QApplication.instance() or QApplication([])
+        cls.HistoryModel = Tracker.HistoryModel
+
+    def names(self, model):
+        return [model.index(row).data(self.HistoryModel.FilePathRole) for row in range(model.rowCount())]
+
+    def test_upsert_while_index_is_built_in_slices(self):
+        model = self.HistoryModel()
+        entries = [entry(i, f"Show {i}.mkv") for i in range(1, 201)]
+        model.set_entries(entries)
+        model.index_slice(0)  # One entry's worth, leaving the rest for later slices
+        self.assertIsNotNone(model.unindexed)
+        model.apply_change("upsert", entry(1, "Renamed 1.mkv", timestamp="30:00"))
+        self.assertEqual(model.index(model.rowCount() - 1).data(self.HistoryModel.FilePathRole),
+                         "/videos/Renamed 1.mkv")
+        model.set_filter("renamed")
+        self.assertEqual(self.names(model), ["/videos/Renamed 1.mkv"])
+        model.set_filter("show 20")
+        self.assertEqual(self.names(model), ["/videos/Show 200.mkv", "/videos/Show 20.mkv"])
+
+    def test_filter_before_any_entries(self):
+        model = self.HistoryModel()
+        model.set_filter("anything")
+        self.assertEqual(model.rowCount(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
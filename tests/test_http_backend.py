@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import HTTPBackend
+from fake_vlc import FakeVLCHTTPServer
+
+MEDIA = "file:///videos/Show%20S01E01.mkv"
+
+
+class HTTPBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.vlc = FakeVLCHTTPServer(password="secret").start()
+        self.addCleanup(self.vlc.close)
+
+    def fetch(self, polls=1, password="secret", between=None):
+        """Statuses from that many polls over one backend; between() runs after each poll."""
+        async def run():
+            backend = HTTPBackend("127.0.0.1", self.vlc.port, password, timeout=0.5)
+            try:
+                statuses = []
+                for _ in range(polls):
+                    statuses.append(await backend.fetch_status())
+                    if between:
+                        between()
+                return statuses
+            finally:
+                backend.close()
+        return asyncio.run(run())
+
+    def test_status_time_and_length(self):
+        self.vlc.play(MEDIA, time=120, length=1500, state="paused")
+        statuses = self.fetch(polls=3)
+        self.assertEqual(statuses, [{"file": MEDIA, "time": 120, "length": 1500, "state": "paused"}] * 3)
+        # One connection; the playlist is only fetched for a new playlist item
+        self.assertEqual((self.vlc.connections, self.vlc.commands), (1, 4))
+
+    def test_nothing_playing(self):
+        self.assertEqual(self.fetch(), [None])
+        self.vlc.play(MEDIA, length=1500)
+        self.vlc.stop()
+        self.assertEqual(self.fetch(), [None])
+
+    def test_wrong_password(self):
+        self.vlc.play(MEDIA, time=120, length=1500)
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertEqual(self.fetch(password="nope"), [None])
+        self.assertIn("Wrong HTTP password", logs.output[0])
+
+    def test_reconnects_after_the_server_drops_the_connection(self):
+        self.vlc.play(MEDIA, time=120, length=1500, state="paused")
+        statuses = self.fetch(polls=3, between=self.vlc.drop_connections)
+        self.assertEqual([status["time"] for status in statuses], [120, 120, 120])
+        self.assertEqual(self.vlc.connections, 3)
+
+    def test_server_closing_after_a_reply(self):
+        self.vlc.play(MEDIA, time=120, length=1500, state="paused")
+        self.vlc.drop_every = 1  # Every reply is the last on its connection
+        statuses = self.fetch(polls=2)
+        self.assertEqual([status["file"] for status in statuses], [MEDIA, MEDIA])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import os
+import stat
+import tempfile
+import time
+import types
+import unittest
+from unittest import mock
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import HistoryStore, IPCError, IPCServer, SampleLog, WatchStats, ipc_call
+
+
+class FakeConnection:
+    def __init__(self):
+        self.subscriptions = set()
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+class IPCServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="ipc-")
+        store = HistoryStore(os.path.join(self.dir, "history.db"), None)
+        samples = SampleLog(os.path.join(self.dir, "samples.bin"), os.path.join(self.dir, "samples.files"))
+        self.addCleanup(store.close)
+        self.addCleanup(samples.close)
+        # The parts of TrackerCore the server reads
+        self.core = types.SimpleNamespace(history_store=store, stats=WatchStats(store), samples=samples,
+                                          playback={}, add_listener=lambda callback: None)
+        self.server = IPCServer(self.core, os.path.join(self.dir, "tracker.sock"))
+        self.connection = FakeConnection()
+
+    def call(self, method, params=None):
+        request = {"jsonrpc": "2.0", "id": 1, "method": method}
+        if params is not None:
+            request["params"] = params
+        return self.server.handle_message(self.connection, json.dumps(request).encode())
+
+    def error_code(self, reply):
+        return reply["error"]["code"]
+
+
+class IPCDispatchTest(IPCServerTestCase):
+    def test_malformed_requests(self):
+        self.assertEqual(self.error_code(self.server.handle_message(self.connection, b"{nope")), -32700)
+        self.assertEqual(self.error_code(self.server.handle_message(self.connection, b"[]")), -32600)
+        self.assertEqual(self.error_code(self.server.handle_message(self.connection, b'{"method": "status"}')), -32600)
+        self.assertEqual(self.error_code(self.call("nope")), -32601)
+        self.assertEqual(self.error_code(self.call("status", [1])), -32602)
+
+    def test_params_that_do_not_fit_the_method(self):
+        self.assertEqual(self.error_code(self.call("status", {"verbose": True})), -32602)
+        self.assertEqual(self.error_code(self.call("playback.sessions", {})), -32602)
+        self.assertEqual(self.error_code(self.call("history.query", {"limit": 0})), -32602)
+        self.assertEqual(self.error_code(self.call("subscribe", {"events": ["nope"]})), -32602)
+
+    def test_type_error_inside_a_method_is_an_internal_error(self):
+        with mock.patch.object(self.core.stats, "summary", side_effect=TypeError("bug")), \
+                self.assertLogs(level="ERROR"):
+            reply = self.call("stats")
+        self.assertEqual(reply["error"], {"code": -32603, "message": "Internal error"})
+
+    def test_batches_and_notifications(self):
+        batch = [{"jsonrpc": "2.0", "id": 1, "method": "status"},
+                 {"jsonrpc": "2.0", "method": "status"},  # A notification, which gets no reply
+                 {"jsonrpc": "2.0", "id": 2, "method": "nope"}]
+        replies = self.server.handle_message(self.connection, json.dumps(batch).encode())
+        self.assertEqual([reply["id"] for reply in replies], [1, 2])
+        self.assertEqual(replies[0]["result"], [])
+        self.assertIsNone(self.server.handle_message(self.connection, b'{"jsonrpc": "2.0", "method": "status"}'))
+
+    def test_history_pages(self):
+        store = self.core.history_store
+        for number in range(1, 6):
+            store.upsert(f"/videos/Show S01E0{number}.mkv", "10:00", False, 1500)
+        store.upsert("/videos/Film.mkv", "[WATCHED]", True, 6000)
+        names, before = [], None
+        while True:
+            params = {"query": "show", "limit": 2}
+            if before is not None:
+                params["before"] = before
+            result = self.call("history.query", params)["result"]
+            names += [entry["base_name"] for entry in result["entries"]]
+            before = result["next"]
+            if before is None:
+                break
+        self.assertEqual(names, [f"Show S01E0{number}.mkv" for number in range(5, 0, -1)])
+        watched = self.call("history.query", {"status": "watched"})["result"]["entries"]
+        self.assertEqual([entry["base_name"] for entry in watched], ["Film.mkv"])
+
+    def test_subscriptions(self):
+        self.server.connections.add(self.connection)
+        self.assertEqual(self.call("subscribe", {"events": ["history"]})["result"], ["history"])
+        self.server._broadcast("history", {"change": "upsert"})
+        self.server._broadcast("playback", {"endpoint": "x"})
+        self.assertEqual(self.connection.sent, [
+            {"jsonrpc": "2.0", "method": "event", "params": {"change": "upsert"}}])
+        self.assertEqual(self.call("unsubscribe")["result"], [])
+
+
+@unittest.skipIf(os.name == "nt", "Unix domain sockets only")
+class IPCSocketTest(IPCServerTestCase):
+    def test_call_over_the_socket(self):
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.server.address) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(stat.S_IMODE(os.stat(self.server.address).st_mode), 0o600)
+        self.assertEqual(ipc_call("status", address=self.server.address), [])
+        with self.assertRaises(IPCError) as raised:
+            ipc_call("playback.sessions", address=self.server.address)
+        self.assertEqual(raised.exception.code, -32602)
+        self.server.stop()
+        self.server.stop()
+        self.assertFalse(os.path.exists(self.server.address))
+
+
+if __name__ == "__main__":
+    unittest.main()
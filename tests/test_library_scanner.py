@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import HistoryStore, LibraryScanner, apply_library_update, plan_library_update
+
+
+class LibraryScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="library-")
+        self.root = os.path.join(self.dir, "Videos")
+        self.db_path = os.path.join(self.dir, "history.db")
+        for name in ("A/x.mkv", "B/y.mp4", "B/C/z.avi", "notes.txt"):
+            self.touch(name)
+        self.scanner = LibraryScanner(db_path=self.db_path)
+
+    def touch(self, name):
+        path = os.path.join(self.root, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        return path
+
+    def scan(self, scanner=None):
+        result = (scanner or self.scanner).scan([self.root])
+        result["names"] = sorted(os.path.relpath(path, self.root).replace(os.sep, "/") for path in result["files"])
+        return result
+
+    def test_first_scan_lists_everything(self):
+        result = self.scan()
+        self.assertEqual(result["names"], ["A/x.mkv", "B/C/z.avi", "B/y.mp4"])
+        self.assertEqual((result["directories"], result["listed"]), (4, 4))
+
+    def test_unchanged_directories_are_not_listed_again(self):
+        first = self.scan()
+        again = self.scan()
+        self.assertEqual(again["names"], first["names"])
+        self.assertEqual((again["directories"], again["listed"]), (4, 0))
+        # The cache outlives the scanner, in the database
+        reopened = self.scan(LibraryScanner(db_path=self.db_path))
+        self.assertEqual((reopened["names"], reopened["listed"]), (first["names"], 0))
+
+    def test_changed_directory_is_listed_again(self):
+        self.scan()
+        path = self.touch("B/C/new.mkv")
+        folder = os.path.dirname(path)
+        # Some file systems keep mtimes coarse enough for the change to land in the same tick
+        stat = os.stat(folder)
+        os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        result = self.scan()
+        self.assertEqual(result["names"], ["A/x.mkv", "B/C/new.mkv", "B/C/z.avi", "B/y.mp4"])
+        self.assertEqual(result["listed"], 1)
+
+    def test_removed_directories_are_forgotten(self):
+        self.scan()
+        shutil.rmtree(os.path.join(self.root, "A"))
+        stat = os.stat(self.root)
+        os.utime(self.root, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        result = self.scan()
+        self.assertEqual(result["names"], ["B/C/z.avi", "B/y.mp4"])
+        self.assertNotIn(os.path.join(self.root, "A"), self.scanner.cache)
+        reopened = LibraryScanner(db_path=self.db_path)
+        self.assertEqual(self.scan(reopened)["names"], ["B/C/z.avi", "B/y.mp4"])
+        self.assertNotIn(os.path.join(self.root, "A"), reopened.cache)
+
+
+class LibraryUpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="library-update-")
+        self.store = HistoryStore(os.path.join(self.dir, "history.db"), None)
+        self.addCleanup(self.store.close)
+
+    def path(self, name):
+        return os.path.join(self.dir, *name.split("/"))
+
+    def test_plan_then_apply(self):
+        self.store.upsert(self.path("Old/Show.mkv"), "10:00", False, 1500)  # Moved to New/ since
+        self.store.upsert(self.path("Gone.mkv"), "1:00", False, 1500)  # Nowhere in the library
+        self.store.upsert(self.path("[WATCHED] Known.mkv"), "[WATCHED]", True, 1500)
+        os.makedirs(self.path("New"))
+        files = [self.path(name) for name in ("New/[10-00] Show.mkv", "[05-00] Seeded.mkv", "[WATCHED] Known.mkv")]
+        for path in files:
+            open(path, "wb").close()
+
+        seeds, repairs = plan_library_update(self.store, files)
+        self.assertEqual(repairs, [(self.path("Old/Show.mkv"), self.path("New/[10-00] Show.mkv"))])
+        # Applying touches only the store, since it runs on the GUI thread
+        with mock.patch("os.path.exists", side_effect=AssertionError("disk access")):
+            self.assertEqual(apply_library_update(self.store, seeds, repairs), (2, 1))
+        self.assertEqual(self.store.get(self.path("Seeded.mkv"))["timestamp"], "5:00")
+        self.assertEqual(self.store.get(self.path("New/Show.mkv"))["file"], self.path("New/[10-00] Show.mkv"))
+        # A repair that no longer applies is skipped
+        self.assertEqual(apply_library_update(self.store, [], repairs), (0, 0))
+
+    def test_fingerprint_must_match(self):
+        self.store.upsert(self.path("Old/Show.mkv"), "10:00", False, 1500, fingerprint="abc")
+        os.makedirs(self.path("New"))
+        files = [self.path("New/Show.mkv")]
+        open(files[0], "wb").close()
+        fingerprints = mock.Mock()
+        fingerprints.fingerprint.return_value = "def"
+        self.assertEqual(plan_library_update(self.store, files, fingerprints), ([], []))
+        fingerprints.fingerprint.return_value = "abc"
+        self.assertEqual(plan_library_update(self.store, files, fingerprints)[1],
+                         [(self.path("Old/Show.mkv"), files[0])])
+
+    def test_moved_files(self):
+        self.store.upsert(self.path("Show.mkv"), "10:00", False, 1500, fingerprint="abc")
+        self.store.upsert(self.path("Here.mkv"), "10:00", False, 1500, fingerprint="def")
+        open(self.path("Here.mkv"), "wb").close()
+        fingerprints = mock.Mock()
+        fingerprints.path_for.return_value = self.path("Moved/Show.mkv")
+        self.assertEqual(self.store.moved_files(fingerprints), [(self.path("Show.mkv"), self.path("Moved/Show.mkv"))])
+        fingerprints.path_for.assert_called_once_with("abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
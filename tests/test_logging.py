@@ -0,0 +1,63 @@
+import logging
+import unittest
+from unittest import mock
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import RepeatFilter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class RepeatFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patch = mock.patch("tracker_core.time.monotonic", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+        # The summary goes through the root logger, as in setup_logging
+        self.handler = ListHandler()
+        self.handler.addFilter(RepeatFilter(window=60))
+        root = logging.getLogger()
+        root.addHandler(self.handler)
+        self.addCleanup(root.removeHandler, self.handler)
+        level = root.level
+        root.setLevel(logging.INFO)
+        self.addCleanup(root.setLevel, level)
+
+    def messages(self):
+        return [record.getMessage() for record in self.handler.records]
+
+    def test_repeats_are_collapsed_into_a_summary(self):
+        for _ in range(4):
+            logging.warning("VLC not reachable on port %s", 4212)
+        self.assertEqual(self.messages(), ["VLC not reachable on port 4212"])
+        # Different arguments make a different message
+        logging.warning("VLC not reachable on port %s", 8080)
+        self.assertEqual(self.messages(), ["VLC not reachable on port 4212",
+                                           "Previous message repeated 3 more times",
+                                           "VLC not reachable on port 8080"])
+        summary = self.handler.records[1]
+        self.assertEqual(summary.levelno, logging.WARNING)
+
+    def test_repeat_is_logged_again_after_the_window(self):
+        logging.info("Polling")
+        self.now += 30
+        logging.info("Polling")
+        self.now += 31
+        logging.info("Polling")
+        self.assertEqual(self.messages(), ["Polling", "Previous message repeated 1 more times", "Polling"])
+        # Nothing was dropped since, so no summary
+        logging.info("Stopped")
+        self.assertEqual(self.messages()[-1], "Stopped")
+        self.assertEqual(len(self.messages()), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
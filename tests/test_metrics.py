@@ -0,0 +1,47 @@
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import Metrics
+
+
+class PrometheusFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def lines(self):
+        return self.metrics.to_prometheus().splitlines()
+
+    def test_counters(self):
+        self.metrics.increment("polls_total", endpoint="telnet")
+        self.metrics.increment("polls_total", 2, endpoint="telnet")
+        self.metrics.increment("polls_total", endpoint='say "hi"')
+        self.metrics.increment("renames_total")
+        lines = self.lines()
+        # One TYPE line per metric name, ahead of all its series
+        self.assertEqual(lines[:4], [
+            "# TYPE vlctracker_polls_total counter",
+            'vlctracker_polls_total{endpoint="say \\"hi\\""} 1',
+            'vlctracker_polls_total{endpoint="telnet"} 3',
+            "# TYPE vlctracker_renames_total counter",
+        ])
+        self.assertEqual(lines[4], "vlctracker_renames_total 1")
+
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in (0.003, 0.02, 7):
+            self.metrics.observe("poll_seconds", seconds, endpoint="telnet")
+        lines = self.lines()
+        self.assertEqual(lines[0], "# TYPE vlctracker_poll_seconds histogram")
+        buckets = dict(line.rsplit(" ", 1) for line in lines if line.startswith("vlctracker_poll_seconds_bucket"))
+        self.assertEqual(buckets['vlctracker_poll_seconds_bucket{endpoint="telnet",le="0.0025"}'], "0")
+        self.assertEqual(buckets['vlctracker_poll_seconds_bucket{endpoint="telnet",le="0.005"}'], "1")
+        self.assertEqual(buckets['vlctracker_poll_seconds_bucket{endpoint="telnet",le="0.025"}'], "2")
+        self.assertEqual(buckets['vlctracker_poll_seconds_bucket{endpoint="telnet",le="5"}'], "2")
+        self.assertEqual(buckets['vlctracker_poll_seconds_bucket{endpoint="telnet",le="+Inf"}'], "3")
+        self.assertEqual(list(buckets)[-1], 'vlctracker_poll_seconds_bucket{endpoint="telnet",le="+Inf"}')
+        self.assertIn('vlctracker_poll_seconds_sum{endpoint="telnet"} 7.023', lines)
+        self.assertIn('vlctracker_poll_seconds_count{endpoint="telnet"} 3', lines)
+        self.assertEqual(lines[-2], "# TYPE vlctracker_uptime_seconds gauge")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+import tracker_core
+from tracker_core import EndpointPoller, PollScheduler, StatusBackend, metrics
+
+PLAYING = {"file": "file:///videos/Show.mkv", "time": 100, "length": 1500, "state": "playing"}
+
+
+class PollSchedulerTest(unittest.TestCase):
+    def test_cadence(self):
+        scheduler = PollScheduler(interval=2, paused_interval=5, near_end_interval=1, max_absent_interval=16)
+        self.assertEqual(scheduler.next_interval(PLAYING), 2)
+        self.assertEqual(scheduler.next_interval(dict(PLAYING, state="paused")), 5)
+        self.assertEqual(scheduler.next_interval(dict(PLAYING, time=1400)), 1)
+        self.assertEqual([scheduler.next_interval(None, False) for _ in range(6)], [2, 4, 8, 16, 16, 16])
+        self.assertEqual(scheduler.next_interval(None), 2)
+
+    def test_late_and_skipped_ticks(self):
+        scheduler = PollScheduler(interval=2)
+        self.assertFalse(scheduler.poll_started(0))
+        self.assertEqual(scheduler.poll_finished(0, 0.5, PLAYING), (1.5, 0))
+        self.assertFalse(scheduler.poll_started(2.1))
+        # A poll that ran for 5 s overran the ticks due at 4.1 and 6.1, and the next starts at once
+        self.assertEqual(scheduler.poll_finished(2.1, 7.1, PLAYING), (0, 2))
+        self.assertTrue(scheduler.poll_started(7.5))
+
+
+class SlowBackend(StatusBackend):
+    name = "slow"
+
+    async def fetch_status(self):
+        await asyncio.sleep(0.05)
+        return dict(PLAYING)
+
+
+class EndpointPollerMetricsTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def counter(self, name):
+        return sum(counter["value"] for counter in metrics.snapshot()["counters"] if counter["name"] == name)
+
+    def test_skipped_ticks_are_published(self):
+        poller = EndpointPoller(SlowBackend("127.0.0.1", 1, ""), lambda status: None, lambda key: None,
+                                PollScheduler(interval=0.01))
+
+        async def run():
+            stopping = asyncio.Event()
+            asyncio.get_running_loop().call_later(0.3, stopping.set)
+            await poller.run(stopping)
+
+        with mock.patch("tracker_core.is_vlc_running", return_value=True):
+            asyncio.run(run())
+        self.assertGreater(self.counter("polls_total"), 1)
+        self.assertGreaterEqual(self.counter("poll_skipped_ticks_total"), self.counter("polls_total") - 1)
+        self.assertIn("vlctracker_poll_skipped_ticks_total{endpoint=", metrics.to_prometheus())
+        self.assertIn("poll_skipped_ticks_total", tracker_core.format_metrics(metrics.snapshot()))
+
+
+if __name__ == "__main__":
+    unittest.main()
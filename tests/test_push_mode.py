@@ -0,0 +1,122 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import EventSubscriber, PlaybackClock, PollScheduler, TelnetBackend
+from fake_vlc import FakeVLCServer
+
+MEDIA = "file:///videos/Show%20S01E01.mkv"
+
+
+class PlaybackClockTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patch = mock.patch("tracker_core.time.monotonic", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_advances_only_while_playing(self):
+        clock = PlaybackClock()
+        clock.set(100, playing=True)
+        self.now += 30
+        self.assertEqual(clock.now(), 130)
+        clock.set(playing=False)
+        self.now += 30
+        self.assertEqual(clock.now(), 130)
+        clock.set(600)  # A seek while paused
+        clock.set(playing=True)
+        self.now += 5
+        self.assertEqual(clock.now(), 605)
+
+
+class EventSubscriberTest(unittest.TestCase):
+    def setUp(self):
+        self.vlc = FakeVLCServer(password="secret")
+        self.vlc.push_events = True
+        self.vlc.start()
+        self.addCleanup(self.vlc.close)
+        patch = mock.patch("tracker_core.is_vlc_running", return_value=True)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.statuses = []
+        self.not_running = []
+
+    def follow(self, script, verify_interval=60):
+        """Run an EventSubscriber against the fake while script(subscriber) runs."""
+        async def run():
+            subscriber = EventSubscriber(TelnetBackend("127.0.0.1", self.vlc.port, "secret"), self.statuses.append,
+                                         self.not_running.append, report_interval=0.05,
+                                         verify_interval=verify_interval, scheduler=PollScheduler(interval=0.05))
+            stopping = asyncio.Event()
+            task = asyncio.ensure_future(subscriber.run(stopping))
+            try:
+                await script(subscriber)
+            finally:
+                stopping.set()
+                await asyncio.wait_for(task, 5)
+        asyncio.run(run())
+
+    async def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            await asyncio.sleep(0.01)
+
+    def latest(self):
+        return self.statuses[-1] if self.statuses else None
+
+    def test_position_is_extrapolated_between_pushes(self):
+        async def script(subscriber):
+            await self.wait_for(lambda: self.latest() and self.latest()["file"] == MEDIA)
+            commands = self.vlc.commands
+            await self.wait_for(lambda: self.latest()["time"] >= 101)
+            # Reported from the clock, without asking VLC again
+            self.assertEqual(self.vlc.commands, commands)
+            self.assertEqual(self.latest()["length"], 1500)
+        self.vlc.play(MEDIA, time=100, length=1500)
+        self.follow(script)
+
+    def test_pause_and_seek_are_picked_up(self):
+        async def script(subscriber):
+            await self.wait_for(lambda: self.latest() and self.latest()["state"] == "playing")
+            self.vlc.pause()
+            # Pushed, so reported straight away and the clock stops
+            await self.wait_for(lambda: self.latest()["state"] == "paused")
+            paused_at = self.latest()["time"]
+            # Seeks are not announced; the periodic get_time check catches them
+            self.vlc.seek(600)
+            await self.wait_for(lambda: self.latest()["time"] == 600)
+            self.assertIn(paused_at, (100, 101))
+            self.vlc.resume()
+            await self.wait_for(lambda: self.latest()["state"] == "playing")
+        self.vlc.play(MEDIA, time=100, length=1500)
+        self.follow(script, verify_interval=0.2)
+
+    def test_new_input_is_pushed(self):
+        async def script(subscriber):
+            await self.wait_for(lambda: self.latest() and self.latest()["file"] == MEDIA)
+            self.vlc.play("file:///videos/Other.mkv", time=0, length=600)
+            await self.wait_for(lambda: self.latest()["file"].endswith("Other.mkv"))
+            self.assertEqual(self.latest()["length"], 600)
+        self.vlc.play(MEDIA, time=100, length=1500)
+        self.follow(script)
+
+    def test_reconnects_when_the_connection_drops(self):
+        async def script(subscriber):
+            await self.wait_for(lambda: self.latest() and self.latest()["file"] == MEDIA)
+            self.vlc.drop_connections()
+            await self.wait_for(lambda: self.not_running)
+            reported = len(self.statuses)
+            await self.wait_for(lambda: self.vlc.logins == 2 and len(self.statuses) > reported)
+            self.assertEqual(self.latest()["file"], MEDIA)
+            # Events on the new connection are followed too
+            self.vlc.pause()
+            await self.wait_for(lambda: self.latest()["state"] == "paused")
+        self.vlc.play(MEDIA, time=100, length=1500)
+        self.follow(script)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+import tracker_core
+from tracker_core import RenameQueue
+
+
+class RenameQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="renames-")
+        self.renamed = []
+        self.queue = RenameQueue(lambda old, new: self.renamed.append((old, new)), retries=0)
+        self.addCleanup(self.queue.stop)
+
+    def media(self, name):
+        path = os.path.join(self.dir, name)
+        open(path, "wb").close()
+        return path
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_rename(self):
+        self.queue.submit(self.media("Show.mkv"), False, "05-00")
+        self.queue.stop()
+        self.assertEqual(os.listdir(self.dir), ["[05-00] Show.mkv"])
+        self.assertEqual(self.renamed, [(self.path("Show.mkv"), self.path("[05-00] Show.mkv"))])
+        self.assertEqual(self.queue.moved, {})
+
+    def test_merged_job_takes_the_current_path(self):
+        current = self.media("[05-00] Show.mkv")
+        # Held so the worker cannot take the first job before the second is merged into it
+        with self.queue.cond:
+            self.queue.submit(self.path("Show.mkv"), False, "05-00")
+            self.queue.submit(current, True)
+            self.assertEqual(self.queue.jobs[self.queue.rename_key(current)]["path"], current)
+        self.queue.stop()
+        self.assertEqual(os.listdir(self.dir), ["[WATCHED] Show.mkv"])
+        self.assertEqual(self.renamed, [(current, self.path("[WATCHED] Show.mkv"))])
+
+    def test_rename_queued_while_another_runs(self):
+        original = self.media("Show.mkv")
+        started, release = threading.Event(), threading.Event()
+        rename_media_file = tracker_core.rename_media_file
+
+        def slow_rename(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return rename_media_file(*args, **kwargs)
+
+        with mock.patch("tracker_core.rename_media_file", slow_rename):
+            self.queue.submit(original, False, "05-00")
+            self.assertTrue(started.wait(5))
+            # Still names the file as it was before the running rename
+            self.queue.submit(original, False, "10-00")
+            release.set()
+            self.queue.stop()
+        self.assertEqual(os.listdir(self.dir), ["[10-00] Show.mkv"])
+        self.assertEqual([new for _, new in self.renamed],
+                         [self.path("[05-00] Show.mkv"), self.path("[10-00] Show.mkv")])
+        self.assertEqual(self.queue.moved, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import SampleLog
+
+EP1 = "/videos/Show S01E01.mkv"
+EP2 = "/videos/Show S01E02.mkv"
+
+
+def status(file, time, state="playing", length=1500):
+    return {"file": file, "time": time, "length": length, "state": state}
+
+
+class SampleLogTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="samples-")
+        self.path = os.path.join(self.dir, "samples.bin")
+        self.files_path = os.path.join(self.dir, "samples.files")
+
+    def open(self, max_bytes=1 << 20):
+        log = SampleLog(self.path, self.files_path, max_bytes=max_bytes, flush_interval=0)
+        self.addCleanup(log.close)
+        return log
+
+    def play(self, log, file, start_at, start_time, polls, step=5):
+        for i in range(polls):
+            log.record(status(file, start_time + i * step), at=start_at + i * step)
+
+    def test_watched_segments_skip_seeks(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 13)  # 0..60 s played
+        self.play(log, EP1, 1065, 300, 7)  # Sought to 300, then 300..330 played
+        self.assertEqual(log.watched_segments(EP1), [(0, 60), (300, 330)])
+        self.assertEqual(log.watched_segments(EP2), [])
+
+    def test_renamed_file_keeps_its_samples(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 3)
+        log.record(status("file:///videos/%5B00-05%5D%20Show%20S01E01.mkv", 10), at=1010)
+        self.assertEqual(len(log.samples(EP1)), 4)
+
+    def test_sessions(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 5)
+        log.record(status(EP1, 20, "paused"), at=1025)
+        log.record(status(EP1, 20, "paused"), at=1030)  # Repeated while paused, so not recorded
+        self.play(log, EP1, 5000, 600, 3)  # A later session, after a seek
+        self.play(log, EP2, 1000, 0, 3)
+        sessions = log.sessions(EP1)
+        self.assertEqual(len(sessions), 2)
+        self.assertEqual((sessions[0]["from"], sessions[0]["to"], sessions[0]["played_seconds"]), (0, 20, 20))
+        self.assertEqual((sessions[1]["start"], sessions[1]["from"], sessions[1]["to"]), (5000, 600, 610))
+        self.assertEqual(len(log.samples(EP1, start=1001, end=5000)), 5)
+
+    def test_reopened_log_keeps_file_ids(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 3)
+        self.play(log, EP2, 1000, 0, 2)
+        log.close()
+        log = self.open()
+        self.play(log, EP2, 1010, 10, 2)
+        self.assertEqual(len(log.samples(EP1)), 3)
+        self.assertEqual([sample.time for sample in log.samples(EP2)], [0, 5, 10, 15])
+
+    def test_torn_last_record_is_dropped(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 3)
+        log.close()
+        with open(self.path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+        log = self.open()
+        self.assertEqual(os.path.getsize(self.path), 3 * SampleLog.RECORD.size)
+        log.record(status(EP1, 15), at=1015)
+        self.assertEqual([sample.time for sample in log.samples(EP1)], [0, 5, 10, 15])
+
+    def test_torn_last_files_line_is_cut_off(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 2)
+        log.close()
+        with open(self.files_path, "ab") as f:
+            f.write(b'"/videos/show s01')
+        log = self.open()
+        self.play(log, EP2, 1010, 0, 2)
+        self.assertEqual(len(log.samples(EP1)), 2)
+        self.assertEqual(len(log.samples(EP2)), 2)
+        with open(self.files_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_unreadable_files_line_keeps_later_ids(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 2)
+        self.play(log, EP2, 1000, 0, 3)
+        log.close()
+        with open(self.files_path, encoding="utf-8") as f:
+            lines = f.readlines()
+        with open(self.files_path, "w", encoding="utf-8") as f:
+            f.writelines(["not json\n"] + lines[1:])
+        log = self.open()
+        self.assertEqual(log.samples(EP1), [])
+        self.assertEqual(len(log.samples(EP2)), 3)
+
+    def test_oversized_log_keeps_its_newer_half(self):
+        log = self.open()
+        self.play(log, EP1, 1000, 0, 100)
+        log.close()
+        log = self.open(max_bytes=40 * SampleLog.RECORD.size)
+        self.assertEqual([sample.time for sample in log.samples(EP1)], [5 * i for i in range(80, 100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
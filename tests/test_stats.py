@@ -0,0 +1,102 @@
+import csv
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+from tracker_core import HistoryStore, WatchStats, STATS_ABANDONED_DAYS
+
+LATER = STATS_ABANDONED_DAYS * 24 * 3600 + 60
+
+
+class WatchStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="stats-")
+        self.store = HistoryStore(os.path.join(self.dir, "history.db"), None)
+        self.addCleanup(self.store.close)
+        self.stats = WatchStats(self.store)
+
+    def fill(self):
+        self.store.upsert("/v/A/Ep 1.mkv", "10:00", False, 1500)
+        self.store.upsert("/v/A/Ep 2.mkv", "2:00", False, 1500)
+        self.store.upsert("/v/A/Ep 3.mkv", "[WATCHED]", True, 1500)
+        self.store.upsert("/v/B/Film.mkv", "30:00", False, 0)  # Length unknown
+
+    def rebuilt(self, now):
+        """The same summary computed from scratch, without any incremental updates."""
+        self.store.flush()
+        return WatchStats(self.store).summary(now)
+
+    def folder(self, summary, name):
+        return next(folder for folder in summary["folders"] if folder["folder"] == name)
+
+    def test_rollups(self):
+        self.fill()
+        summary = self.stats.summary()
+        self.assertEqual(summary["entries"], 4)
+        self.assertEqual(summary["watched"], 1)
+        self.assertEqual(summary["watch_seconds"], 600 + 120 + 1500 + 1800)
+        # Only entries with a known length count towards completion
+        self.assertAlmostEqual(summary["completion"], (600 + 120 + 1500) / 4500)
+        folder_a = self.folder(summary, "/v/A")
+        self.assertEqual((folder_a["entries"], folder_a["watched"], folder_a["watch_seconds"]), (3, 1, 2220))
+        folder_b = self.folder(summary, "/v/B")
+        self.assertEqual((folder_b["entries"], folder_b["completion"]), (1, 0.0))
+        self.assertEqual([folder["folder"] for folder in summary["folders"]], ["/v/A", "/v/B"])
+
+    def test_incremental_updates_match_a_rebuild(self):
+        self.fill()
+        self.stats.summary()  # Loads the columns; everything below is applied incrementally
+        self.store.upsert("/v/A/Ep 2.mkv", "[WATCHED]", True, 1500)
+        self.store.upsert("/v/C/New.mkv", "5:00", False, 900)
+        self.store.delete("/v/A/Ep 1.mkv")
+        self.store.rename("/v/B/Film.mkv", "/v/C/Film.mkv")
+        self.store.upsert("/v/D/Reuses a free slot.mkv", "1:00", False, 600)
+        now = time.time() + LATER
+        summary = self.stats.summary(now)
+        self.assertEqual(summary, self.rebuilt(now))
+        self.assertEqual(summary["entries"], 5)
+        self.assertEqual(summary["watched"], 2)
+        self.assertNotIn("/v/B", [folder["folder"] for folder in summary["folders"]])
+        self.assertEqual(self.folder(summary, "/v/C")["entries"], 2)
+
+    def test_abandoned_entries(self):
+        self.fill()
+        # Too recent to count as abandoned
+        self.assertEqual(self.stats.summary()["abandoned"], [])
+        abandoned = self.stats.summary(time.time() + LATER)["abandoned"]
+        # Ep 2 barely started, Ep 3 is watched and the film has no known length
+        self.assertEqual([entry["file"] for entry in abandoned], ["/v/A/Ep 1.mkv"])
+        self.assertEqual((abandoned[0]["position"], abandoned[0]["length"]), (600, 1500))
+        self.store.upsert("/v/A/Ep 1.mkv", "[WATCHED]", True, 1500)
+        self.assertEqual(self.stats.summary(time.time() + LATER)["abandoned"], [])
+
+    def test_version_counts_changes(self):
+        self.fill()
+        self.assertEqual(self.stats.version, 0)  # Nothing loaded yet, so nothing to update
+        self.stats.summary()
+        self.store.upsert("/v/A/Ep 2.mkv", "3:00", False, 1500)
+        self.store.delete("/v/A/Ep 3.mkv")
+        self.assertEqual(self.stats.version, 2)
+
+    def test_export(self):
+        self.fill()
+        json_path = self.stats.export(os.path.join(self.dir, "stats.json"))
+        with open(json_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["entries"], 4)
+        csv_path = self.stats.export(os.path.join(self.dir, "stats.csv"), "csv")
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["folder", "entries", "watched", "watch_seconds", "completion"])
+        self.assertEqual(rows[1], ["/v/A", "3", "1", "2220", "0.493"])
+        self.assertFalse(os.path.exists(csv_path + ".tmp"))
+
+    def test_empty_history(self):
+        summary = self.stats.summary()
+        self.assertEqual((summary["entries"], summary["completion"], summary["folders"]), (0, 0.0, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import asyncio
+import socket
+import threading
+import unittest
+
+from tests import ROOT  # noqa: F401  (sets up paths and the test data directory)
+import tracker_core
+from tracker_core import RCReplyParser, VLCTelnetSession, STATUS_COMMANDS
+from fake_vlc import FakeVLCServer
+
+MEDIA = "file:///C:/Videos/Show%20S01E01.mkv"
+STATUS_REPLY = (b"( new input: " + MEDIA.encode() + b" )\r\n( audio volume: 256 )\r\n( state playing )\r\n> "
+                b"120\r\n> 1500\r\n> ")
+
+
+def feed_in_chunks(data, size):
+    parser = RCReplyParser()
+    for start in range(0, len(data), size):
+        parser.feed(data[start:start + size])
+    return parser
+
+
+class RCReplyParserTest(unittest.TestCase):
+    def test_replies_are_split_at_prompts(self):
+        parser = feed_in_chunks(STATUS_REPLY, len(STATUS_REPLY))
+        self.assertEqual(list(parser.replies), [
+            [b"( new input: " + MEDIA.encode() + b" )", b"( audio volume: 256 )", b"( state playing )"],
+            [b"120"],
+            [b"1500"],
+        ])
+
+    def test_any_chunk_boundary_gives_the_same_replies(self):
+        expected = list(feed_in_chunks(STATUS_REPLY, len(STATUS_REPLY)).replies)
+        for size in range(1, 12):
+            parser = feed_in_chunks(STATUS_REPLY, size)
+            self.assertEqual(list(parser.replies), expected, size)
+            self.assertEqual(parser.buffer, b"")
+
+    def test_prompt_split_across_chunks(self):
+        parser = RCReplyParser()
+        parser.feed(b"120\r\n>")
+        self.assertEqual(len(parser.replies), 0)
+        parser.feed(b" 1500\r\n> ")
+        self.assertEqual(list(parser.replies), [[b"120"], [b"1500"]])
+
+    def test_telnet_commands_are_stripped(self):
+        data = b"\xff\xfb\x01Welcome\xff\xf1\r\n12\xff\xff3\r\n\xff\xfc\x01> "
+        for size in (1, 2, 3, len(data)):
+            parser = feed_in_chunks(data, size)
+            self.assertEqual(list(parser.replies), [[b"Welcome", b"12\xff3"]], size)
+            self.assertEqual(parser.pending_iac, b"")
+
+    def test_iac_sequence_split_across_chunks_is_held_back(self):
+        parser = RCReplyParser()
+        parser.feed(b"42\xff")
+        parser.feed(b"\xfb")
+        self.assertEqual(parser.pending_iac, b"\xff\xfb")
+        parser.feed(b"\x01\r\n> ")
+        self.assertEqual(list(parser.replies), [[b"42"]])
+
+    def test_lines_are_reported_as_they_arrive(self):
+        lines = []
+        parser = RCReplyParser(on_line=lines.append)
+        parser.feed(b"( state paused )\r\n( new in")
+        self.assertEqual(lines, [b"( state paused )"])
+        parser.feed(b"put: x )\r\n")
+        self.assertEqual(lines, [b"( state paused )", b"( new input: x )"])
+
+
+class TrickleServer:
+    """rc server that answers commands in pieces as small as one byte, so prompts straddle reads."""
+
+    def __init__(self, reply_for, chunk=1):
+        self.reply_for = reply_for
+        self.chunk = chunk
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def send(self, sock, data):
+        for start in range(0, len(data), self.chunk):
+            sock.sendall(data[start:start + self.chunk])
+
+    def serve(self):
+        sock, _ = self.listener.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = sock.makefile("rb")
+        with sock:
+            self.send(sock, b"VLC media player\r\nPassword: \xff\xfb\x01")
+            reader.readline()
+            self.send(sock, b"\xff\xfc\x01\r\nWelcome, Master\r\n> ")
+            for line in reader:
+                self.send(sock, self.reply_for(line.strip().decode()) + b"> ")
+
+    def close(self):
+        self.listener.close()
+
+
+class VLCTelnetSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.vlc = FakeVLCServer(password="secret").start()
+        self.vlc.play(MEDIA, time=120, length=1500)
+        self.addCleanup(self.vlc.close)
+
+    def session(self, port=None, password="secret"):
+        session = VLCTelnetSession("127.0.0.1", port or self.vlc.port, password, min_backoff=0)
+        self.addCleanup(session.close)
+        return session
+
+    def test_pipelined_replies_match_their_commands(self):
+        session = self.session()
+        self.assertTrue(session.connect())
+        status, time_lines, length_lines = session.pipeline(STATUS_COMMANDS)
+        self.assertIn(b"( state playing )", status)
+        self.assertEqual(int(length_lines[0]), 1500)
+        self.assertGreaterEqual(int(time_lines[0]), 120)
+        # Unknown commands get their own reply too, keeping later replies in step
+        replies = session.pipeline(["get_length", "bogus", "get_length"])
+        self.assertEqual(replies[0], [b"1500"])
+        self.assertTrue(replies[1][0].startswith(b"Unknown command"))
+        self.assertEqual(replies[2], [b"1500"])
+
+    def test_one_round_trip_per_poll(self):
+        session = self.session()
+        for _ in range(3):
+            status = tracker_core.get_vlc_status_telnet(session=session, check_process=False)
+            self.assertEqual(status["file"], MEDIA)
+            self.assertEqual(status["length"], 1500)
+            self.assertEqual(status["state"], "playing")
+        self.assertEqual(self.vlc.logins, 1)
+        self.assertEqual(self.vlc.commands, 9)
+
+    def test_wrong_password(self):
+        session = self.session(password="nope")
+        self.assertFalse(session.connect())
+        self.assertIsNone(tracker_core.get_vlc_status_telnet(session=session, check_process=False))
+
+    def test_reconnects_after_vlc_drops_the_connection(self):
+        session = self.session()
+        self.assertIsNotNone(tracker_core.get_vlc_status_telnet(session=session, check_process=False))
+        self.vlc.drop_connections()
+        status = tracker_core.get_vlc_status_telnet(session=session, check_process=False)
+        self.assertGreaterEqual(status["time"], 120)
+        self.assertEqual(self.vlc.logins, 2)
+
+    def test_replies_trickling_in_byte_by_byte(self):
+        replies = {"status": b"( new input: " + MEDIA.encode() + b" )\r\n( state paused )\r\n",
+                   "get_time": b"61\r\n", "get_length": b"1500\r\n"}
+        server = TrickleServer(lambda command: replies[command])
+        self.addCleanup(server.close)
+        session = self.session(server.port, password="")
+        self.assertEqual(tracker_core.get_vlc_status_telnet(session=session, check_process=False),
+                         {"file": MEDIA, "time": 61, "length": 1500, "state": "paused"})
+
+    def test_async_session_pipelines_too(self):
+        async def poll():
+            session = tracker_core.AsyncVLCSession("127.0.0.1", self.vlc.port, "secret", min_backoff=0)
+            try:
+                return [await tracker_core.get_vlc_status_async(session) for _ in range(2)]
+            finally:
+                session.close()
+        statuses = asyncio.run(poll())
+        self.assertEqual([status["length"] for status in statuses], [1500, 1500])
+        self.assertEqual(self.vlc.logins, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
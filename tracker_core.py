@@ -0,0 +1,3707 @@
+"""
+VLC Tracker's core: polls VLC, renames files with their progress and keeps
+the watch history, without any GUI. Tracker.py puts the tray window on top
+of it; `Tracker.py --headless` runs the core alone (see run_headless).
+"""
+import sys
+import os
+import importlib.util
+import socket
+import threading
+import time
+import collections
+import bisect
+import itertools
+import operator
+import array
+import csv
+import re
+import json
+import inspect
+import unicodedata
+import contextlib
+import base64
+import hashlib
+import mmap
+import struct
+import signal
+import urllib.parse
+import concurrent.futures
+import logging
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import queue
+import atexit
+import appdirs
+
+
+def lazy_import(name):
+    """Import a module on first attribute access instead of at startup."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# Not needed until after the tray icon is up, or the headless tracker has started
+asyncio = lazy_import("asyncio")
+psutil = lazy_import("psutil")
+sqlite3 = lazy_import("sqlite3")
+
+
+def load_deferred_modules():
+    """
+    Finish the lazy imports on the calling thread. LazyLoader is not safe when
+    two threads touch a module first, so this runs before any worker starts.
+    """
+    for module in (asyncio, psutil, sqlite3):
+        module.__name__
+
+
+# Change LOG_FILE definition
+USER_DATA_DIR = appdirs.user_data_dir("VLCTracker", "VLCTracker")
+if not os.path.exists(USER_DATA_DIR):
+    os.makedirs(USER_DATA_DIR)
+
+LOG_FILE = os.path.join(USER_DATA_DIR, "vlctracker.log")
+HISTORY_FILE = os.path.join(USER_DATA_DIR, "vlc_history.json")
+HISTORY_DB_FILE = os.path.join(USER_DATA_DIR, "vlc_history.db")
+HISTORY_FLUSH_DELAY = 5  # Seconds to coalesce history changes before writing them out
+HISTORY_ARCHIVE_DAYS = 90  # Entries untouched this long are archived; changeable under Settings, 0 = never
+HISTORY_PAGE_SIZE = 200  # Archived entries loaded at a time as the history view is scrolled
+HISTORY_ARCHIVE_INTERVAL = 24 * 3600  # Seconds between archive runs while the tracker keeps running
+RENAME_RETRIES = 5  # Attempts to rename a locked file before giving up
+RENAME_RETRY_DELAY = 2  # Seconds before the first retry, doubled after each failure
+FINGERPRINT_BLOCK_SIZE = 64 * 1024  # Bytes hashed from each end of a file to identify it
+FINGERPRINT_MIN_SIZE = 1024 * 1024  # Smaller files (empty placeholders, samples) are only matched by name
+LIBRARY_SCAN_WORKERS = 8  # Directories listed in parallel by the library scanner
+MEDIA_EXTENSIONS = {".mkv", ".mp4", ".avi", ".mov", ".wmv", ".m4v", ".webm", ".flv", ".mpg", ".mpeg",
+                    ".ts", ".m2ts", ".mp3", ".flac", ".m4a", ".ogg", ".opus", ".wav"}
+METRICS_JSON_FILE = os.path.join(USER_DATA_DIR, "metrics.json")
+METRICS_PROMETHEUS_FILE = os.path.join(USER_DATA_DIR, "metrics.prom")
+METRICS_EXPORT_INTERVAL = 60  # Seconds between automatic metrics exports, when enabled
+STATS_JSON_FILE = os.path.join(USER_DATA_DIR, "stats.json")
+STATS_CSV_FILE = os.path.join(USER_DATA_DIR, "stats.csv")
+STATS_ABANDONED_DAYS = 14  # Unfinished entries untouched this long count as abandoned
+STATS_ABANDONED_MIN_RATIO = 0.1  # Progress needed before stopping counts as abandoning rather than sampling
+STATS_ABANDONED_LIMIT = 50  # Most abandoned entries listed, most recently touched first
+SAMPLE_LOG_FILE = os.path.join(USER_DATA_DIR, "samples.bin")
+SAMPLE_FILES_FILE = os.path.join(USER_DATA_DIR, "samples.files")
+SAMPLE_LOG_MAX_BYTES = 32 * 1024 * 1024  # The sample log's older half is dropped on start once it grows past this
+SAMPLE_FLUSH_INTERVAL = 10  # Seconds samples may wait in the write buffer
+SAMPLE_SESSION_GAP = 300  # Seconds without a sample that end a viewing session
+SAMPLE_SEEK_TOLERANCE = 2  # Seconds the position may drift from wall time between samples before it counts as a seek
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)  # Seconds
+
+VLC_TELNET_HOST = "localhost" #VLC_TELNET_HOST
+VLC_TELNET_PORT = 4212 #VLC_TELNET_PORT
+VLC_TELNET_PASSWORD = ""  #VLC_TELNET_PASSWORD
+
+# Every VLC instance to track as (host, port, password); add an entry per rc port
+VLC_ENDPOINTS = [
+    (VLC_TELNET_HOST, VLC_TELNET_PORT, VLC_TELNET_PASSWORD),
+]
+
+# VLC's web interface; VLC will not start it without a password
+VLC_HTTP_HOST = "localhost"
+VLC_HTTP_PORT = 8080
+VLC_HTTP_PASSWORD = ""
+VLC_HTTP_ENDPOINTS = [
+    (VLC_HTTP_HOST, VLC_HTTP_PORT, VLC_HTTP_PASSWORD),
+]
+
+STATUS_BACKEND = "telnet"  # Default status source: "telnet", "telnet-push" or "http"; changeable under Settings
+
+POLL_INTERVAL = 2  # Seconds between status polls while playing
+PAUSED_POLL_INTERVAL = 5  # Seconds between polls while paused
+NEAR_END_POLL_INTERVAL = 1  # Seconds between polls close to the watched threshold
+NEAR_END_WINDOW = 60  # Seconds before the watched threshold that count as near the end
+MAX_ABSENT_POLL_INTERVAL = 16  # Backoff ceiling while VLC is not running
+POLL_DEADLINE = 3  # Hard limit for a single poll in seconds
+LATE_TICK_TOLERANCE = 0.25  # Seconds a poll may start after its due time before it counts as late
+WATCHED_REMAINING_SECONDS = 90
+WATCHED_RATIO = 0.95
+PROCESS_RESCAN_INTERVAL = 10  # Seconds between full process scans while VLC is absent
+PUSH_VERIFY_INTERVAL = 15  # Seconds between checks of the estimated position against VLC in push mode
+LOG_REPEAT_WINDOW = 60  # Seconds an identical log message is collapsed for before it is logged again
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# Local JSON-RPC API: a Unix domain socket, or a named pipe on Windows
+IPC_SOCKET_FILE = os.path.join(USER_DATA_DIR, "vlctracker.sock")
+IPC_PIPE_NAME = r"\\.\pipe\VLCTracker"
+IPC_MAX_MESSAGE = 1024 * 1024  # Bytes a single request line may take
+IPC_MAX_PAGE = 1000  # Most history entries returned by one history.query
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Collapses runs of identical log messages. Repeats of the previous
+    message are dropped and counted; the count is logged when a different
+    message comes along, or with the next repeat once `window` seconds have
+    passed, so a message that recurs every poll shows up once per window.
+    Messages are compared by their unformatted template and arguments, so
+    dropped records are never formatted.
+    """
+
+    def __init__(self, window=LOG_REPEAT_WINDOW):
+        super().__init__()
+        self.window = window
+        self.lock = threading.Lock()
+        self.last = None  # (logger name, level, msg, args) of the last message let through
+        self.last_time = 0
+        self.repeats = 0
+
+    def filter(self, record):
+        if getattr(record, "repeat_summary", False):
+            return True
+        key = (record.name, record.levelno, record.msg, record.args)
+        now = time.monotonic()
+        with self.lock:
+            if key == self.last and now - self.last_time < self.window:
+                self.repeats += 1
+                return False
+            repeats, self.repeats = self.repeats, 0
+            previous = self.last
+            self.last = key
+            self.last_time = now
+        if repeats:
+            summary = logging.LogRecord(previous[0], previous[1], record.pathname, record.lineno,
+                                        "Previous message repeated %s more times", (repeats,), None)
+            summary.repeat_summary = True
+            logging.getLogger().handle(summary)
+        return True
+
+
+def read_setting(key, default, type=str):
+    """
+    A setting saved by the UI. They are kept with QSettings, which QtCore
+    reads without loading any GUI module; without PyQt6 the default is used.
+    """
+    try:
+        from PyQt6.QtCore import QSettings
+    except ImportError:
+        return default
+    return QSettings("VLCTracker", "Settings").value(key, default, type)
+
+
+def write_setting(key, value):
+    try:
+        from PyQt6.QtCore import QSettings
+    except ImportError:
+        logging.warning("PyQt6 is not installed; setting %s is not saved", key)
+        return
+    QSettings("VLCTracker", "Settings").setValue(key, value)
+
+
+def configured_log_level():
+    """Log level from the VLCTRACKER_LOG_LEVEL environment variable, else the saved setting."""
+    name = os.environ.get("VLCTRACKER_LOG_LEVEL") or read_setting("log_level", "WARNING")
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else logging.WARNING
+
+
+def set_log_level(name):
+    """Change the log level while running and remember it for the next start."""
+    logging.getLogger().setLevel(name)
+    write_setting("log_level", name)
+
+
+log_listener = None
+
+
+def setup_logging(level=None):
+    """
+    Configure logging with rotation. Records are handed to a queue and
+    written to the file by a background thread, so logging never blocks the
+    caller on disk I/O.
+    """
+    global log_listener
+    try:
+        # Remove any existing handlers
+        root_logger = logging.getLogger()
+        for handler in root_logger.handlers[:]:
+            root_logger.removeHandler(handler)
+        if log_listener:
+            log_listener.stop()
+            
+        # Create rotating file handler with more permissive file access
+        handler = RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=1024 * 1024,  # 1MB per file
+            backupCount=3,  # Keep 3 backup files
+            delay=True  # Don't open the file until first log message
+        )
+        
+        # Set formatter
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
+        handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(RepeatFilter())
+        log_listener = QueueListener(log_queue, handler)
+        log_listener.start()
+        atexit.register(stop_logging)
+        
+        # Configure root logger
+        root_logger.setLevel(level if level is not None else configured_log_level())
+        root_logger.addHandler(queue_handler)
+        
+        # Don't create separate debug logger, use root logger with filter
+        logging.info("Logging system initialized")
+        
+    except Exception as e:
+        print(f"Failed to setup logging: {e}")
+
+
+def stop_logging():
+    """Write out whatever is still queued and stop the logging thread."""
+    global log_listener
+    if log_listener:
+        log_listener.stop()
+        log_listener = None
+
+
+def log_crash(exc_type, exc_value, exc_traceback):
+    """Log uncaught exceptions with full debug info"""
+    try:
+        logging.critical(
+            "Uncaught exception:",
+            exc_info=(exc_type, exc_value, exc_traceback)
+        )
+    except Exception as e:
+        print(f"Failed to log crash: {e}")
+
+class Histogram:
+    """Latency histogram with fixed bucket bounds, in seconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot counts everything above the top bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (the max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) pairs, ending with +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms for the polling, rename and
+    history paths. Recording is a dict lookup and a few additions under a
+    lock, so it is safe to call from any thread. Metrics are identified by
+    name plus optional labels, as in Prometheus.
+    """
+
+    PREFIX = "vlctracker_"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observe how long the block takes, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Copy of every metric as plain data, for display and JSON export."""
+        with self.lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{
+                "name": name,
+                "labels": dict(labels),
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "max": histogram.max,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "buckets": [[bound if bound != float("inf") else "+Inf", count]
+                            for bound, count in histogram.cumulative()],
+            } for (name, labels), histogram in sorted(self.histograms.items())]
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": time.time() - self.started,
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    @staticmethod
+    def _labels(labels, extra=None):
+        items = list(labels.items()) + (list(extra.items()) if extra else [])
+        if not items:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                   for _, value in items)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in snapshot["counters"]:
+            name = self.PREFIX + counter["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._labels(counter['labels'])} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name = self.PREFIX + histogram["name"]
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            labels = histogram["labels"]
+            for bound, count in histogram["buckets"]:
+                lines.append(f"{name}_bucket{self._labels(labels, {'le': bound})} {count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{self._labels(labels)} {histogram['count']}")
+        lines.append(f"# TYPE {self.PREFIX}uptime_seconds gauge")
+        lines.append(f"{self.PREFIX}uptime_seconds {snapshot['uptime_seconds']:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path, fmt="json"):
+        """Write the metrics to path as "json" or "prometheus", replacing the file atomically."""
+        if fmt == "prometheus":
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=4)
+        # Collectors may read the file at any moment, so never let them see half of it
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return path
+
+
+metrics = Metrics()
+
+
+def format_metrics(snapshot):
+    """Plain-text table of a metrics snapshot for the Diagnostics tab."""
+    def title(metric):
+        labels = ",".join(f"{name}={value}" for name, value in metric["labels"].items())
+        return f"{metric['name']}{{{labels}}}" if labels else metric["name"]
+
+    uptime = int(snapshot["uptime_seconds"])
+    lines = [f"Uptime: {uptime // 3600}h {uptime % 3600 // 60:02d}m", ""]
+    if snapshot["histograms"]:
+        lines.append(f"{'Latency (ms)':<52} {'count':>8} {'p50':>8} {'p95':>8} {'max':>8}")
+        for histogram in snapshot["histograms"]:
+            lines.append(f"{title(histogram):<52} {histogram['count']:>8} {histogram['p50'] * 1000:>8.1f} "
+                         f"{histogram['p95'] * 1000:>8.1f} {histogram['max'] * 1000:>8.1f}")
+        lines.append("")
+    if snapshot["counters"]:
+        lines.append(f"{'Counters':<52} {'value':>8}")
+        for counter in snapshot["counters"]:
+            lines.append(f"{title(counter):<52} {counter['value']:>8}")
+    if not snapshot["histograms"] and not snapshot["counters"]:
+        lines.append("Nothing recorded yet.")
+    return "\n".join(lines)
+
+
+def media_path(path):
+    """Turn a VLC input (possibly a file:/// URI) into a local file path."""
+    # Remove file:/// prefix if present; URIs are percent-encoded
+    if path.startswith("file:///"):
+        # Remove "file:///", keeping the leading / of paths outside Windows
+        path = urllib.parse.unquote(path[8:] if os.name == "nt" else path[7:])
+    
+    # Convert path separators to system format
+    return os.path.normpath(path)
+
+def rename_media_file(original_path, is_watched, timestamp=None, raise_errors=False):
+    """Helper function to rename the media file"""
+    started = time.perf_counter()
+    try:
+        original_path = media_path(original_path)
+        
+        directory = os.path.dirname(original_path)
+        filename = os.path.basename(original_path)
+        name, ext = os.path.splitext(filename)
+        
+        # Remove any existing [WATCHED] or [MM:SS] prefix
+        if name.startswith('['):
+            name = name[name.find(']') + 1:].strip()
+        
+        # Create new filename
+        prefix = '[WATCHED]' if is_watched else f'[{timestamp}]'
+        new_filename = f"{prefix} {name}{ext}"
+        new_path = os.path.join(directory, new_filename)
+        
+        
+        # Rename the file
+        if os.path.exists(original_path):
+            os.rename(original_path, new_path)
+            metrics.increment("renames_total", result="renamed")
+            return new_path
+        else:
+            metrics.increment("renames_total", result="missing")
+            return original_path
+            
+    except Exception as e:
+        metrics.increment("renames_total", result="error")
+        if raise_errors:
+            raise
+        return original_path
+    finally:
+        metrics.observe("rename_seconds", time.perf_counter() - started)
+
+class RenameQueue:
+    """
+    Renames media files on a background thread so slow shares never block
+    the GUI. Repeated renames of the same file are merged and only the
+    latest target is applied. Files that are still locked are retried with
+    exponential backoff up to `retries` times. on_renamed(old_path, new_path)
+    is called from the worker thread once a rename has gone through.
+    """
+
+    def __init__(self, on_renamed=None, retries=RENAME_RETRIES, retry_delay=RENAME_RETRY_DELAY):
+        self.on_renamed = on_renamed
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.jobs = {}  # rename key -> pending job
+        self.moved = {}  # rename key -> where the file was last renamed to, while another rename of it is queued
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name="RenameQueue", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def rename_key(path):
+        path = media_path(path)
+        return os.path.normcase(os.path.dirname(path)), history_base_name(path)
+
+    def submit(self, path, is_watched, timestamp=None):
+        path = media_path(path)
+        key = self.rename_key(path)
+        with self.cond:
+            job = self.jobs.get(key)
+            if job:
+                # Still waiting: the newest path and progress win, the retry budget starts over
+                job.update(path=path, is_watched=is_watched, timestamp=timestamp, attempts=0, due=time.monotonic())
+            else:
+                self.jobs[key] = {
+                    "path": path,
+                    "is_watched": is_watched,
+                    "timestamp": timestamp,
+                    "attempts": 0,
+                    "due": time.monotonic(),
+                }
+            self.cond.notify()
+
+    def _next_job(self):
+        """Wait for the earliest due job and take it off the queue. Returns None when stopping."""
+        with self.cond:
+            while True:
+                if self.stopping and not self.jobs:
+                    return None
+                now = time.monotonic()
+                due = [(job["due"], key) for key, job in self.jobs.items()]
+                if due:
+                    when, key = min(due)
+                    if when <= now or self.stopping:
+                        return key, self.jobs.pop(key)
+                    self.cond.wait(when - now)
+                else:
+                    self.cond.wait()
+
+    def _run(self):
+        while True:
+            item = self._next_job()
+            if item is None:
+                return
+            key, job = item
+            source = job["path"]
+            moved = self.moved.get(key)
+            if moved and not os.path.exists(source):
+                # An earlier rename from this queue already moved it
+                source = moved
+            try:
+                new_path = rename_media_file(source, job["is_watched"], job["timestamp"], raise_errors=True)
+            except OSError as e:
+                self._retry(key, job, e)
+                continue
+            except Exception as e:
+                logging.error("Error renaming %s: %s", source, e, exc_info=True)
+                continue
+
+            with self.cond:
+                if new_path != source and key in self.jobs:
+                    # Queued while this one ran, so it may still name the file by its old path
+                    self.moved[key] = new_path
+                else:
+                    self.moved.pop(key, None)
+            if new_path != source:
+                logging.debug("Renamed %s to %s", source, new_path)
+                if self.on_renamed:
+                    try:
+                        self.on_renamed(job["path"], new_path)
+                    except Exception as e:
+                        logging.error("Error in rename callback: %s", e, exc_info=True)
+
+    def _retry(self, key, job, error):
+        job["attempts"] += 1
+        with self.cond:
+            if self.stopping or job["attempts"] > self.retries:
+                logging.warning("Giving up renaming %s: %s", job['path'], error)
+                return
+            if key in self.jobs:
+                # A newer rename of the same file was queued meanwhile and supersedes this one
+                return
+            delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+            job["due"] = time.monotonic() + delay
+            self.jobs[key] = job
+            logging.debug("Rename of %s failed (%s), retrying in %ss", job['path'], error, delay)
+
+    def stop(self, timeout=5):
+        """Make one last attempt at every pending rename, then stop the worker."""
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+        self.thread.join(timeout)
+
+def is_watched_position(current_time, total_length):
+    """Consider a file watched if within 90 seconds of the end OR 95% complete."""
+    if not total_length or total_length <= 0:
+        return False
+    time_remaining = total_length - current_time
+    return time_remaining <= WATCHED_REMAINING_SECONDS or (current_time / total_length) > WATCHED_RATIO
+
+def history_base_name(path):
+    """Base filename with any [WATCHED] or [MM-SS] prefix stripped, used to match history entries."""
+    base_name = os.path.basename(path)
+    if base_name.startswith('['):
+        base_name = base_name[base_name.find(']') + 1:].strip()
+    return base_name
+
+def filename_progress(path):
+    """
+    Progress encoded in a file name by rename_media_file, as (watched, timestamp)
+    in history form ("[WATCHED]" or "M:SS"), or None if the name carries none.
+    """
+    name = os.path.basename(path)
+    if not name.startswith('[') or ']' not in name:
+        return None
+    prefix = name[1:name.find(']')]
+    if prefix == "WATCHED":
+        return True, "[WATCHED]"
+    minutes, _, seconds = prefix.partition('-')
+    if not (minutes.isdigit() and seconds.isdigit()):
+        return None
+    return False, format_time(int(minutes) * 60 + int(seconds))
+
+def file_fingerprint(path, block_size=FINGERPRINT_BLOCK_SIZE):
+    """
+    Cheap content identity for a media file: its size plus a hash of the
+    first and last block, read through mmap. Unlike the path it survives
+    renames and moves.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        digest = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=16)
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                digest.update(data[:block_size])
+                if size > block_size:
+                    digest.update(data[max(block_size, size - block_size):])
+    return f"{size:x}-{digest.hexdigest()}"
+
+
+class FingerprintIndex:
+    """
+    Content fingerprints of media files, cached in SQLite by (device, inode,
+    size, mtime) so each file is only hashed once; renaming a file keeps its
+    inode and mtime, so the fingerprint carries over without reading it
+    again. The last path each file was seen at is kept for repairing stale
+    history paths. Files below FINGERPRINT_MIN_SIZE, and a file whose
+    fingerprint another existing file already has, get None, so history
+    matches them by name instead of merging different files. Safe to use
+    from any thread.
+    """
+
+    def __init__(self, path=HISTORY_DB_FILE):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    file_id TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    path TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_fingerprint ON fingerprints (fingerprint)")
+
+    @staticmethod
+    def file_id(path, stat):
+        # Some network filesystems report no inode numbers; fall back to the path there
+        if stat.st_ino:
+            return f"{stat.st_dev}:{stat.st_ino}"
+        return "path:" + os.path.normcase(os.path.abspath(path))
+
+    def fingerprint(self, path):
+        """Fingerprint of the file at path, or None if it cannot be read."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size < FINGERPRINT_MIN_SIZE:
+            return None
+        file_id = self.file_id(path, stat)
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime_ns, fingerprint, path FROM fingerprints WHERE file_id = ?",
+                                    (file_id,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            metrics.increment("fingerprint_cache_total", result="hit")
+            if row[3] != path:
+                with self.lock, self.conn:
+                    self.conn.execute("UPDATE fingerprints SET path = ? WHERE file_id = ?", (path, file_id))
+            return row[2]
+
+        metrics.increment("fingerprint_cache_total", result="miss")
+        try:
+            with metrics.timer("fingerprint_seconds"):
+                fingerprint = file_fingerprint(path)
+        except (OSError, ValueError) as e:
+            logging.debug("Could not fingerprint %s: %s", path, e)
+            return None
+        with self.lock:
+            others = self.conn.execute("SELECT path FROM fingerprints WHERE fingerprint = ? AND file_id != ?",
+                                       (fingerprint, file_id)).fetchall()
+        for (other,) in others:
+            if os.path.exists(other):
+                # Left uncached, so it is checked again once the other file is gone
+                logging.info("%s has the same fingerprint as %s; matching it by name only", path, other)
+                metrics.increment("fingerprint_collisions_total")
+                return None
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                              (file_id, stat.st_size, stat.st_mtime_ns, fingerprint, path))
+        return fingerprint
+
+    def path_for(self, fingerprint):
+        """An existing path last seen with this fingerprint, or None."""
+        with self.lock:
+            rows = self.conn.execute("SELECT path FROM fingerprints WHERE fingerprint = ?", (fingerprint,)).fetchall()
+        for (path,) in rows:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class HistoryStore:
+    """
+    Watch history held in memory and persisted to SQLite.
+    Entries are identified by the content fingerprint of their file where
+    one is known, so moved and renamed files keep their history and equally
+    named files in different folders stay apart. Entries without one (from
+    before fingerprints, or for unreadable files) are matched by folder and
+    base name, and pick up a fingerprint the next time they are seen.
+    Only recent entries are held in memory. archive() moves entries not
+    touched for a while out of memory into the archive, a flag on their
+    rows, so memory and load time follow the recent window rather than the
+    whole history. Archived entries are read back a page at a time, and one
+    that is played again is restored.
+    The in-memory dicts are authoritative for recent entries, so lookups and
+    upserts for them never touch the disk; changes are written behind on a
+    background thread, coalescing bursts into a single transaction at most
+    every flush_delay seconds. SQLite's journal makes each flush atomic, so
+    a crash mid-write leaves the previous state intact.
+    The old vlc_history.json is imported the first time the database is opened.
+    Listeners are called with ("upsert", entry) or ("delete", entry) after
+    every change so views can update just the affected row.
+    """
+
+    def __init__(self, path=HISTORY_DB_FILE, json_path=HISTORY_FILE, flush_delay=HISTORY_FLUSH_DELAY):
+        self.listeners = []
+        self.flush_delay = flush_delay
+        self.lock = threading.Lock()  # Guards the in-memory entries and pending changes
+        self.changed = threading.Condition(self.lock)
+        self.flush_lock = threading.Lock()  # Serializes database writes
+        self.entries_by_id = {}  # id -> entry, in history order
+        self.ids_by_name = collections.defaultdict(set)  # base_name -> ids
+        self.ids_by_fingerprint = {}  # fingerprint -> id
+        self.next_id = 1
+        self.pending_upserts = {}
+        self.pending_deletes = set()
+        self.closed = False
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    file TEXT NOT NULL,
+                    base_name TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    watched INTEGER NOT NULL DEFAULT 0,
+                    length INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    fingerprint TEXT
+                )
+            """)
+            columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(history)")}
+            if "fingerprint" not in columns:
+                self.conn.execute("ALTER TABLE history ADD COLUMN fingerprint TEXT")
+            if "archived" not in columns:
+                self.conn.execute("ALTER TABLE history ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+            # Base names used to be unique; files in different folders may now share one
+            self.conn.execute("DROP INDEX IF EXISTS history_base_name")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS history_by_base_name ON history (base_name)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS history_fingerprint ON history (fingerprint)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS history_by_archived ON history (archived, id)")
+        self.next_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM history").fetchone()[0]
+        # Spares lookups of new files a query while nothing was ever archived
+        self.has_archive = self.conn.execute("SELECT 1 FROM history WHERE archived = 1 LIMIT 1").fetchone() is not None
+        self.migrate_json(json_path)
+
+        rows = self.conn.execute(
+            "SELECT id, file, base_name, timestamp, watched, length, updated_at, fingerprint FROM history "
+            "WHERE archived = 0 ORDER BY id")
+        for row in rows:
+            self._index(self._entry(row))
+        self.next_id = max(self.next_id, max(self.entries_by_id, default=0) + 1)
+
+        self.writer = threading.Thread(target=self._write_behind, name="HistoryWriter", daemon=True)
+        self.writer.start()
+
+    def migrate_json(self, json_path):
+        """One-time import of the JSON history; the file is kept as .migrated afterwards."""
+        if not json_path or not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r") as f:
+                history = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error("Could not read %s for migration: %s", json_path, e)
+            return
+
+        migrated = {}
+        for entry in history:
+            try:
+                base_name = history_base_name(entry['file'])
+                if base_name not in migrated:
+                    migrated[base_name] = self._new_entry(entry['file'], entry['timestamp'],
+                                                          entry.get('watched', False), entry.get('length', 0))
+            except (KeyError, TypeError):
+                logging.warning("Skipping malformed history entry: %s", entry)
+        with self.conn:
+            for entry in migrated.values():
+                self._write_entry(entry)
+        os.replace(json_path, json_path + ".migrated")
+        logging.info("Migrated %s history entries from %s", len(migrated), json_path)
+
+    def _new_entry(self, file, timestamp, watched, length, fingerprint=None):
+        entry = {
+            "id": self.next_id,
+            "file": file,
+            "base_name": history_base_name(file),
+            "timestamp": timestamp,
+            "watched": bool(watched),
+            "length": length or 0,
+            "updated_at": time.time(),
+            "fingerprint": fingerprint,
+        }
+        self.next_id += 1
+        return entry
+
+    def _write_entry(self, entry):
+        self.conn.execute("""
+            INSERT INTO history (id, file, base_name, timestamp, watched, length, updated_at, fingerprint, archived)
+            VALUES (:id, :file, :base_name, :timestamp, :watched, :length, :updated_at, :fingerprint, 0)
+            ON CONFLICT (id) DO UPDATE SET
+                file = excluded.file,
+                base_name = excluded.base_name,
+                timestamp = excluded.timestamp,
+                watched = excluded.watched,
+                length = excluded.length,
+                updated_at = excluded.updated_at,
+                fingerprint = excluded.fingerprint,
+                archived = 0
+        """, entry)
+
+    def _index(self, entry):
+        """Store entry and point the lookup dicts at it, replacing any older version. Caller holds the lock."""
+        old = self.entries_by_id.get(entry["id"])
+        if old:
+            self._unindex(old)
+        self.entries_by_id[entry["id"]] = entry
+        self.ids_by_name[entry["base_name"]].add(entry["id"])
+        if entry["fingerprint"]:
+            self.ids_by_fingerprint[entry["fingerprint"]] = entry["id"]
+
+    def _unindex(self, entry):
+        ids = self.ids_by_name.get(entry["base_name"])
+        if ids:
+            ids.discard(entry["id"])
+            if not ids:
+                del self.ids_by_name[entry["base_name"]]
+        if self.ids_by_fingerprint.get(entry["fingerprint"]) == entry["id"]:
+            del self.ids_by_fingerprint[entry["fingerprint"]]
+
+    def _find(self, file, fingerprint=None):
+        """
+        The entry for file, by fingerprint first and then by folder and base
+        name, looking in the archive if no recent entry matches. Caller holds the lock.
+        """
+        candidates = [self.entries_by_id[i] for i in self.ids_by_name.get(history_base_name(file), ())]
+        if fingerprint and fingerprint in self.ids_by_fingerprint:
+            # Fingerprints stored before FINGERPRINT_MIN_SIZE can be shared by different small files,
+            # so the entry with this file's own folder and name still wins
+            folder = os.path.normcase(os.path.dirname(file))
+            named = [entry for entry in candidates if os.path.normcase(os.path.dirname(entry["file"])) == folder]
+            return named[0] if named else self.entries_by_id[self.ids_by_fingerprint[fingerprint]]
+        return self._match(file, fingerprint, candidates) or self._find_archived(file, fingerprint)
+
+    def _find_archived(self, file, fingerprint=None):
+        """Like _find, over archived entries only. Caller holds the lock."""
+        if not self.has_archive:
+            return None
+        rows = self.conn.execute(
+            "SELECT id, file, base_name, timestamp, watched, length, updated_at, fingerprint FROM history "
+            # "+archived" keeps SQLite on the name and fingerprint indexes rather than scanning the whole archive
+            "WHERE +archived = 1 AND (base_name = ? OR fingerprint = ?)", (history_base_name(file), fingerprint))
+        # Skip rows restored or deleted since, whose changes are not written yet
+        candidates = [self._entry(row) for row in rows
+                      if row["id"] not in self.entries_by_id and row["id"] not in self.pending_deletes]
+        if fingerprint:
+            for entry in candidates:
+                if entry["fingerprint"] == fingerprint:
+                    return entry
+        return self._match(file, fingerprint, [entry for entry in candidates
+                                               if entry["base_name"] == history_base_name(file)])
+
+    def _match(self, file, fingerprint, candidates):
+        """The one of candidates, entries with file's base name, that is file."""
+        folder = os.path.normcase(os.path.dirname(file))
+        for entry in candidates:
+            # The same file under another [..] prefix
+            if os.path.normcase(os.path.dirname(entry["file"])) == folder:
+                return entry
+        if fingerprint:
+            # Entries from before fingerprints can only be told apart by name
+            legacy = [entry for entry in candidates if not entry["fingerprint"]]
+            if len(legacy) == 1:
+                return legacy[0]
+        return None
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _notify(self, change, entry):
+        for callback in self.listeners:
+            try:
+                callback(change, entry)
+            except Exception as e:
+                logging.error("Error in history listener: %s", e, exc_info=True)
+
+    def _store(self, entry):
+        """Index entry and queue it for writing. Caller holds the lock."""
+        self._index(entry)
+        self.pending_upserts[entry["id"]] = entry
+        self.changed.notify()
+
+    def upsert(self, file, timestamp, watched=False, length=0, fingerprint=None):
+        with self.lock:
+            entry = self._find(file, fingerprint)
+            if entry is None:
+                entry = self._new_entry(file, timestamp, watched, length, fingerprint)
+            else:
+                # Length is only recorded when the entry is first created, as before
+                entry = dict(entry, file=file, base_name=history_base_name(file), timestamp=timestamp,
+                             watched=bool(watched), updated_at=time.time(),
+                             fingerprint=fingerprint or entry["fingerprint"])
+            self._store(entry)
+        self._notify("upsert", entry)
+
+    def rename(self, old_file, new_file):
+        """Point the entry for old_file at new_file without touching its progress; False if there is none."""
+        with self.lock:
+            entry = self._find(old_file)
+            if entry is None or entry["file"] != old_file:
+                return False
+            entry = dict(entry, file=new_file, base_name=history_base_name(new_file))
+            self._store(entry)
+        self._notify("upsert", entry)
+        return True
+
+    def moved_files(self, fingerprints):
+        """
+        (old path, new path) of entries whose file has gone missing, paired
+        with wherever the FingerprintIndex last saw the same content. Checks
+        the disk, so it is meant for a worker thread; rename() applies the
+        result on the host thread.
+        """
+        with self.lock:
+            fingerprinted = [(entry["file"], entry["fingerprint"])
+                             for entry in self.entries_by_id.values() if entry["fingerprint"]]
+        moves = []
+        for file, fingerprint in fingerprinted:
+            if os.path.exists(file):
+                continue
+            path = fingerprints.path_for(fingerprint)
+            if path:
+                moves.append((file, path))
+        return moves
+
+    def delete(self, file):
+        with self.lock:
+            entry = self._find(file)
+            if entry is None:
+                return
+            if self.entries_by_id.pop(entry["id"], None):
+                self._unindex(entry)
+            self.pending_upserts.pop(entry["id"], None)
+            self.pending_deletes.add(entry["id"])
+            self.changed.notify()
+        self._notify("delete", entry)
+
+    def get(self, file, fingerprint=None):
+        with self.lock:
+            return self._find(file, fingerprint)
+
+    def entries(self):
+        """The recent, unarchived entries, oldest first."""
+        with self.lock:
+            return list(self.entries_by_id.values())
+
+    def archived_entries(self, before_id=None, limit=HISTORY_PAGE_SIZE, matches=None):
+        """
+        A page of archived entries, newest first, from before before_id, only
+        those matches() accepts if given. Returns (entries, cursor); cursor is
+        the before_id of the next page, or None after the last one.
+        """
+        page = []
+        cursor = before_id
+        while len(page) < limit:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, file, base_name, timestamp, watched, length, updated_at, fingerprint FROM history "
+                    "WHERE archived = 1 AND id < ? ORDER BY id DESC LIMIT ?",
+                    (self.next_id if cursor is None else cursor, limit)).fetchall()
+                if not rows:
+                    return page, None
+                cursor = rows[-1]["id"]
+                # Skip rows restored or deleted since, whose changes are not written yet
+                entries = [self._entry(row) for row in rows
+                           if row["id"] not in self.entries_by_id and row["id"] not in self.pending_deletes]
+            page.extend(entry for entry in entries if matches is None or matches(entry))
+        return page, cursor
+
+    def all_rows(self):
+        """(id, file, timestamp, watched, length, updated_at) of every entry, archived ones included."""
+        self.flush()
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.row_factory = None  # Plain tuples; sqlite3.Row makes reading the whole table several times slower
+            return cursor.execute("SELECT id, file, timestamp, watched, length, updated_at FROM history").fetchall()
+
+    def archive(self, max_age):
+        """
+        Move entries not updated for max_age seconds out of memory into the
+        archive. Returns how many were archived.
+        """
+        cutoff = time.time() - max_age
+        with self.lock:
+            if not any(entry["updated_at"] < cutoff for entry in self.entries_by_id.values()):
+                return 0
+        self.flush()  # The archived rows must hold the latest version of each entry
+        with self.flush_lock, self.lock:
+            old = [entry for entry in self.entries_by_id.values()
+                   if entry["updated_at"] < cutoff and entry["id"] not in self.pending_upserts]
+            try:
+                with self.conn:
+                    self.conn.executemany("UPDATE history SET archived = 1 WHERE id = ?",
+                                          [(entry["id"],) for entry in old])
+            except sqlite3.Error as e:
+                logging.error("Error archiving history: %s", e, exc_info=True)
+                return 0
+            for entry in old:
+                del self.entries_by_id[entry["id"]]
+                self._unindex(entry)
+            self.has_archive = True
+        logging.info("Archived %s history entries", len(old))
+        return len(old)
+
+    def _entry(self, row):
+        return {
+            "id": row["id"],
+            "file": row["file"],
+            "base_name": row["base_name"],
+            "timestamp": row["timestamp"],
+            "watched": bool(row["watched"]),
+            "length": row["length"],
+            "updated_at": row["updated_at"],
+            "fingerprint": row["fingerprint"],
+        }
+
+    def _write_behind(self):
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.closed or self.pending_upserts or self.pending_deletes)
+                if self.closed:
+                    return
+                # Let a burst of changes settle so it lands in a single transaction
+                self.changed.wait_for(lambda: self.closed, self.flush_delay)
+                if self.closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write all pending changes in one transaction."""
+        with self.flush_lock:
+            with self.lock:
+                upserts, self.pending_upserts = self.pending_upserts, {}
+                deletes, self.pending_deletes = self.pending_deletes, set()
+            if not upserts and not deletes:
+                return
+            try:
+                with metrics.timer("history_flush_seconds"), self.conn:
+                    self.conn.executemany("DELETE FROM history WHERE id = ?", [(entry_id,) for entry_id in deletes])
+                    for entry in upserts.values():
+                        self._write_entry(entry)
+                logging.debug("Flushed %s history updates and %s deletions", len(upserts), len(deletes))
+            except sqlite3.Error as e:
+                logging.error("Error writing history: %s", e, exc_info=True)
+                with self.lock:
+                    # Retry with the next flush unless newer changes superseded these
+                    for entry_id in deletes:
+                        if entry_id not in self.entries_by_id:
+                            self.pending_deletes.add(entry_id)
+                    for entry_id in upserts:
+                        if entry_id in self.entries_by_id and entry_id not in self.pending_upserts:
+                            self.pending_upserts[entry_id] = self.entries_by_id[entry_id]
+
+    def close(self):
+        """Stop the writer thread and flush whatever is still pending."""
+        with self.changed:
+            if self.closed:
+                return
+            self.closed = True
+            self.changed.notify_all()
+        self.writer.join()
+        self.flush()
+        self.conn.close()
+
+class LibraryScanner:
+    """
+    Finds the media files in the library folders on a background thread.
+    Directories are listed with os.scandir from a thread pool, so a slow
+    share has many listings in flight at once. Each directory's mtime and
+    contents are remembered in the history database: a directory whose
+    mtime has not changed since the last scan is not listed again, only
+    stat'ed, and its remembered files and subdirectories are used instead.
+    Subdirectories are still visited, because a change deeper down does not
+    touch the mtime of the directories above it.
+    on_done(result) is called from the scan thread with the media files found.
+    """
+
+    def __init__(self, on_done=None, db_path=HISTORY_DB_FILE, workers=LIBRARY_SCAN_WORKERS):
+        self.on_done = on_done
+        self.db_path = db_path
+        self.workers = workers
+        self.thread = None
+        self.cache = None  # path -> (mtime_ns, subdirectory names, media file names)
+
+    @property
+    def scanning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, folders):
+        """Scan folders in the background unless a scan is already running."""
+        if self.scanning:
+            return False
+        self.thread = threading.Thread(target=self._run, args=(list(folders),), name="LibraryScanner", daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self, folders):
+        try:
+            result = self.scan(folders)
+        except Exception as e:
+            logging.error("Error scanning library: %s", e, exc_info=True)
+            return
+        if self.on_done:
+            try:
+                self.on_done(result)
+            except Exception as e:
+                logging.error("Error in library scan callback: %s", e, exc_info=True)
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS library_dirs (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    subdirs TEXT NOT NULL,
+                    files TEXT NOT NULL
+                )
+            """)
+        return conn
+
+    def _load_cache(self, conn):
+        self.cache = {}
+        for path, mtime_ns, subdirs, files in conn.execute("SELECT path, mtime_ns, subdirs, files FROM library_dirs"):
+            self.cache[path] = (mtime_ns, json.loads(subdirs), json.loads(files))
+
+    def _visit(self, path):
+        """List one directory, or reuse what it held last time if its mtime is unchanged."""
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self.cache.get(path)
+        if cached and cached[0] == mtime_ns:
+            return path, cached, False
+        subdirs = []
+        files = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in MEDIA_EXTENSIONS and entry.is_file():
+                        files.append(entry.name)
+                except OSError:
+                    continue
+        return path, (mtime_ns, subdirs, files), True
+
+    def scan(self, folders):
+        started = time.perf_counter()
+        folders = [os.path.normpath(folder) for folder in folders]
+        conn = self._open()
+        try:
+            if self.cache is None:
+                self._load_cache(conn)
+            seen = {}
+            changed = {}
+            files = []
+            with concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="LibraryScan") as pool:
+                pending = {pool.submit(self._visit, folder) for folder in folders}
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            path, listing, listed = future.result()
+                        except OSError as e:
+                            logging.warning("Could not scan %s", e.filename or e)
+                            continue
+                        seen[path] = listing
+                        if listed:
+                            changed[path] = listing
+                        _, subdirs, names = listing
+                        files.extend(os.path.join(path, name) for name in names)
+                        pending.update(pool.submit(self._visit, os.path.join(path, name)) for name in subdirs)
+
+            # Forget directories that were under the scanned folders but are gone now
+            roots = tuple(os.path.join(folder, "") for folder in folders)
+            vanished = [path for path in self.cache
+                        if path not in seen and (path in folders or path.startswith(roots))]
+            with conn:
+                conn.executemany("DELETE FROM library_dirs WHERE path = ?", [(path,) for path in vanished])
+                conn.executemany("INSERT OR REPLACE INTO library_dirs VALUES (?, ?, ?, ?)",
+                                 [(path, mtime_ns, json.dumps(subdirs), json.dumps(names))
+                                  for path, (mtime_ns, subdirs, names) in changed.items()])
+            for path in vanished:
+                del self.cache[path]
+            self.cache.update(changed)
+        finally:
+            conn.close()
+
+        seconds = time.perf_counter() - started
+        metrics.observe("library_scan_seconds", seconds)
+        metrics.increment("library_dirs_total", len(changed), result="listed")
+        metrics.increment("library_dirs_total", len(seen) - len(changed), result="reused")
+        logging.info("Scanned %s directories (%s listed) and found %s media files in %.1fs",
+                     len(seen), len(changed), len(files), seconds)
+        return {
+            "files": files,
+            "directories": len(seen),
+            "listed": len(changed),
+            "seconds": seconds,
+        }
+
+
+def plan_library_update(store, files, fingerprints=None):
+    """
+    Work out how a library scan changes the history, on the scan thread since
+    it checks files on disk. Returns (seeds, repairs): seeds are (path,
+    watched, timestamp) of files whose names carry progress; repairs are
+    (old path, new path) of entries whose file has gone missing and which
+    have exactly one library file with the same base name (with a matching
+    fingerprint, if the entry has one).
+    """
+    by_name = collections.defaultdict(list)
+    seeds = []
+    for path in files:
+        by_name[history_base_name(path)].append(path)
+        progress = filename_progress(path)
+        if progress:
+            seeds.append((path, *progress))
+
+    repairs = []
+    for entry in store.entries():
+        candidates = by_name.get(entry["base_name"], [])
+        if len(candidates) != 1 or os.path.exists(entry["file"]):
+            continue
+        path = candidates[0]
+        if entry["fingerprint"] and fingerprints and fingerprints.fingerprint(path) != entry["fingerprint"]:
+            continue
+        repairs.append((entry["file"], path))
+    return seeds, repairs
+
+
+def apply_library_update(store, seeds, repairs):
+    """
+    Apply what plan_library_update found, on the host thread: seeds without a
+    history entry are added and repairs still pointing at the old path are
+    made. Returns (seeded, repaired).
+    """
+    seeded = 0
+    for path, watched, timestamp in seeds:
+        if store.get(path) is None:
+            store.upsert(path, timestamp, watched)
+            seeded += 1
+    repaired = sum(store.rename(old_path, new_path) for old_path, new_path in repairs)
+    return seeded, repaired
+
+
+def history_entry_status(entry):
+    """Classify a history entry as 'watched', 'halfway' (past the halfway point) or 'started'."""
+    if entry.get('watched', False) or entry['timestamp'] == "[WATCHED]":
+        return "watched"
+    try:
+        minutes, seconds = map(int, entry['timestamp'].split(':'))
+        total_length = entry.get('length', 0)
+        if total_length > 0 and (minutes * 60 + seconds) / total_length > 0.5:
+            return "halfway"
+    except ValueError:
+        pass
+    return "started"
+
+HISTORY_FILTERS = [
+    ("All", None),
+    ("Watched", "watched"),
+    ("Past halfway", "halfway"),
+    ("Before halfway", "started"),
+    ("Not started", "unstarted"),
+]
+
+class HistorySearchIndex:
+    """
+    Word index over normalized history file names for search as you type.
+    Every query word matches names with a word starting with it; the distinct
+    words are kept sorted so a prefix is one bisect range. Entries are also
+    grouped by status so a status filter is a set intersection.
+    """
+    def __init__(self, entries=None):
+        self.postings = {}  # word -> ids of entries whose name contains it
+        self.words = None  # sorted distinct words, None until finish()
+        self.entry_words = {}  # id -> words, to take an entry out again
+        self.by_status = collections.defaultdict(set)
+        self.entry_statuses = {}  # id -> statuses
+        # Without entries the index is filled a slice at a time, and finished by the caller
+        if entries is not None:
+            self.add_entries(entries)
+            self.finish()
+
+    def add_entries(self, entries):
+        """Index entries in bulk; call finish() before searching."""
+        for entry in entries:
+            if entry['id'] not in self.entry_words:
+                new_words = self._add(entry)
+                if self.words is not None:
+                    for word in new_words:
+                        bisect.insort(self.words, word)
+
+    def finish(self):
+        self.words = sorted(self.postings)
+
+    WORD = re.compile(r"[^\W_]+")
+    ACCENTS = re.compile(r"[\u0300-\u036f]")  # Combining diacritical marks
+
+    @classmethod
+    def normalize(cls, text):
+        """Split text into lowercase words with accents removed."""
+        text = text.casefold()
+        if not text.isascii():
+            text = cls.ACCENTS.sub("", unicodedata.normalize("NFKD", text))
+        return cls.WORD.findall(text)
+
+    @staticmethod
+    def statuses(entry):
+        status = history_entry_status(entry)
+        if status == "started" and entry['timestamp'] in ("0:00", ""):
+            return (status, "unstarted")
+        return (status,)
+
+    def _add(self, entry):
+        """Index an entry; returns the words new to the index."""
+        entry_id = entry['id']
+        words = set(self.normalize(os.path.splitext(entry['base_name'])[0]))
+        new_words = []
+        for word in words:
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                new_words.append(word)
+            ids.add(entry_id)
+        self.entry_words[entry_id] = words
+        statuses = self.statuses(entry)
+        for status in statuses:
+            self.by_status[status].add(entry_id)
+        self.entry_statuses[entry_id] = statuses
+        return new_words
+
+    def remove(self, entry_id):
+        for word in self.entry_words.pop(entry_id, ()):
+            ids = self.postings[word]
+            ids.discard(entry_id)
+            if not ids:
+                del self.postings[word]
+                if self.words is not None:
+                    del self.words[bisect.bisect_left(self.words, word)]
+        for status in self.entry_statuses.pop(entry_id, ()):
+            self.by_status[status].discard(entry_id)
+
+    def apply_change(self, change, entry):
+        """HistoryStore listener: reindex the one affected entry."""
+        self.remove(entry['id'])
+        if change == "upsert":
+            new_words = self._add(entry)
+            if self.words is not None:
+                for word in new_words:
+                    bisect.insort(self.words, word)
+
+    @classmethod
+    def matches(cls, entry, query="", status=None):
+        """Whether entry would be found by search(query, status), without an index."""
+        if status and status not in cls.statuses(entry):
+            return False
+        words = cls.normalize(os.path.splitext(entry['base_name'])[0])
+        return all(any(word.startswith(prefix) for word in words) for prefix in cls.normalize(query))
+
+    def search(self, query="", status=None):
+        """Ids of entries matching every word of query and status, or None for no filter."""
+        if self.words is None:
+            self.finish()
+        ids = None
+        # Longest words first: they match the fewest entries
+        for word in sorted(set(self.normalize(query)), key=len, reverse=True):
+            start = bisect.bisect_left(self.words, word)
+            end = bisect.bisect_left(self.words, word + "\U0010ffff", start)
+            postings = [self.postings[w] for w in self.words[start:end]]
+            if ids is None:
+                ids = set().union(*postings)
+            elif len(ids) < sum(map(len, postings)):
+                # Intersecting each word's ids costs at most the candidates left, however short the prefix
+                ids = set().union(*(ids & matched for matched in postings))
+            else:
+                ids &= set().union(*postings)
+            if not ids:
+                return ids
+        if status:
+            statused = self.by_status.get(status, set())
+            ids = set(statused) if ids is None else ids & statused
+        return ids
+
+def timestamp_seconds(timestamp):
+    """Seconds in a MM:SS history timestamp, or None for "[WATCHED]" and anything unparsable."""
+    try:
+        minutes, seconds = timestamp.split(":")
+        return int(minutes) * 60 + int(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+class WatchStats:
+    """
+    Watch statistics over the whole history, archived entries included, for
+    the Stats tab, the IPC API and exports. Entries are kept as slots in
+    parallel array columns (position, length, watched, update time and an
+    interned folder id) rather than dicts, and the per-folder rollups are
+    array columns indexed by folder id. Everything is read from the database
+    in one pass the first time it is needed; after that the store's change
+    events update one slot and its folder's totals, so add_to_history never
+    triggers a rescan. Overall totals are sums over the folder columns. The
+    full rollup and the abandoned list are bulk passes over the columns
+    (map, compress, sum over slices), running no Python code per entry.
+    Changes arrive on the host thread and the IPC server reads from its own,
+    so everything happens under a lock.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.version = 0  # Bumped on every change, so views can skip redrawing unchanged stats
+        self.slots = {}  # entry id -> slot
+        self.free_slots = []  # Slots of deleted entries, reused by the next new entry
+        self.files = []
+        self.position = array.array("d")  # Seconds reached; the whole length once watched
+        self.length = array.array("d")  # Seconds, 0 when unknown
+        self.watched = array.array("b")  # 1 or 0, -1 for a free slot
+        self.updated = array.array("d")
+        self.folder = array.array("q")
+        self.folder_ids = {}  # folder -> id
+        self.folder_names = []
+        # Rollups per folder id
+        self.folder_entries = array.array("q")
+        self.folder_watched = array.array("q")
+        self.folder_seconds = array.array("d")  # Watch time
+        self.folder_timed = array.array("d")  # Watch time of entries with a known length, capped at it
+        self.folder_length = array.array("d")  # Length of entries with a known length
+        store.add_listener(self.apply_change)
+
+    def _folder_id(self, file):
+        folder = os.path.dirname(file)
+        folder_id = self.folder_ids.get(folder)
+        if folder_id is None:
+            folder_id = self.folder_ids[folder] = len(self.folder_names)
+            self.folder_names.append(folder)
+            for column in (self.folder_entries, self.folder_watched, self.folder_seconds,
+                           self.folder_timed, self.folder_length):
+                column.append(0)
+        return folder_id
+
+    @staticmethod
+    def _position(timestamp, watched, length):
+        if watched and length:
+            return length
+        return timestamp_seconds(timestamp) or 0
+
+    def _load(self):
+        """Read every entry into the columns and total them per folder. Caller holds the lock."""
+        if self.loaded:
+            return
+        with metrics.timer("stats_load_seconds"):
+            rows = self.store.all_rows()
+            if rows:
+                ids, files, timestamps, watched, lengths, updated = zip(*rows)
+                lengths = [length or 0 for length in lengths]
+                self.slots = dict(zip(ids, range(len(ids))))
+                self.files = list(files)
+                self.length = array.array("d", lengths)
+                self.watched = array.array("b", [1 if flag else 0 for flag in watched])
+                self.position = array.array("d", map(self._position, timestamps, self.watched, lengths))
+                self.updated = array.array("d", updated)
+                self.folder = array.array("q", map(self._folder_id, files))
+            self._rollup()
+            self.loaded = True
+        logging.info("Loaded watch statistics for %s history entries", len(self.slots))
+
+    def _rollup(self):
+        """
+        Recompute the folder columns from the entry columns. Caller holds the lock.
+        The live slots are sorted by folder once, so each folder's totals are
+        sums over one slice of the reordered columns.
+        """
+        live = itertools.compress(range(len(self.watched)), map((-1).__lt__, self.watched))
+        order = sorted(live, key=self.folder.__getitem__)
+
+        def reordered(column):
+            return array.array(column.typecode, map(column.__getitem__, order))
+
+        folder, watched, position, length = map(reordered, (self.folder, self.watched, self.position, self.length))
+        timed = array.array("d", map(min, position, length))  # 0 where the length is unknown
+        count = len(self.folder_names)
+        self.folder_entries = array.array("q", [0]) * count
+        self.folder_watched = array.array("q", [0]) * count
+        self.folder_seconds = array.array("d", [0]) * count
+        self.folder_timed = array.array("d", [0]) * count
+        self.folder_length = array.array("d", [0]) * count
+        start = 0
+        while start < len(folder):
+            folder_id = folder[start]
+            end = bisect.bisect_right(folder, folder_id, start)
+            self.folder_entries[folder_id] = end - start
+            self.folder_watched[folder_id] = sum(watched[start:end])
+            self.folder_seconds[folder_id] = sum(position[start:end])
+            self.folder_timed[folder_id] = sum(timed[start:end])
+            self.folder_length[folder_id] = sum(length[start:end])
+            start = end
+
+    def _tally(self, slot, sign):
+        """Add (sign 1) or remove (sign -1) one slot's share of its folder's totals. Caller holds the lock."""
+        folder, position, length = self.folder[slot], self.position[slot], self.length[slot]
+        self.folder_entries[folder] += sign
+        self.folder_watched[folder] += sign * self.watched[slot]
+        self.folder_seconds[folder] += sign * position
+        if length:
+            self.folder_timed[folder] += sign * min(position, length)
+            self.folder_length[folder] += sign * length
+
+    def apply_change(self, change, entry):
+        """HistoryStore listener; until the stats are first asked for there is nothing to update."""
+        with self.lock:
+            if not self.loaded:
+                return
+            slot = self.slots.get(entry["id"])
+            if slot is not None:
+                self._tally(slot, -1)
+            if change == "delete":
+                if slot is not None:
+                    del self.slots[entry["id"]]
+                    self.files[slot] = None
+                    self.watched[slot] = -1
+                    self.free_slots.append(slot)
+            else:
+                length = entry["length"] or 0
+                values = (self._position(entry["timestamp"], entry["watched"], length), length,
+                          1 if entry["watched"] else 0, entry["updated_at"], self._folder_id(entry["file"]))
+                if slot is None:
+                    slot = self.free_slots.pop() if self.free_slots else len(self.files)
+                    self.slots[entry["id"]] = slot
+                if slot == len(self.files):
+                    self.files.append(entry["file"])
+                    for column, value in zip(self.columns, values):
+                        column.append(value)
+                else:
+                    self.files[slot] = entry["file"]
+                    for column, value in zip(self.columns, values):
+                        column[slot] = value
+                self._tally(slot, 1)
+            self.version += 1
+
+    @property
+    def columns(self):
+        return (self.position, self.length, self.watched, self.updated, self.folder)
+
+    def summary(self, now=None):
+        """Totals, per-folder progress and the abandoned entries, as a JSON-ready dict."""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._load()
+            length_total = sum(self.folder_length)
+            totals = {
+                "entries": sum(self.folder_entries),
+                "watched": sum(self.folder_watched),
+                "watch_seconds": sum(self.folder_seconds),
+                "completion": sum(self.folder_timed) / length_total if length_total else 0.0,
+            }
+            folders = [{
+                "folder": name,
+                "entries": self.folder_entries[i],
+                "watched": self.folder_watched[i],
+                "watch_seconds": self.folder_seconds[i],
+                "completion": self.folder_timed[i] / self.folder_length[i] if self.folder_length[i] else 0.0,
+            } for i, name in enumerate(self.folder_names) if self.folder_entries[i]]
+            # Started properly but left unfinished, and not touched for a while
+            cutoff = now - STATS_ABANDONED_DAYS * 24 * 3600
+            mask = map(all, zip(
+                map((0).__eq__, self.watched),
+                map(cutoff.__gt__, self.updated),
+                map(operator.le, map(STATS_ABANDONED_MIN_RATIO.__mul__, self.length), self.position),
+                self.length,  # Only entries with a known length
+            ))
+            abandoned = list(itertools.compress(range(len(self.watched)), mask))
+            abandoned.sort(key=self.updated.__getitem__, reverse=True)
+            abandoned = [{
+                "file": self.files[slot],
+                "position": self.position[slot],
+                "length": self.length[slot],
+                "updated_at": self.updated[slot],
+            } for slot in abandoned[:STATS_ABANDONED_LIMIT]]
+        folders.sort(key=lambda folder: folder["watch_seconds"], reverse=True)
+        return dict(totals, folders=folders, abandoned=abandoned)
+
+    def export(self, path, fmt="json"):
+        """Write the summary to path as "json", or its per-folder table as "csv", replacing the file atomically."""
+        summary = self.summary()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            if fmt == "csv":
+                writer = csv.writer(f)
+                writer.writerow(["folder", "entries", "watched", "watch_seconds", "completion"])
+                for folder in summary["folders"]:
+                    writer.writerow([folder["folder"], folder["entries"], folder["watched"],
+                                     round(folder["watch_seconds"]), f"{folder['completion']:.3f}"])
+            else:
+                json.dump(summary, f, indent=4)
+        os.replace(tmp_path, path)
+        return path
+
+
+def format_duration(seconds):
+    """Convert seconds into an "Hh MMm" string."""
+    seconds = int(seconds)
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+def format_stats(summary):
+    """Plain-text report of a WatchStats summary for the Stats tab."""
+    lines = [
+        f"Entries: {summary['entries']}, watched: {summary['watched']}",
+        f"Watch time: {format_duration(summary['watch_seconds'])}",
+        f"Completion: {summary['completion']:.0%} of the known length of everything started",
+        "",
+    ]
+    if summary["folders"]:
+        lines.append(f"{'Folder':<56} {'entries':>8} {'watched':>8} {'time':>10} {'done':>6}")
+        for folder in summary["folders"]:
+            name = folder["folder"] if len(folder["folder"]) <= 56 else "..." + folder["folder"][-53:]
+            lines.append(f"{name:<56} {folder['entries']:>8} {folder['watched']:>8} "
+                         f"{format_duration(folder['watch_seconds']):>10} {folder['completion']:>6.0%}")
+        lines.append("")
+    if summary["abandoned"]:
+        lines.append(f"Abandoned midway (untouched for {STATS_ABANDONED_DAYS} days):")
+        for entry in summary["abandoned"]:
+            lines.append(f"  {os.path.basename(entry['file'])} - {format_time(int(entry['position']))}"
+                         f" of {format_time(int(entry['length']))}")
+    if not summary["entries"]:
+        lines.append("Nothing watched yet.")
+    return "\n".join(lines)
+
+def format_time(seconds):
+    """Convert seconds into a MM:SS string."""
+    minutes = seconds // 60
+    sec = seconds % 60
+    return f"{minutes}:{sec:02d}"
+
+def format_time_filename(seconds):
+    """Convert seconds into a MM-SS string safe for filenames."""
+    minutes = seconds // 60
+    sec = seconds % 60
+    return f"{minutes:02d}-{sec:02d}"
+
+class VLCProcessTracker:
+    """
+    Remembers the PIDs of running VLC processes so that most checks are a
+    cheap pid_exists plus create-time comparison. The full process table is
+    only scanned again when a cached process dies, or every rescan_interval
+    seconds while VLC is not running.
+    """
+
+    def __init__(self, rescan_interval=PROCESS_RESCAN_INTERVAL):
+        self.rescan_interval = rescan_interval
+        self.pids = {}  # pid -> create_time
+        self.last_scan = None
+        self.lock = threading.Lock()
+
+    def scan(self):
+        pids = {}
+        for proc in psutil.process_iter(['name', 'create_time']):
+            if proc.info['name'] and "vlc" in proc.info['name'].lower():
+                pids[proc.pid] = proc.info['create_time']
+        self.pids = pids
+        self.last_scan = time.monotonic()
+        logging.debug("Scanned process table, VLC PIDs: %s", list(pids))
+
+    def _still_running(self, pid, create_time):
+        if not psutil.pid_exists(pid):
+            return False
+        try:
+            # A recycled PID belongs to a process with a different start time
+            return psutil.Process(pid).create_time() == create_time
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+
+    def is_running(self):
+        with self.lock:
+            had_pids = bool(self.pids)
+            self.pids = {pid: created for pid, created in self.pids.items()
+                         if self._still_running(pid, created)}
+            if self.pids:
+                return True
+
+            due = self.last_scan is None or time.monotonic() - self.last_scan >= self.rescan_interval
+            if had_pids or due:
+                self.scan()
+            return bool(self.pids)
+
+    def invalidate(self):
+        """Force a full scan on the next check."""
+        with self.lock:
+            self.last_scan = None
+
+
+vlc_processes = VLCProcessTracker()
+
+
+def is_vlc_running():
+    """Check if VLC process is running."""
+    return vlc_processes.is_running()
+
+class VLCTelnetSession:
+    """
+    Long-lived connection to VLC's telnet interface.
+    Authenticates once and is reused across polls. A dead socket is detected
+    before each use and the connection is re-established, backing off
+    exponentially while VLC keeps refusing connections.
+    """
+
+    def __init__(self, host=VLC_TELNET_HOST, port=VLC_TELNET_PORT, password=VLC_TELNET_PASSWORD,
+                 timeout=1, min_backoff=1, max_backoff=30):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sock = None
+        self.failures = 0
+        self.next_attempt = 0
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def can_attempt(self):
+        return time.monotonic() >= self.next_attempt
+
+    def connection_succeeded(self):
+        metrics.increment("telnet_connects_total", result="ok")
+        self.failures = 0
+        self.next_attempt = 0
+        logging.debug("Telnet session established with %s:%s", self.host, self.port)
+
+    def connection_failed(self, error):
+        metrics.increment("telnet_connects_total", result="failed")
+        self.failures += 1
+        backoff = min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+        self.next_attempt = time.monotonic() + backoff
+        logging.debug("Telnet connection failed (%s), retrying in %ss", error, backoff)
+
+    def connect(self):
+        """Open and authenticate a new connection. Returns False while backing off or on failure."""
+        if self.sock:
+            return True
+        if not self.can_attempt():
+            return False
+
+        sock = None
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            deadline = time.monotonic() + self.timeout
+
+            # Handle initial connection and password
+            prompt = self._read_until(sock, (b"Password:", RCReplyParser.PROMPT), deadline)
+            if b"Password:" in prompt:
+                logging.debug("Password prompt received")
+                sock.sendall(f"{self.password}\n".encode('utf-8'))
+                response = self._read_until(sock, (RCReplyParser.PROMPT, b"Wrong password"), deadline)
+                if b"Wrong password" in response:
+                    logging.error("Wrong telnet password")
+                    raise ConnectionError("Wrong telnet password")
+
+            self.sock = sock
+            self.connection_succeeded()
+            return True
+
+        except (OSError, EOFError) as e:
+            if sock:
+                sock.close()
+            self.connection_failed(e)
+            return False
+
+    def _read_until(self, sock, markers, deadline):
+        data = b""
+        while not any(marker in data for marker in markers):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Timed out waiting for {markers!r}")
+            sock.settimeout(remaining)
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise EOFError("Connection closed by VLC")
+            data += chunk
+        return data
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+
+    def reset(self):
+        """Close the connection and forget any pending backoff."""
+        self.close()
+        self.failures = 0
+        self.next_attempt = 0
+
+    def is_alive(self):
+        """Discard stale output from the previous poll; EOF means VLC dropped the connection."""
+        if not self.sock:
+            return False
+        try:
+            self.sock.setblocking(False)
+            while True:
+                if not self.sock.recv(4096):
+                    logging.debug("Telnet session closed by VLC")
+                    self.close()
+                    return False
+        except BlockingIOError:
+            self.sock.settimeout(self.timeout)
+            return True
+        except OSError:
+            self.close()
+            return False
+
+    def command(self, cmd):
+        """Send a command and return its reply as a list of lines."""
+        return self.pipeline([cmd])[0]
+
+    def pipeline(self, cmds):
+        """
+        Write all commands in one batch and collect one reply per command.
+        The whole batch shares a single deadline instead of one per command.
+        """
+        if not self.sock:
+            raise ConnectionError("Telnet session is not connected")
+        parser = RCReplyParser()
+        sent = time.monotonic()
+        deadline = sent + self.timeout
+        try:
+            self.sock.sendall("".join(f"{cmd}\n" for cmd in cmds).encode('utf-8'))
+            while len(parser.replies) < len(cmds):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Timed out waiting for reply to {cmds!r}")
+                self.sock.settimeout(remaining)
+                answered = len(parser.replies)
+                data = self.sock.recv(4096)
+                if not data:
+                    raise EOFError("Connection closed by VLC")
+                parser.feed(data)
+                for cmd in cmds[answered:len(parser.replies)]:
+                    metrics.observe("telnet_command_seconds", time.monotonic() - sent, command=cmd)
+        except (OSError, EOFError) as e:
+            # Also covers timeouts: the stream is out of sync so start over next time
+            self.command_failed(cmds[len(parser.replies)], e)
+            self.close()
+            raise
+        return [parser.replies.popleft() for _ in cmds]
+
+    @staticmethod
+    def command_failed(cmd, error):
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+            metrics.increment("telnet_timeouts_total", command=cmd)
+        else:
+            metrics.increment("telnet_errors_total", command=cmd)
+
+
+class AsyncVLCSession(VLCTelnetSession):
+    """
+    asyncio flavour of VLCTelnetSession built on asyncio.open_connection.
+    Every command in a pipelined batch gets its own reply deadline.
+    """
+
+    def __init__(self, *args, command_timeout=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.command_timeout = command_timeout
+        self.reader = None
+        self.writer = None
+        self.parser = None
+
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    async def connect(self):
+        """Open and authenticate a new connection. Returns False while backing off or on failure."""
+        if self.writer:
+            return True
+        if not self.can_attempt():
+            return False
+
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+            deadline = time.monotonic() + self.timeout
+
+            prompt = await self._read_until((b"Password:", RCReplyParser.PROMPT), deadline)
+            if b"Password:" in prompt:
+                logging.debug("Password prompt received")
+                self.writer.write(f"{self.password}\n".encode('utf-8'))
+                response = await self._read_until((RCReplyParser.PROMPT, b"Wrong password"), deadline)
+                if b"Wrong password" in response:
+                    logging.error("Wrong telnet password")
+                    raise ConnectionError("Wrong telnet password")
+
+            self.parser = RCReplyParser()
+            self.connection_succeeded()
+            return True
+
+        except (OSError, EOFError, asyncio.TimeoutError) as e:
+            self.close()
+            self.connection_failed(e)
+            return False
+
+    async def _read_until(self, markers, deadline):
+        data = b""
+        while not any(marker in data for marker in markers):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            chunk = await asyncio.wait_for(self.reader.read(4096), remaining)
+            if not chunk:
+                raise EOFError("Connection closed by VLC")
+            data += chunk
+        return data
+
+    def close(self):
+        if self.writer:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+        self.reader = self.writer = self.parser = None
+
+    def is_alive(self):
+        if not self.writer:
+            return False
+        if self.reader.at_eof() or self.writer.is_closing():
+            logging.debug("Telnet session closed by VLC")
+            self.close()
+            return False
+        return True
+
+    async def command(self, cmd):
+        return (await self.pipeline([cmd]))[0]
+
+    async def pipeline(self, cmds):
+        if not self.writer:
+            raise ConnectionError("Telnet session is not connected")
+        replies = []
+        try:
+            sent = time.monotonic()
+            self.writer.write("".join(f"{cmd}\n" for cmd in cmds).encode('utf-8'))
+            await asyncio.wait_for(self.writer.drain(), self.command_timeout)
+            for cmd in cmds:
+                replies.append(await asyncio.wait_for(self._next_reply(), self.command_timeout))
+                metrics.observe("telnet_command_seconds", time.monotonic() - sent, command=cmd)
+            return replies
+        except (OSError, EOFError, asyncio.TimeoutError) as e:
+            # A missed deadline leaves the stream out of sync, so start over next time
+            self.command_failed(cmds[len(replies)], e)
+            self.close()
+            raise
+
+    async def _next_reply(self):
+        parser = self.parser
+        while not parser.replies:
+            data = await self.reader.read(4096)
+            if not data:
+                raise EOFError("Connection closed by VLC")
+            parser.feed(data)
+        return parser.replies.popleft()
+
+
+class RCReplyParser:
+    """
+    Incremental parser for VLC rc output.
+    Bytes are fed as they arrive and split into lines; a "> " prompt at the
+    start of a line closes the current reply. Telnet negotiation sequences
+    are dropped. Partial lines, prompts and IAC sequences split across chunks
+    are held back until the rest arrives. on_line, if set, is called with
+    every complete line as soon as it has been parsed.
+    """
+
+    PROMPT = b"> "
+    IAC = 0xFF
+    # WILL, WONT, DO and DONT carry a one-byte option
+    IAC_OPTION_COMMANDS = range(0xFB, 0xFF)
+
+    def __init__(self, on_line=None):
+        self.buffer = b""
+        self.pending_iac = b""
+        self.lines = []
+        self.replies = collections.deque()
+        self.on_line = on_line
+
+    def strip_telnet_commands(self, data):
+        if self.IAC not in data:
+            return data, b""
+        out = bytearray()
+        pos = 0
+        while pos < len(data):
+            byte = data[pos]
+            if byte != self.IAC:
+                out.append(byte)
+                pos += 1
+                continue
+            if pos + 1 >= len(data):
+                break
+            command = data[pos + 1]
+            if command == self.IAC:
+                out.append(self.IAC)
+                pos += 2
+            elif command in self.IAC_OPTION_COMMANDS:
+                if pos + 2 >= len(data):
+                    break
+                pos += 3
+            else:
+                pos += 2
+        return bytes(out), data[pos:]
+
+    def feed(self, data):
+        buffer, self.pending_iac = self.strip_telnet_commands(self.pending_iac + data)
+        buffer = self.buffer + buffer
+        pos = 0
+        while pos < len(buffer):
+            if buffer.startswith(self.PROMPT, pos):
+                self.replies.append(self.lines)
+                self.lines = []
+                pos += len(self.PROMPT)
+                continue
+            if len(buffer) - pos < len(self.PROMPT) and self.PROMPT.startswith(buffer[pos:]):
+                # Could be the first half of a prompt
+                break
+            end = buffer.find(b"\n", pos)
+            if end == -1:
+                break
+            line = buffer[pos:end].rstrip(b"\r")
+            if line:
+                self.lines.append(line)
+                if self.on_line:
+                    self.on_line(line)
+            pos = end + 1
+        self.buffer = buffer[pos:]
+
+
+STATUS_COMMANDS = ("status", "get_time", "get_length")
+
+
+def parse_status_line(line):
+    """
+    Recognise a line of rc status output, either in reply to `status` or
+    printed by VLC on its own when playback changes.
+    Returns ("input", file), ("state", state) or None.
+    """
+    # Leftover prompt characters can precede the first line
+    line = line.strip()
+    if line.startswith(b"status change: "):
+        line = line[len(b"status change: "):]
+    if line.startswith(b"( state "):
+        return "state", line[len(b"( state "):].rstrip(b" )").strip().decode('utf-8', errors='ignore')
+    if line.startswith(b"( new input: "):
+        return "input", line[len(b"( new input: "):].rstrip(b" )").strip().decode('utf-8', errors='ignore')
+    if line.startswith(b"input: "):
+        return "input", line[len(b"input: "):].strip().decode('utf-8', errors='ignore')
+    return None
+
+
+def parse_status_replies(status_lines, time_lines, length_lines):
+    """Build a status dictionary from the replies to STATUS_COMMANDS, or None if nothing is playing."""
+    file_name = None
+    state = None
+    for line in status_lines:
+        parsed = parse_status_line(line)
+        if parsed is None:
+            continue
+        kind, value = parsed
+        if kind == "state":
+            state = value
+            logging.debug("Found state: %s", state)
+        else:
+            file_name = value
+            logging.debug("Found input: %s", file_name)
+
+    # Only proceed if we have valid state and file
+    if not (state in ("playing", "paused") and file_name):
+        logging.debug("No valid playback state or file")
+        return None
+
+    try:
+        current_time = int(time_lines[0])
+        logging.debug("Parsed playback time: %s", current_time)
+
+        total_length = int(length_lines[0])
+        logging.debug("Parsed total length: %s", total_length)
+
+    except (ValueError, IndexError) as e:
+        logging.debug("Could not parse time/length: %s", e)
+        return None
+
+    return {
+        "file": file_name,
+        "time": current_time,
+        "length": total_length,
+        "state": state
+    }
+
+
+def get_vlc_status_telnet(host=VLC_TELNET_HOST, port=VLC_TELNET_PORT, password=VLC_TELNET_PASSWORD, session=None,
+                          check_process=True):
+    """
+    Query VLC's telnet interface for the current playback status.
+    Pass a VLCTelnetSession to reuse its connection; otherwise a one-off
+    connection is opened and closed again. check_process=False skips the
+    VLC process check, e.g. when talking to a remote or fake rc server.
+    Returns a dictionary with 'file', 'time', 'length', and 'state' if media is loaded.
+    Returns None if no media is playing or connection fails.
+    """
+    own_session = session is None
+    if own_session:
+        session = VLCTelnetSession(host, port, password)
+    try:
+        if check_process and not is_vlc_running():
+            return None
+
+        reused = session.is_alive()
+        if not reused and not session.connect():
+            return None
+
+        try:
+            # status, get_time and get_length go out in one write
+            logging.debug("Sending pipelined status commands")
+            replies = session.pipeline(STATUS_COMMANDS)
+        except (OSError, EOFError):
+            if not reused:
+                raise
+            # The kept-alive connection went stale between polls; reconnect once
+            logging.debug("Reused telnet session failed, reconnecting")
+            if not session.connect():
+                return None
+            replies = session.pipeline(STATUS_COMMANDS)
+        logging.debug("Received status replies: %s", replies)
+
+        return parse_status_replies(*replies)
+
+    except ConnectionRefusedError:
+        return None
+    except Exception as e:
+        logging.error("Error fetching VLC status via telnet: %s", e)
+        return None
+    finally:
+        if own_session:
+            session.close()
+
+async def get_vlc_status_async(session):
+    """
+    asyncio counterpart of get_vlc_status_telnet using an AsyncVLCSession.
+    The caller is expected to have checked that VLC is running.
+    """
+    try:
+        reused = session.is_alive()
+        if not reused and not await session.connect():
+            return None
+
+        try:
+            logging.debug("Sending pipelined status commands")
+            replies = await session.pipeline(STATUS_COMMANDS)
+        except (OSError, EOFError, asyncio.TimeoutError):
+            if not reused:
+                raise
+            logging.debug("Reused telnet session failed, reconnecting")
+            if not await session.connect():
+                return None
+            replies = await session.pipeline(STATUS_COMMANDS)
+        logging.debug("Received status replies: %s", replies)
+
+        return parse_status_replies(*replies)
+
+    except ConnectionRefusedError:
+        return None
+    except asyncio.TimeoutError:
+        logging.debug("Timed out fetching VLC status")
+        return None
+    except Exception as e:
+        logging.error("Error fetching VLC status via telnet: %s", e)
+        return None
+
+
+class StatusBackend:
+    """
+    Source of playback status for one VLC instance. Subclasses provide the
+    coroutine fetch_status(), which returns the same dictionary as
+    get_vlc_status_telnet, or None when nothing is playing or VLC cannot be
+    reached, and override close() and reset() if they hold a connection.
+    Backends are used from the polling engine's event loop only.
+    """
+    name = None
+    endpoints = []  # (host, port, password) to poll when none are given
+    push = False  # Driven by an EventSubscriber instead of being polled
+
+    def __init__(self, host, port, password):
+        self.host = host
+        self.port = port
+        self.password = password
+
+    def close(self):
+        """Drop the open connection, if any."""
+
+    def reset(self):
+        """Drop the connection and any cached state; called when VLC has gone away."""
+        self.close()
+
+
+class TelnetBackend(StatusBackend):
+    """Status scraped from VLC's rc/telnet interface over a kept-alive AsyncVLCSession."""
+    name = "telnet"
+    endpoints = VLC_ENDPOINTS
+
+    def __init__(self, host=VLC_TELNET_HOST, port=VLC_TELNET_PORT, password=VLC_TELNET_PASSWORD):
+        super().__init__(host, port, password)
+        self.session = AsyncVLCSession(host, port, password)
+
+    async def fetch_status(self):
+        return await get_vlc_status_async(self.session)
+
+    def close(self):
+        self.session.close()
+
+    def reset(self):
+        self.session.reset()
+
+
+class PushTelnetBackend(TelnetBackend):
+    """Telnet backend that keeps its connection open and follows VLC's own status lines."""
+    name = "telnet-push"
+    push = True
+
+
+class HTTPBackend(StatusBackend):
+    """
+    Status from VLC's web interface (/requests/status.json) over a single
+    keep-alive HTTP/1.1 connection. status.json has no file URI, so the
+    playlist is fetched once per playlist item to look it up.
+    """
+    name = "http"
+    endpoints = VLC_HTTP_ENDPOINTS
+    STATUS_PATH = "/requests/status.json"
+    PLAYLIST_PATH = "/requests/playlist.json"
+
+    def __init__(self, host=VLC_HTTP_HOST, port=VLC_HTTP_PORT, password=VLC_HTTP_PASSWORD, timeout=1):
+        super().__init__(host, port, password)
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        # VLC only checks the password; the user name is left empty
+        self.authorization = base64.b64encode(f":{password}".encode('utf-8')).decode('ascii')
+        self.uris = {}  # playlist id -> file URI
+
+    def close(self):
+        if self.writer:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+    def reset(self):
+        self.close()
+        self.uris = {}
+
+    def is_alive(self):
+        return self.writer is not None and not self.reader.at_eof() and not self.writer.is_closing()
+
+    async def connect(self):
+        self.close()
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def request(self, path):
+        """GET path and return the decoded JSON, reusing the open connection if there is one."""
+        reused = self.is_alive()
+        started = time.monotonic()
+        try:
+            if not reused:
+                await self.connect()
+            try:
+                status, body = await asyncio.wait_for(self._get(path), self.timeout)
+            except (OSError, EOFError):
+                if not reused:
+                    raise
+                # The kept-alive connection went stale between polls; reconnect once
+                logging.debug("Reused HTTP connection failed, reconnecting")
+                await self.connect()
+                status, body = await asyncio.wait_for(self._get(path), self.timeout)
+        except (OSError, EOFError, asyncio.TimeoutError):
+            metrics.increment("http_errors_total", path=path)
+            self.close()
+            raise
+        metrics.observe("http_request_seconds", time.monotonic() - started, path=path)
+
+        if status == 401:
+            raise ConnectionError("Wrong HTTP password")
+        if status != 200:
+            raise ConnectionError(f"HTTP {status} from {path}")
+        return json.loads(body)
+
+    async def _get(self, path):
+        self.writer.write((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Authorization: Basic {self.authorization}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode('ascii'))
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode('latin-1').split("\r\n")
+        status = int(status_line.split(" ", 2)[1])
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)  # Every chunk ends with CRLF
+                if not size:
+                    break
+                body += chunk[:-2]
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            # The body runs until the server closes the connection
+            body = await self.reader.read()
+            keep_alive = False
+        if not keep_alive:
+            self.close()
+        return status, body
+
+    @staticmethod
+    def find_uri(node, plid):
+        """Find the URI of playlist item plid in a playlist.json tree."""
+        if node.get("type") == "leaf" and node.get("id") == str(plid):
+            return node.get("uri")
+        for child in node.get("children", []):
+            uri = HTTPBackend.find_uri(child, plid)
+            if uri:
+                return uri
+        return None
+
+    async def fetch_status(self):
+        try:
+            status = await self.request(self.STATUS_PATH)
+            state = status.get("state")
+            if state not in ("playing", "paused"):
+                logging.debug("No valid playback state or file")
+                return None
+
+            plid = status.get("currentplid")
+            uri = self.uris.get(plid)
+            if uri is None:
+                uri = self.find_uri(await self.request(self.PLAYLIST_PATH), plid)
+                if uri is None:
+                    logging.debug("Playlist item %s not found", plid)
+                    return None
+                # Only the current item is ever looked up again
+                self.uris = {plid: uri}
+
+            return {
+                "file": uri,
+                "time": int(status["time"]),
+                "length": int(status["length"]),
+                "state": state
+            }
+
+        except ConnectionRefusedError:
+            return None
+        except asyncio.TimeoutError:
+            logging.debug("Timed out fetching VLC status over HTTP")
+            return None
+        except Exception as e:
+            logging.error("Error fetching VLC status over HTTP: %s", e)
+            return None
+
+
+STATUS_BACKENDS = {backend.name: backend for backend in (TelnetBackend, PushTelnetBackend, HTTPBackend)}
+
+
+def library_folders():
+    """Folders to scan for media, as saved under Settings."""
+    return read_setting("library_folders", [], list)
+
+
+def history_archive_days():
+    """Days after which untouched history entries are archived, as saved under Settings; 0 = never."""
+    return read_setting("history_archive_days", HISTORY_ARCHIVE_DAYS, int)
+
+
+def configured_status_backend():
+    """Status backend name saved under Settings, falling back to STATUS_BACKEND."""
+    name = read_setting("status_backend", STATUS_BACKEND)
+    return name if name in STATUS_BACKENDS else STATUS_BACKEND
+
+
+class PollScheduler:
+    """
+    Works out when the next poll is due from the result of the last one:
+    exponential backoff while VLC is absent, a slow cadence while paused and
+    a fast one close to the watched threshold. Polls never overlap; ticks
+    that fall due while a poll is still running are coalesced into a single
+    follow-up poll, and reported as skipped so the caller can count them.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL, paused_interval=PAUSED_POLL_INTERVAL,
+                 near_end_interval=NEAR_END_POLL_INTERVAL, max_absent_interval=MAX_ABSENT_POLL_INTERVAL,
+                 deadline=POLL_DEADLINE):
+        self.interval = interval
+        self.paused_interval = paused_interval
+        self.near_end_interval = near_end_interval
+        self.max_absent_interval = max_absent_interval
+        self.deadline = deadline
+        self.absent_polls = 0
+        self.due = None
+
+    def next_interval(self, status, vlc_present=True):
+        if not vlc_present:
+            self.absent_polls += 1
+            return min(self.max_absent_interval, self.interval * 2 ** (self.absent_polls - 1))
+        self.absent_polls = 0
+
+        if not status:
+            return self.interval
+        if status["state"] == "paused":
+            return self.paused_interval
+
+        length = status["length"]
+        if length > 0:
+            threshold = min(length - WATCHED_REMAINING_SECONDS, length * WATCHED_RATIO)
+            if status["time"] < length and threshold - status["time"] <= NEAR_END_WINDOW:
+                return self.near_end_interval
+        return self.interval
+
+    def poll_started(self, now):
+        """Whether the poll starting now is later than it was due."""
+        return self.due is not None and now - self.due > LATE_TICK_TOLERANCE
+
+    def poll_finished(self, started, now, status, vlc_present=True):
+        """Return how long to wait before the next poll, and how many ticks the poll overran."""
+        interval = self.next_interval(status, vlc_present)
+        self.due = started + interval
+        skipped = 0
+        if now > self.due:
+            # The poll overran its slot: run once more straight away rather than catching up
+            skipped = int((now - self.due) // interval) + 1
+            self.due = now
+        return self.due - now, skipped
+
+
+def endpoint_key(host, port):
+    return f"{host}:{port}"
+
+
+class EndpointPoller:
+    """
+    Polls a single VLC endpoint on its own schedule and backend, so one
+    slow instance never delays the others. Statuses are tagged with the
+    endpoint key before being handed to the callbacks.
+    """
+
+    def __init__(self, backend, on_status, on_not_running, scheduler=None):
+        self.backend = backend
+        self.key = endpoint_key(backend.host, backend.port)
+        self.on_status = on_status
+        self.on_not_running = on_not_running
+        self.scheduler = scheduler or PollScheduler()
+
+    async def run(self, stopping):
+        loop = asyncio.get_running_loop()
+        scheduler = self.scheduler
+        try:
+            while not stopping.is_set():
+                started = loop.time()
+                if scheduler.poll_started(started):
+                    metrics.increment("poll_late_ticks_total", endpoint=self.key)
+                try:
+                    status, vlc_present = await asyncio.wait_for(self.poll_once(), scheduler.deadline)
+                    result = "playing" if status else "idle" if vlc_present else "not_running"
+                except asyncio.TimeoutError:
+                    logging.warning("Poll of %s exceeded its %ss deadline", self.key, scheduler.deadline)
+                    # Whatever was in flight left the stream out of sync
+                    self.backend.close()
+                    self.on_not_running(self.key)
+                    status, vlc_present = None, True
+                    result = "timeout"
+                metrics.observe("poll_seconds", loop.time() - started, endpoint=self.key)
+                metrics.increment("polls_total", endpoint=self.key, result=result)
+
+                delay, skipped = scheduler.poll_finished(started, loop.time(), status, vlc_present)
+                if skipped:
+                    metrics.increment("poll_skipped_ticks_total", skipped, endpoint=self.key)
+                try:
+                    await asyncio.wait_for(stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.backend.close()
+
+    async def poll_once(self):
+        """Run a single poll. Returns the status (or None) and whether VLC is running."""
+        try:
+            # psutil checks are blocking, keep them off the loop
+            running = await asyncio.get_running_loop().run_in_executor(None, is_vlc_running)
+            if not running:
+                logging.debug("VLC not running")
+                self.backend.reset()
+                self.on_not_running(self.key)
+                return None, False
+
+            status = await self.backend.fetch_status()
+            if status:
+                status["endpoint"] = self.key
+                logging.debug("Got VLC status: %s", status)
+                self.on_status(status)
+            else:
+                # Don't spam empty status updates
+                logging.debug("No valid status received from %s, emitting vlc_not_running", self.key)
+                self.on_not_running(self.key)
+            return status, True
+
+        except Exception as e:
+            metrics.increment("poll_errors_total", endpoint=self.key)
+            logging.error("Error in poll_once: %s", e, exc_info=True)
+            # Report vlc_not_running to maintain UI state
+            self.on_not_running(self.key)
+            return None, True
+
+
+class PlaybackClock:
+    """
+    Estimates the playback position between checks with VLC: it advances
+    with the monotonic clock while playing and stands still while paused.
+    """
+
+    def __init__(self):
+        self.position = 0
+        self.anchor = time.monotonic()
+        self.playing = False
+
+    def now(self):
+        if self.playing:
+            return self.position + time.monotonic() - self.anchor
+        return self.position
+
+    def set(self, position=None, playing=None):
+        """Re-anchor at position (default: the current estimate) and optionally start or stop the clock."""
+        self.position = self.now() if position is None else position
+        self.anchor = time.monotonic()
+        if playing is not None:
+            self.playing = playing
+
+
+class EventSubscriber:
+    """
+    Push-driven alternative to EndpointPoller for the rc interface. Keeps one
+    connection open and reacts straight away to the status lines VLC prints
+    on its own, such as "( new input: ... )" and "( state paused )". Between
+    events the position comes from a PlaybackClock and is checked against
+    get_time every verify_interval seconds, together with a full status
+    resync in case a change went unannounced. Statuses are reported every
+    report_interval seconds from the clock, and immediately on any change.
+    """
+
+    VERIFY_COMMANDS = ("get_time", "get_length")
+
+    def __init__(self, backend, on_status, on_not_running, report_interval=POLL_INTERVAL,
+                 verify_interval=PUSH_VERIFY_INTERVAL, scheduler=None):
+        self.backend = backend
+        self.session = backend.session
+        self.key = endpoint_key(backend.host, backend.port)
+        self.on_status = on_status
+        self.on_not_running = on_not_running
+        self.report_interval = report_interval
+        self.verify_interval = verify_interval
+        self.scheduler = scheduler or PollScheduler()  # Only used for its backoff while VLC is absent
+        self.clock = PlaybackClock()
+        self.outstanding = collections.deque()  # (command, sent at) awaiting a reply
+        self.forget()
+
+    def forget(self):
+        self.file = None
+        self.state = None
+        self.length = None  # None until get_length has answered for the current file
+        self.outstanding.clear()
+        self.clock.set(0, playing=False)
+
+    async def run(self, stopping):
+        loop = asyncio.get_running_loop()
+        try:
+            while not stopping.is_set():
+                # psutil checks are blocking, keep them off the loop
+                running = await loop.run_in_executor(None, is_vlc_running)
+                if running and await self.session.connect():
+                    self.scheduler.absent_polls = 0
+                    try:
+                        await self.listen(stopping)
+                    except (OSError, EOFError, asyncio.TimeoutError) as e:
+                        logging.debug("Event connection to %s lost: %s", self.key, e)
+                    self.session.close()
+                    # Hand over the final estimate before letting go of the file
+                    self.report()
+                    self.forget()
+                    self.on_not_running(self.key)
+                    delay = self.scheduler.interval
+                else:
+                    if not running:
+                        self.session.reset()
+                    self.on_not_running(self.key)
+                    delay = self.scheduler.next_interval(None, vlc_present=running)
+                try:
+                    await asyncio.wait_for(stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.session.close()
+
+    async def listen(self, stopping):
+        """Follow the open connection until it drops or stopping is set."""
+        loop = asyncio.get_running_loop()
+        parser = self.session.parser
+        parser.on_line = self.handle_line
+        self.forget()
+        self.send(STATUS_COMMANDS)
+        next_report = loop.time() + self.report_interval
+        next_verify = loop.time() + self.verify_interval
+
+        stop = asyncio.ensure_future(stopping.wait())
+        read = None
+        try:
+            while not stop.done():
+                now = loop.time()
+                if now >= next_verify:
+                    if not self.outstanding:
+                        self.send(STATUS_COMMANDS)
+                    next_verify = now + self.verify_interval
+                if now >= next_report:
+                    self.report()
+                    next_report = now + self.report_interval
+                wake = min(next_report, next_verify)
+                if self.outstanding:
+                    command, sent = self.outstanding[0]
+                    deadline = sent + self.session.command_timeout
+                    if now >= deadline:
+                        self.session.command_failed(command, asyncio.TimeoutError())
+                        raise asyncio.TimeoutError(f"No reply to {command}")
+                    wake = min(wake, deadline)
+
+                read = read or asyncio.ensure_future(self.session.reader.read(4096))
+                await asyncio.wait({read, stop}, timeout=max(0, wake - now),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not read.done():
+                    continue
+                data = read.result()
+                read = None
+                if not data:
+                    raise EOFError("Connection closed by VLC")
+                parser.feed(data)
+                while parser.replies:
+                    lines = parser.replies.popleft()
+                    if self.outstanding:
+                        command, sent = self.outstanding.popleft()
+                        metrics.observe("telnet_command_seconds", loop.time() - sent, command=command)
+                        self.handle_reply(command, lines)
+        finally:
+            stop.cancel()
+            if read:
+                read.cancel()
+
+    def send(self, commands):
+        now = asyncio.get_running_loop().time()
+        self.outstanding.extend((command, now) for command in commands)
+        self.session.writer.write("".join(f"{command}\n" for command in commands).encode('utf-8'))
+
+    def handle_line(self, line):
+        """Parser callback for every line, whether VLC pushed it or it answers a command."""
+        parsed = parse_status_line(line)
+        if parsed is None:
+            return
+        kind, value = parsed
+        if kind == "input" and value != self.file:
+            metrics.increment("push_events_total", event="input")
+            logging.debug("New input on %s: %s", self.key, value)
+            self.report()
+            self.file = value
+            self.length = None
+            self.clock.set(0)
+            if not any(command == "get_length" for command, _ in self.outstanding):
+                self.send(self.VERIFY_COMMANDS)
+        elif kind == "state" and value != self.state:
+            metrics.increment("push_events_total", event="state")
+            logging.debug("State on %s: %s", self.key, value)
+            self.report()
+            self.state = value
+            self.clock.set(playing=value == "playing")
+            self.report()
+
+    def handle_reply(self, command, lines):
+        # Lines VLC pushed meanwhile can end up in the same reply, so take the last number
+        value = None
+        for line in lines:
+            try:
+                value = int(line.strip())
+            except ValueError:
+                pass
+        if command == "get_time" and value is not None:
+            if self.length is not None:
+                metrics.observe("push_clock_drift_seconds", abs(value - self.clock.now()))
+            self.clock.set(value)
+        elif command == "get_length":
+            self.length = value or 0
+            self.report()
+
+    def report(self):
+        """Hand the current estimate to the callbacks; nothing is said until the length is known."""
+        if self.length is None:
+            return
+        if self.file and self.state in ("playing", "paused"):
+            position = int(self.clock.now())
+            if self.length:
+                position = min(position, self.length)
+            self.on_status({
+                "file": self.file,
+                "time": position,
+                "length": self.length,
+                "state": self.state,
+                "endpoint": self.key,
+            })
+        else:
+            self.on_not_running(self.key)
+
+
+class VLCPollEngine:
+    """
+    Polls every configured VLC endpoint from an asyncio event loop running on
+    its own thread, so socket I/O and process checks never block the GUI
+    thread. Each endpoint runs as a separate task; results are handed to the
+    on_status / on_not_running callbacks from the loop thread. `backend`
+    names the entry of STATUS_BACKENDS used to talk to VLC. Given a
+    FingerprintIndex, statuses also carry the playing file's fingerprint,
+    worked out once per file on an executor thread; it is None until known.
+    """
+
+    FINGERPRINTS_KEPT = 32  # Most recently played files whose fingerprint is remembered
+
+    def __init__(self, on_status, on_not_running, endpoints=None, backend=STATUS_BACKEND, fingerprints=None):
+        backend_class = STATUS_BACKENDS[backend]
+        runner = EventSubscriber if backend_class.push else EndpointPoller
+        self.fingerprints = fingerprints
+        self.file_fingerprints = {}  # VLC input -> fingerprint, None while being computed
+        if fingerprints:
+            on_status = self._with_fingerprint(on_status)
+        self.pollers = [
+            runner(backend_class(host, port, password), on_status, on_not_running)
+            for host, port, password in (endpoints or backend_class.endpoints)
+        ]
+        self.loop = None
+        self.thread = None
+        self._stopping = None
+        self._stop_requested = False
+
+    def _with_fingerprint(self, on_status):
+        def tagged(status):
+            file = status["file"]
+            if file not in self.file_fingerprints:
+                self.file_fingerprints[file] = None
+                if len(self.file_fingerprints) > self.FINGERPRINTS_KEPT:
+                    del self.file_fingerprints[next(iter(self.file_fingerprints))]
+                future = asyncio.get_running_loop().run_in_executor(
+                    None, self.fingerprints.fingerprint, media_path(file))
+                future.add_done_callback(lambda done: self._fingerprinted(file, done))
+            status["fingerprint"] = self.file_fingerprints[file]
+            on_status(status)
+        return tagged
+
+    def _fingerprinted(self, file, future):
+        if file in self.file_fingerprints and not future.cancelled() and not future.exception():
+            self.file_fingerprints[file] = future.result()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="VLCPollEngine", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        # _main checks the flag too, in case the loop has not got going yet
+        self._stop_requested = True
+        if self.loop and self._stopping:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            logging.error("Polling engine stopped unexpectedly: %s", e, exc_info=True)
+        finally:
+            self.loop.close()
+
+    async def _main(self):
+        self._stopping = asyncio.Event()
+        if self._stop_requested:
+            return
+        await asyncio.gather(*(poller.run(self._stopping) for poller in self.pollers))
+
+
+class PlaybackState:
+    """What is currently playing on one VLC endpoint."""
+
+    def __init__(self):
+        self.current_file = None
+        self.current_fingerprint = None
+        self.current_time = 0
+        self.current_state = None
+        self.last_total_length = 0
+        self.vlc_running = False
+
+    def clear(self):
+        self.current_file = None
+        self.current_fingerprint = None
+        self.current_time = 0
+        self.current_state = None
+
+
+PlaybackSample = collections.namedtuple("PlaybackSample", "timestamp time length state")
+
+
+def sample_key(path):
+    """Folder and base name of path, the same for a file before and after the tracker renames it."""
+    return os.path.normcase(os.path.join(os.path.dirname(path), history_base_name(path)))
+
+
+class SampleLog:
+    """
+    Append-only log of every status the tracker receives, so viewing can be
+    told apart from seeking and sessions rebuilt afterwards. Each sample is
+    one fixed-width RECORD (wall time, file id, position, length and state
+    in 17 bytes) written through a buffer; files are interned to ids, kept
+    one JSON string per line in a sidecar file, by sample_key so the
+    tracker's own renames keep a file's id. Reads go through an mmap of the
+    log. The record numbers of each file are indexed on the first query and
+    caught up on later ones, so a query only reads that file's records.
+    Once the log outgrows max_bytes its older half is dropped when it is
+    next opened. Safe to use from any thread.
+    """
+
+    RECORD = struct.Struct("<IIIIB")
+    STATES = ("stopped", "playing", "paused")  # Stored as the index; anything else counts as stopped
+
+    def __init__(self, path=SAMPLE_LOG_FILE, files_path=SAMPLE_FILES_FILE, max_bytes=SAMPLE_LOG_MAX_BYTES,
+                 flush_interval=SAMPLE_FLUSH_INTERVAL):
+        self.path = path
+        self.files_path = files_path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.file_ids = {}  # sample_key -> id
+        self.ids_by_input = {}  # VLC input as received -> id, sparing media_path on every sample
+        self.last = {}  # id -> (time, state) of its last sample, to skip repeats while paused
+        self.records = {}  # id -> array of record numbers, once indexed
+        self.indexed = 0  # Records covered by self.records
+        self.data = None  # mmap of the log, remapped when it has grown
+        self.last_flush = time.monotonic()
+
+        self._read_files()
+        self._trim(max_bytes)
+        self.log = open(path, "ab")
+        self.files = open(files_path, "a", encoding="utf-8")
+
+    def _read_files(self):
+        """
+        Intern the files listed in the sidecar. A torn last line left by a
+        crash is cut off; any other unreadable line still takes up its id,
+        so the ids after it keep matching the log.
+        """
+        try:
+            with open(self.files_path, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logging.error("Error reading the playback sample files: %s", e, exc_info=True)
+            return
+        if lines and not lines[-1].endswith(b"\n"):
+            torn = lines.pop()
+            try:
+                with open(self.files_path, "r+b") as f:
+                    f.truncate(sum(map(len, lines)))
+                logging.warning("Dropped a torn last line from the playback sample files: %r", torn)
+            except OSError as e:
+                logging.error("Error truncating the playback sample files: %s", e, exc_info=True)
+        for number, line in enumerate(lines):
+            try:
+                key = json.loads(line)
+            except ValueError:
+                logging.warning("Skipping unreadable line %s of the playback sample files", number + 1)
+                key = ("unreadable", number)  # Never equal to a real key, which is a string
+            self.file_ids[key] = number
+
+    def _trim(self, max_bytes):
+        """Drop a torn last record left by a crash, and the older half of a log past max_bytes."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        whole = size - size % self.RECORD.size
+        keep = whole
+        if whole > max_bytes:
+            keep = (max_bytes // 2) // self.RECORD.size * self.RECORD.size
+        if keep == size:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(whole - keep)
+                data = f.read(keep)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+            logging.info("Trimmed the playback sample log from %s to %s bytes", size, keep)
+        except OSError as e:
+            logging.error("Error trimming the playback sample log: %s", e, exc_info=True)
+
+    def _file_id(self, key):
+        """The id of key, interning it if new. Caller holds the lock."""
+        file_id = self.file_ids.get(key)
+        if file_id is None:
+            file_id = self.file_ids[key] = len(self.file_ids)
+            self.files.write(json.dumps(key) + "\n")
+            self.files.flush()
+        return file_id
+
+    def record(self, status, at=None):
+        """Append a status from the polling engine."""
+        with self.lock:
+            file_id = self.ids_by_input.get(status["file"])
+            if file_id is None:
+                file_id = self.ids_by_input[status["file"]] = self._file_id(sample_key(media_path(status["file"])))
+            state = self.STATES.index(status["state"]) if status["state"] in self.STATES else 0
+            position = max(0, int(status["time"] or 0))
+            # A paused or stopped file repeats the same sample every poll
+            if state != 1 and self.last.get(file_id) == (position, state):
+                return
+            self.last[file_id] = (position, state)
+            self.log.write(self.RECORD.pack(int(time.time() if at is None else at), file_id, position,
+                                            max(0, int(status["length"] or 0)), state))
+            if time.monotonic() - self.last_flush > self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        self.log.flush()
+        self.last_flush = time.monotonic()
+
+    def _catch_up(self):
+        """Map whatever was appended since the last query and index its records. Caller holds the lock."""
+        self._flush()
+        size = os.path.getsize(self.path)
+        size -= size % self.RECORD.size
+        if size == 0 or (self.data is not None and len(self.data) >= size):
+            return
+        if self.data is not None:
+            self.data.close()
+        with open(self.path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        start = self.indexed * self.RECORD.size
+        with metrics.timer("sample_index_seconds"):
+            for number, (_, file_id, _, _, _) in enumerate(self.RECORD.iter_unpack(self.data[start:size]),
+                                                           self.indexed):
+                records = self.records.get(file_id)
+                if records is None:
+                    records = self.records[file_id] = array.array("I")
+                records.append(number)
+        self.indexed = size // self.RECORD.size
+
+    def samples(self, file, start=None, end=None):
+        """The samples of file (any of its names) recorded between start and end, oldest first."""
+        with self.lock:
+            file_id = self.file_ids.get(sample_key(file))
+            if file_id is None:
+                return []
+            self._catch_up()
+            samples = []
+            for number in self.records.get(file_id, ()):
+                timestamp, _, position, length, state = self.RECORD.unpack_from(self.data, number * self.RECORD.size)
+                if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                    samples.append(PlaybackSample(timestamp, position, length, self.STATES[state]))
+            return samples
+
+    @staticmethod
+    def _watched_step(previous, sample):
+        """Whether playback ran from previous to sample, rather than being sought or left."""
+        if previous.state != "playing":
+            return False
+        elapsed = sample.timestamp - previous.timestamp
+        moved = sample.time - previous.time
+        return 0 < elapsed <= SAMPLE_SESSION_GAP and abs(moved - elapsed) <= SAMPLE_SEEK_TOLERANCE + elapsed // 4
+
+    def watched_segments(self, file, start=None, end=None):
+        """The parts of file actually played between start and end, as merged (from, to) seconds."""
+        samples = self.samples(file, start, end)
+        spans = sorted((previous.time, sample.time) for previous, sample in zip(samples, samples[1:])
+                       if self._watched_step(previous, sample))
+        segments = []
+        for begin, finish in spans:
+            if segments and begin <= segments[-1][1]:
+                segments[-1][1] = max(segments[-1][1], finish)
+            else:
+                segments.append([begin, finish])
+        return [tuple(segment) for segment in segments]
+
+    def sessions(self, file, start=None, end=None):
+        """
+        Viewing sessions of file, split where no sample arrived for
+        SAMPLE_SESSION_GAP seconds: when each started and ended, the
+        positions it went from and to, seconds played and seeks made.
+        """
+        sessions = []
+        previous = None
+        for sample in self.samples(file, start, end):
+            if previous is None or sample.timestamp - previous.timestamp > SAMPLE_SESSION_GAP:
+                session = {"start": sample.timestamp, "end": sample.timestamp, "from": sample.time,
+                           "to": sample.time, "played_seconds": 0, "seeks": 0}
+                sessions.append(session)
+            elif self._watched_step(previous, sample):
+                session["played_seconds"] += sample.time - previous.time
+            elif sample.time != previous.time:
+                session["seeks"] += 1
+            session["end"] = sample.timestamp
+            session["to"] = sample.time
+            previous = sample
+        return sessions
+
+    def close(self):
+        with self.lock:
+            self.log.close()
+            self.files.close()
+            if self.data is not None:
+                self.data.close()
+                self.data = None
+
+
+class IPCConnection:
+    """
+    One client of the IPCServer, as an asyncio protocol (not subclassed, so
+    asyncio is still only imported once the tracker starts). Messages are
+    JSON-RPC 2.0 requests, or batches of them, one per line; replies and
+    event notifications are written back the same way.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = b""
+        self.subscriptions = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections.add(self)
+
+    def connection_lost(self, exc):
+        self.server.connections.discard(self)
+
+    def eof_received(self):
+        return None  # Close our end too
+
+    def pause_writing(self):
+        pass
+
+    def resume_writing(self):
+        pass
+
+    def data_received(self, data):
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        if len(self.buffer) > IPC_MAX_MESSAGE:
+            logging.warning("Closing IPC connection that sent an oversized message")
+            self.transport.close()
+            return
+        for line in lines:
+            if line.strip():
+                reply = self.server.handle_message(self, line)
+                if reply is not None:
+                    self.send(reply)
+
+    def send(self, message):
+        if not self.transport.is_closing():
+            self.transport.write(json.dumps(message).encode("utf-8") + b"\n")
+
+
+class IPCError(Exception):
+    """A JSON-RPC error reply, with its code."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class IPCServer:
+    """
+    Local JSON-RPC 2.0 API over the tracker's state, so scripts can read it
+    without touching the database or starting a second tracker. Listens on
+    IPC_SOCKET_FILE (readable only by the user), or IPC_PIPE_NAME on Windows,
+    from an asyncio loop on its own thread. Methods:
+
+    - status: what every VLC endpoint is playing
+    - history.query: history entries newest first, optionally filtered by
+      a search query and status, a page at a time ({"before": id, "limit": n})
+    - stats: watch time, completion, per-folder progress and abandoned
+      entries (see WatchStats)
+    - playback.sessions: the parts of a file actually watched and its
+      viewing sessions, from the SampleLog ({"file": path, "start", "end"})
+    - subscribe / unsubscribe: event notifications ("playback", "history",
+      "library_scanned", "history_archived") sent as "event" calls
+
+    Core events arrive on the host thread and are handed to the loop.
+    """
+
+    EVENTS = ("playback", "history", "library_scanned", "history_archived")
+
+    def __init__(self, core, address=None):
+        self.core = core
+        self.address = address or (IPC_PIPE_NAME if os.name == "nt" else IPC_SOCKET_FILE)
+        self.connections = set()
+        self.playing = {}  # endpoint -> status, replaced on the host thread and read on the loop
+        self.methods = {
+            "status": self.status,
+            "history.query": self.history_query,
+            "stats": self.stats,
+            "playback.sessions": self.playback_sessions,
+            "subscribe": self.subscribe,
+            "unsubscribe": self.unsubscribe,
+        }
+        self.loop = None
+        self.thread = None
+        self.servers = []
+        self._stopping = None
+        self._stop_requested = False
+
+    def start(self):
+        self.core.add_listener(self.on_core_event)
+        self.core.history_store.add_listener(self.on_history_change)
+        self.thread = threading.Thread(target=self._run, name="IPCServer", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        self._stop_requested = True
+        if not self.thread:
+            return
+        if self.loop and self._stopping:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            logging.error("IPC server stopped unexpectedly: %s", e, exc_info=True)
+        finally:
+            self.loop.close()
+
+    async def _main(self):
+        self._stopping = asyncio.Event()
+        if self._stop_requested:
+            return
+        if os.name == "nt":
+            self.servers = await self.loop.start_serving_pipe(lambda: IPCConnection(self), self.address)
+        else:
+            if not self._claim_socket():
+                return
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # Bound under a private umask, so the socket is never reachable by other users, even briefly
+            old_umask = os.umask(0o177)
+            try:
+                sock.bind(self.address)
+            except OSError:
+                sock.close()
+                raise
+            finally:
+                os.umask(old_umask)
+            self.servers = [await self.loop.create_unix_server(lambda: IPCConnection(self), sock=sock)]
+        logging.info("IPC server listening on %s", self.address)
+        try:
+            await self._stopping.wait()
+        finally:
+            for server in self.servers:
+                server.close()
+            for connection in list(self.connections):
+                connection.transport.close()
+            if os.name != "nt":
+                with contextlib.suppress(OSError):
+                    os.unlink(self.address)
+
+    def _claim_socket(self):
+        """Remove a socket file left behind by a tracker that died; False if one is still listening."""
+        if not os.path.exists(self.address):
+            return True
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.address)
+        except OSError:
+            os.unlink(self.address)
+            return True
+        finally:
+            probe.close()
+        logging.warning("Another tracker is already listening on %s; IPC is disabled", self.address)
+        return False
+
+    # Events, called on the host thread
+
+    def on_core_event(self, event, data):
+        if event == "playback":
+            state = self.core.playback.get(data)
+            status = None
+            if state and state.current_file:
+                status = {"endpoint": data, "file": media_path(state.current_file), "time": state.current_time,
+                          "length": state.last_total_length, "state": state.current_state}
+            playing = dict(self.playing)
+            playing[data] = status
+            self.playing = playing
+            params = {"endpoint": data, "status": status}
+        elif event == "library_scanned":
+            params = {key: data[key] for key in ("directories", "seconds", "seeded", "repaired")}
+            params["files"] = len(data["files"])
+        else:
+            params = {"count": data}
+        self._publish(event, params)
+
+    def on_history_change(self, change, entry):
+        self._publish("history", {"change": change, "entry": entry})
+
+    def _publish(self, event, params):
+        if self.loop and self.connections:
+            self.loop.call_soon_threadsafe(self._broadcast, event, dict(params, event=event))
+
+    def _broadcast(self, event, params):
+        for connection in list(self.connections):
+            if event in connection.subscriptions:
+                connection.send({"jsonrpc": "2.0", "method": "event", "params": params})
+
+    # Requests, handled on the loop
+
+    def handle_message(self, connection, line):
+        """The reply to one line: a response, a list of them for a batch, or None."""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return self._error(None, -32700, "Parse error")
+        if isinstance(message, list):
+            if not message:
+                return self._error(None, -32600, "Invalid Request")
+            replies = [self.handle_request(connection, request) for request in message]
+            return [reply for reply in replies if reply is not None] or None
+        return self.handle_request(connection, message)
+
+    def handle_request(self, connection, request):
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or \
+                not isinstance(request.get("method"), str):
+            return self._error(request.get("id") if isinstance(request, dict) else None, -32600, "Invalid Request")
+        request_id = request.get("id")
+        method = self.methods.get(request["method"])
+        try:
+            if method is None:
+                raise IPCError(-32601, "Method not found")
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise IPCError(-32602, "Params must be an object")
+            try:
+                inspect.signature(method).bind(connection, **params)
+            except TypeError as e:
+                raise IPCError(-32602, f"Invalid params: {e}")
+            with metrics.timer("ipc_request_seconds", method=request["method"]):
+                result = method(connection, **params)
+        except IPCError as e:
+            reply = self._error(request_id, e.code, str(e))
+        except Exception as e:
+            logging.error("Error handling IPC request %s: %s", request["method"], e, exc_info=True)
+            reply = self._error(request_id, -32603, "Internal error")
+        else:
+            reply = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        # Requests without an id are notifications and get no reply
+        return reply if "id" in request else None
+
+    @staticmethod
+    def _error(request_id, code, message):
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+    def status(self, connection):
+        return [status for status in self.playing.values() if status]
+
+    def history_query(self, connection, query="", status=None, before=None, limit=50):
+        if not isinstance(query, str) or (before is not None and not isinstance(before, int)):
+            raise IPCError(-32602, "query must be a string and before an entry id")
+        if status is not None and status not in dict(HISTORY_FILTERS).values():
+            raise IPCError(-32602, f"Unknown status {status!r}")
+        if not isinstance(limit, int) or not 0 < limit <= IPC_MAX_PAGE:
+            raise IPCError(-32602, f"limit must be between 1 and {IPC_MAX_PAGE}")
+
+        def matches(entry):
+            return HistorySearchIndex.matches(entry, query, status)
+
+        store = self.core.history_store
+        recent = [entry for entry in store.entries()
+                  if (before is None or entry["id"] < before) and matches(entry)]
+        archived, cursor = store.archived_entries(before, limit, matches)
+        # Recent and archived entries interleave by id; the next page starts after the last one returned
+        page = sorted(recent + archived, key=lambda entry: entry["id"], reverse=True)
+        more = len(page) > limit or cursor is not None
+        page = page[:limit]
+        return {"entries": page, "next": page[-1]["id"] if page and more else None}
+
+    def stats(self, connection):
+        return self.core.stats.summary()
+
+    def playback_sessions(self, connection, file, start=None, end=None):
+        if not isinstance(file, str):
+            raise IPCError(-32602, "file must be a path")
+        samples = self.core.samples
+        return {"segments": samples.watched_segments(file, start, end), "sessions": samples.sessions(file, start, end)}
+
+    def subscribe(self, connection, events=EVENTS):
+        unknown = set(events) - set(self.EVENTS)
+        if unknown:
+            raise IPCError(-32602, f"Unknown events {sorted(unknown)}")
+        connection.subscriptions.update(events)
+        return sorted(connection.subscriptions)
+
+    def unsubscribe(self, connection, events=EVENTS):
+        connection.subscriptions.difference_update(events)
+        return sorted(connection.subscriptions)
+
+
+def ipc_call(method, params=None, address=None, timeout=5):
+    """
+    Call a method of a running tracker's IPC API and return its result, for
+    scripts. Raises IPCError for error replies and OSError if no tracker is
+    listening.
+    """
+    address = address or (IPC_PIPE_NAME if os.name == "nt" else IPC_SOCKET_FILE)
+    request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}}).encode() + b"\n"
+    if os.name == "nt":
+        with open(address, "r+b", buffering=0) as pipe:
+            pipe.write(request)
+            reply = b""
+            while not reply.endswith(b"\n"):
+                data = pipe.read(65536)
+                if not data:
+                    break
+                reply += data
+    else:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(address)
+            sock.sendall(request)
+            reply = sock.makefile("rb").readline()
+    reply = json.loads(reply)
+    if "error" in reply:
+        raise IPCError(reply["error"]["code"], reply["error"]["message"])
+    return reply["result"]
+
+
+class TrackerCore:
+    """
+    The tracking itself: turns statuses from the polling engine into history
+    entries and renames, without any GUI. Not thread-safe; every callback
+    runs on the host's thread, which post(callback, *args) hands it to (the
+    window through a queued signal, the headless tracker through a queue).
+    Listeners are called on that thread with ("playback", endpoint),
+    ("library_scanned", result) or ("history_archived", count).
+    """
+
+    def __init__(self, post):
+        self.post = post
+        self.listeners = []
+        self.playback = {}  # endpoint -> PlaybackState
+        self.skip_next_rename = False
+        self.history_store = None
+        self.stats = None
+        self.samples = None
+        self.fingerprints = None
+        self.rename_queue = None
+        self.library_scanner = None
+        self.engine = None
+        self.ipc = None
+        self.stopped = False
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _notify(self, event, data):
+        for callback in self.listeners:
+            try:
+                callback(event, data)
+            except Exception as e:
+                logging.error("Error in tracker listener: %s", e, exc_info=True)
+
+    def start(self):
+        """Open the history and start polling."""
+        load_deferred_modules()
+        self.history_store = HistoryStore()
+        self.stats = WatchStats(self.history_store)
+        self.samples = SampleLog()
+        self.archive_history()
+        self.fingerprints = FingerprintIndex()
+        self.rename_queue = RenameQueue(lambda old, new: self.post(self.on_file_renamed, old, new))
+        self.library_scanner = LibraryScanner(self._plan_library_update)
+        self.start_engine()
+        self.ipc = IPCServer(self)
+        self.ipc.start()
+
+    def start_engine(self):
+        # The engine runs its own asyncio loop thread
+        self.engine = VLCPollEngine(lambda status: self.post(self.on_status, status),
+                                    lambda endpoint: self.post(self.on_not_running, endpoint),
+                                    backend=configured_status_backend(), fingerprints=self.fingerprints)
+        self.engine.start()
+
+    def set_status_backend(self, name):
+        write_setting("status_backend", name)
+        if not self.engine:
+            return
+        self.engine.stop()
+        # Posted after whatever the old engine sent, so those statuses are handled first
+        self.post(self._restart_engine)
+        logging.info("Switched status backend to %s", name)
+
+    def _restart_engine(self):
+        if self.stopped:
+            return
+        # Endpoint keys differ between backends; the new one picks up whatever is playing
+        endpoints = list(self.playback)
+        self.playback.clear()
+        for endpoint in endpoints:
+            self._notify("playback", endpoint)
+        self.start_engine()
+
+    def stop(self):
+        """Stop polling and renaming. The host then handles what was posted before calling close()."""
+        self.stopped = True
+        if self.engine:
+            self.engine.stop()
+        if self.ipc:
+            self.ipc.stop()
+        if self.rename_queue:
+            self.rename_queue.stop()
+
+    def close(self):
+        if self.history_store:
+            self.history_store.close()
+        if self.fingerprints:
+            self.fingerprints.close()
+        if self.samples:
+            self.samples.close()
+
+    def on_status(self, status):
+        try:
+            logging.debug("Status received: %s", status)
+            state = self.playback.setdefault(status["endpoint"], PlaybackState())
+
+            # Check if file changed
+            if state.current_file and status["file"] != state.current_file:
+                # Save progress for previous file before updating
+                self.save_progress(state)
+                state.current_fingerprint = None
+
+            # Update current status
+            state.vlc_running = True
+            state.current_file = status["file"]
+            state.current_fingerprint = status.get("fingerprint") or state.current_fingerprint
+            state.current_time = status["time"]
+            state.current_state = status["state"]
+            state.last_total_length = status["length"]
+            self.samples.record(status)
+
+            self._notify("playback", status["endpoint"])
+
+        except Exception as e:
+            logging.error("Error processing status: %s", e, exc_info=True)
+
+    def on_not_running(self, endpoint):
+        state = self.playback.get(endpoint)
+        if state is None:
+            return
+
+        if self.skip_next_rename and state.current_file:
+            self.skip_next_rename = False
+            state.vlc_running = False
+            state.clear()
+            self._notify("playback", endpoint)
+            return
+
+        if state.vlc_running and state.current_file and state.current_time > 0:
+            self.save_progress(state)
+            state.clear()
+
+        state.vlc_running = False
+        self._notify("playback", endpoint)
+
+    def save_progress(self, state):
+        """Record the progress of the file that just stopped playing and queue its rename."""
+        is_watched = is_watched_position(state.current_time, state.last_total_length)
+        path = media_path(state.current_file)
+        self.add_to_history(path, format_time(state.current_time), is_watched, state.last_total_length,
+                            state.current_fingerprint)
+        # The history entry follows the file once the rename has gone through
+        self.rename_queue.submit(path, is_watched, format_time_filename(state.current_time))
+
+    def add_to_history(self, file, timestamp, is_watched=False, length=0, fingerprint=None):
+        # The same file (by fingerprint, else by folder and name ignoring timestamps) is updated in place
+        try:
+            with metrics.timer("add_to_history_seconds"):
+                self.history_store.upsert(
+                    file,
+                    "[WATCHED]" if is_watched else timestamp,
+                    is_watched,
+                    length,
+                    fingerprint
+                )
+        except Exception as e:
+            logging.error("Error updating history: %s", e, exc_info=True)
+
+    def on_file_renamed(self, old_path, new_path):
+        self.history_store.rename(old_path, new_path)
+
+    def archive_history(self):
+        days = history_archive_days()
+        if not self.history_store or days <= 0:
+            return
+        try:
+            archived = self.history_store.archive(days * 86400)
+            if archived:
+                self._notify("history_archived", archived)
+        except Exception as e:
+            logging.error("Error archiving history: %s", e, exc_info=True)
+
+    def scan_library(self):
+        """Start scanning the library folders; False if there are none or a scan is running."""
+        folders = library_folders()
+        if not folders or not self.library_scanner:
+            return False
+        return self.library_scanner.start(folders)
+
+    def _plan_library_update(self, result):
+        """LibraryScanner callback: the disk checks stay on the scan thread, only the store updates are posted."""
+        seeds, repairs = plan_library_update(self.history_store, result["files"], self.fingerprints)
+        self.post(self.on_library_scanned, result, seeds, repairs)
+
+    def on_library_scanned(self, result, seeds, repairs):
+        try:
+            seeded, repaired = apply_library_update(self.history_store, seeds, repairs)
+            self._notify("library_scanned", dict(result, seeded=seeded, repaired=repaired))
+        except Exception as e:
+            logging.error("Error applying library scan: %s", e, exc_info=True)
+
+
+def run_headless():
+    """
+    Track VLC without a window until interrupted: the core's callbacks are
+    run from a queue on the main thread, and nothing from Qt is loaded
+    beyond QtCore for reading settings.
+    """
+    setup_logging()
+    sys.excepthook = log_crash
+    logging.info("Starting VLC Tracker without a window")
+
+    events = queue.SimpleQueue()
+    core = TrackerCore(lambda callback, *args: events.put((callback, args)))
+    signal.signal(signal.SIGTERM, lambda signum, frame: events.put(None))
+
+    def handle(event):
+        callback, args = event
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.error("Error handling %s: %s", callback.__name__, e, exc_info=True)
+
+    try:
+        core.start()
+        core.scan_library()
+        next_archive = time.monotonic() + HISTORY_ARCHIVE_INTERVAL
+        while True:
+            try:
+                # Wake up now and then so Ctrl+C is noticed on Windows too
+                event = events.get(timeout=1)
+            except queue.Empty:
+                event = ()
+            if event is None:
+                break
+            if event:
+                handle(event)
+            if time.monotonic() >= next_archive:
+                next_archive = time.monotonic() + HISTORY_ARCHIVE_INTERVAL
+                core.archive_history()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Whatever stopped the loop, the history still gets written out
+        try:
+            core.stop()
+            # Handle what was posted while stopping, such as finished renames, before the history is written out
+            while True:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+                if event:
+                    handle(event)
+        finally:
+            core.close()
+    logging.info("VLC Tracker stopped")
+    stop_logging()
+    return 0